@@ -0,0 +1,80 @@
+from collections import deque
+
+
+class AdaptivePacer:
+    """自适应节奏控制（AIMD）：根据最近任务的成功率和错误率调整两个视频之间的间隔
+
+    最近错误率低于目标（或已连续成功 recovery_streak 次）时，每次成功把间隔减少固定步长
+    （加性减小间隔，即加性提高速率）；出现生成错误、空结果等可能由频率过高引起的失败时，
+    把间隔乘以退避系数（乘性降低速率）。
+    间隔始终限制在 [min_gap, max_gap] 之内，默认从 min_gap 开始，只在出现错误后才放慢。
+    """
+
+    def __init__(self, min_gap=0, max_gap=300, initial_gap=None, decrease_step=2, increase_factor=2.0,
+                 increase_floor=10, window=20, target_error_rate=0.1, recovery_streak=3):
+        self.min_gap = min_gap
+        self.max_gap = max_gap
+        self.decrease_step = decrease_step
+        self.increase_factor = increase_factor
+        self.increase_floor = increase_floor  # 间隔很小时乘性增加效果不明显，至少增加到该值
+        self.target_error_rate = target_error_rate
+        self.recovery_streak = recovery_streak  # 错误高峰过去后，连续成功该次数即开始恢复速度
+        self.outcomes = deque(maxlen=window)  # 最近的结果，True为成功
+        self.gap = self.clamp(min_gap if initial_gap is None else initial_gap)  # 未指定时从最小间隔开始
+        self.successes = 0
+        self.errors = 0
+        self.adjustments = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            min_gap=config.get('pacing_min_gap', 0),
+            max_gap=config.get('pacing_max_gap', 300),
+            initial_gap=config.get('pacing_initial_gap'),
+            decrease_step=config.get('pacing_decrease_step', 2),
+            increase_factor=config.get('pacing_increase_factor', 2.0),
+            window=config.get('pacing_window', 20),
+            target_error_rate=config.get('pacing_target_error_rate', 0.1),
+            recovery_streak=config.get('pacing_recovery_streak', 3)
+        )
+
+    def clamp(self, gap):
+        return min(max(gap, self.min_gap), self.max_gap)
+
+    @property
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def record_success(self):
+        """记录一次成功，返回调整后的间隔"""
+        self.successes += 1
+        self.outcomes.append(True)
+        recent = list(self.outcomes)[-self.recovery_streak:]
+        if self.error_rate <= self.target_error_rate or (len(recent) == self.recovery_streak and all(recent)):
+            self.set_gap(self.gap - self.decrease_step)
+        return self.gap
+
+    def record_error(self):
+        """记录一次与频率相关的失败，返回调整后的间隔"""
+        self.errors += 1
+        self.outcomes.append(False)
+        self.set_gap(max(self.gap * self.increase_factor, self.increase_floor))
+        return self.gap
+
+    def set_gap(self, gap):
+        gap = self.clamp(gap)
+        if gap != self.gap:
+            self.adjustments += 1
+        self.gap = gap
+
+    def metrics(self):
+        return {
+            'pacing_gap_seconds': round(self.gap, 1),
+            'pacing_error_rate': round(self.error_rate, 3),
+            'pacing_window': len(self.outcomes),
+            'pacing_successes': self.successes,
+            'pacing_errors': self.errors,
+            'pacing_adjustments': self.adjustments
+        }
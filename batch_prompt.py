@@ -0,0 +1,43 @@
+import re
+
+# 批量模式追加在提示词后面的说明：{count} 为视频数量，{clip_list} 为按附加顺序编号的视频列表
+DEFAULT_BATCH_INSTRUCTION = (
+    "\n\n本次一共附加了{count}个视频，按附加顺序依次为：\n{clip_list}\n"
+    "请对每个视频分别按上面的要求输出一个完整的分镜表，分镜都从1开始编号，不要把不同视频的分镜混在同一个表格里。"
+    "每个分镜表之前单独占一行写标记「### 视频N」（N为上面的编号）。"
+)
+
+# 回复中每个视频分镜表之前的标记行，例如 "### 视频2"、"【视频2】"、"视频 2：xxx"
+MARKER_PATTERN = re.compile(r'^\s*(?:#+\s*)?[【\[]?\s*(?:视频|video|clip)\s*(\d+)\s*(?:[】\]:：\s]|$)', re.IGNORECASE)
+MARKER_MAX_LENGTH = 120
+
+
+def build_batch_prompt(prompt, titles, instruction=None):
+    """在提示词后追加批量说明，列出每个视频的编号和名称"""
+    clip_list = "\n".join(f"视频{number}: {title}" for number, title in enumerate(titles, start=1))
+    return prompt + (instruction or DEFAULT_BATCH_INSTRUCTION).format(count=len(titles), clip_list=clip_list)
+
+
+def split_batch_response(text, count):
+    """按标记行把回复拆分为每个视频的部分，返回 {视频序号(从0开始): 内容}
+
+    编号超出范围的标记忽略；同一个编号出现多次时保留内容较长的一段。
+    """
+    sections = {}
+    current, lines = None, []
+
+    def flush():
+        if current is not None and 0 <= current < count:
+            content = "\n".join(lines).strip()
+            if len(content) > len(sections.get(current, "")):
+                sections[current] = content
+
+    for line in text.split("\n"):
+        match = MARKER_PATTERN.match(line) if '\t' not in line and len(line) <= MARKER_MAX_LENGTH else None
+        if match:
+            flush()
+            current, lines = int(match.group(1)) - 1, []
+        else:
+            lines.append(line)
+    flush()
+    return sections
@@ -0,0 +1,116 @@
+import json
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# 比特浏览器本地API默认地址
+DEFAULT_BIT_API_URL = "http://127.0.0.1:54345"
+
+
+class BitBrowserAPIError(Exception):
+    """比特浏览器API调用失败"""
+
+
+class BitBrowserClient:
+    """比特浏览器本地API客户端：复用连接池，带连接/读取超时和指数退避重试"""
+
+    def __init__(self, api_url=DEFAULT_BIT_API_URL, connect_timeout=3, read_timeout=60,
+                 max_retries=3, backoff=1.0, pool_size=4, log=None):
+        self.api_url = api_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.log = log or (lambda message: None)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+
+    @classmethod
+    def from_config(cls, config, log=None):
+        """根据引擎配置创建客户端"""
+        return cls(
+            api_url=config.get('bit_api_url') or DEFAULT_BIT_API_URL,
+            connect_timeout=config.get('bit_api_connect_timeout', 3),
+            read_timeout=config.get('bit_api_read_timeout', 60),
+            max_retries=config.get('bit_api_retries', 3),
+            backoff=config.get('bit_api_backoff', 1.0),
+            log=log
+        )
+
+    def close(self):
+        self.session.close()
+
+    def request(self, method, url, data=None, timeout=None):
+        """发送请求；连接失败、超时和5xx错误按指数退避重试"""
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                delay = self.backoff * (2 ** (attempt - 1))
+                self.log(f"比特浏览器API请求失败，{delay:.1f}秒后重试 ({attempt}/{self.max_retries}): {last_error}")
+                time.sleep(delay)
+            try:
+                res = self.session.request(
+                    method, url,
+                    data=json.dumps(data) if data is not None else None,
+                    timeout=timeout or self.timeout
+                )
+                if res.status_code >= 500:
+                    last_error = f"HTTP {res.status_code}"
+                    continue
+                res.raise_for_status()
+                return res.json()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                last_error = e
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # 4xx或返回内容不是JSON，重试也不会成功
+                raise BitBrowserAPIError(f"请求 {url} 失败: {e}") from e
+        raise BitBrowserAPIError(f"请求 {url} 失败，已重试 {self.max_retries} 次: {last_error}")
+
+    def post(self, path, data=None, timeout=None):
+        return self.request('POST', f"{self.api_url}{path}", data=data if data is not None else {}, timeout=timeout)
+
+    def health_check(self):
+        """运行前探测API是否可用，使用较短的读取超时"""
+        try:
+            res_json = self.post('/health', timeout=(self.timeout[0], 5))
+        except BitBrowserAPIError as e:
+            raise BitBrowserAPIError(f"无法连接到比特浏览器API ({self.api_url})，请确认比特浏览器已启动并且API服务在运行中。错误: {e}") from e
+        if not res_json.get('success'):
+            raise BitBrowserAPIError(f"比特浏览器API健康检查未通过: {json.dumps(res_json, ensure_ascii=False)}")
+        return True
+
+    def open_browser(self, window_id):
+        """打开浏览器窗口，返回 {'ws': CDP WebSocket地址, 'http': DevTools HTTP地址}"""
+        res_json = self.post('/browser/open', {'id': window_id})
+        if not res_json.get('success'):
+            error_message = f"API打开窗口失败: {res_json.get('msg', '无详细错误信息')}. "
+            error_message += f"完整API响应: {json.dumps(res_json, ensure_ascii=False)}"
+            raise BitBrowserAPIError(error_message)
+
+        data = res_json.get('data') or {}
+        ws_address = data.get('ws')
+        if not ws_address and data.get('http'):
+            ws_address = self.discover_cdp(data['http'])
+        if not ws_address:
+            raise BitBrowserAPIError(f"API返回结果中未找到CDP地址 (ws). 完整响应: {json.dumps(res_json, ensure_ascii=False)}")
+        return {'ws': ws_address, 'http': data.get('http')}
+
+    def close_browser(self, window_id):
+        """关闭浏览器窗口"""
+        res_json = self.post('/browser/close', {'id': window_id})
+        if not res_json.get('success'):
+            raise BitBrowserAPIError(f"API关闭窗口失败: {res_json.get('msg', '无详细错误信息')}")
+        return True
+
+    def discover_cdp(self, http_address):
+        """通过DevTools的 /json/version 获取CDP WebSocket地址"""
+        if not http_address.startswith('http'):
+            http_address = f"http://{http_address}"
+        res_json = self.request('GET', f"{http_address.rstrip('/')}/json/version")
+        ws_address = res_json.get('webSocketDebuggerUrl')
+        if not ws_address:
+            raise BitBrowserAPIError(f"DevTools未返回webSocketDebuggerUrl: {json.dumps(res_json, ensure_ascii=False)}")
+        return ws_address
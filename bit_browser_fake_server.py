@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+比特浏览器本地API的简易模拟服务
+用于在没有比特浏览器的环境中离线验证 打开窗口 / 关闭窗口 / CDP地址发现 流程，
+以及超时和重试逻辑。
+
+启动: python bit_browser_fake_server.py --port 54345 --fail-first 2 --delay 0
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeBitBrowserState:
+    """模拟服务的状态：已打开的窗口和故障注入配置"""
+
+    def __init__(self, port, fail_first=0, delay=0, omit_ws=False):
+        self.port = port
+        self.fail_first = fail_first  # 前N次打开窗口请求返回500，用于验证重试
+        self.delay = delay  # 每个请求的额外延迟（秒），用于验证超时
+        self.omit_ws = omit_ws  # 打开窗口时只返回http地址，用于验证CDP发现
+        self.open_windows = set()
+        self.request_counts = {}
+        self.lock = threading.Lock()
+
+    def count(self, path):
+        with self.lock:
+            self.request_counts[path] = self.request_counts.get(path, 0) + 1
+            return self.request_counts[path]
+
+
+class FakeBitBrowserHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status_code, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length).decode('utf-8'))
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        state = self.state
+        count = state.count(self.path)
+        if state.delay:
+            time.sleep(state.delay)
+        if self.path == '/json/version':
+            self.send_json(200, {
+                'Browser': 'Chrome/119.0.0.0',
+                'webSocketDebuggerUrl': f"ws://127.0.0.1:{state.port}/devtools/browser/fake-{count}"
+            })
+        else:
+            self.send_json(404, {'success': False, 'msg': 'not found'})
+
+    def do_POST(self):
+        state = self.state
+        count = state.count(self.path)
+        data = self.read_json()
+        if state.delay:
+            time.sleep(state.delay)
+
+        if self.path == '/health':
+            self.send_json(200, {'success': True})
+        elif self.path == '/browser/open':
+            if count <= state.fail_first:
+                self.send_json(500, {'success': False, 'msg': 'simulated failure'})
+                return
+            window_id = data.get('id')
+            if not window_id:
+                self.send_json(200, {'success': False, 'msg': '窗口ID不能为空'})
+                return
+            state.open_windows.add(window_id)
+            result = {'http': f"127.0.0.1:{state.port}", 'driver': '', 'pid': 12345}
+            if not state.omit_ws:
+                result['ws'] = f"ws://127.0.0.1:{state.port}/devtools/browser/{window_id}"
+            self.send_json(200, {'success': True, 'data': result})
+        elif self.path == '/browser/close':
+            window_id = data.get('id')
+            if window_id not in state.open_windows:
+                self.send_json(200, {'success': False, 'msg': '窗口未打开'})
+                return
+            state.open_windows.discard(window_id)
+            self.send_json(200, {'success': True, 'data': '操作成功'})
+        else:
+            self.send_json(404, {'success': False, 'msg': 'not found'})
+
+
+def start_fake_server(port=0, fail_first=0, delay=0, omit_ws=False):
+    """在后台线程中启动模拟服务，返回 (server, state)；port=0 时自动分配端口"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeBitBrowserHandler)
+    state = FakeBitBrowserState(server.server_address[1], fail_first, delay, omit_ws)
+    # 每个服务实例使用独立的处理类，避免共享状态
+    server.RequestHandlerClass = type('BoundFakeBitBrowserHandler', (FakeBitBrowserHandler,), {'state': state})
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比特浏览器本地API模拟服务")
+    parser.add_argument('--port', type=int, default=54345)
+    parser.add_argument('--fail-first', type=int, default=0, help="前N次打开窗口请求返回500")
+    parser.add_argument('--delay', type=float, default=0, help="每个请求的额外延迟（秒）")
+    parser.add_argument('--omit-ws', action='store_true', help="打开窗口时不返回ws地址")
+    args = parser.parse_args()
+
+    server, state = start_fake_server(args.port, args.fail_first, args.delay, args.omit_ws)
+    print(f"比特浏览器模拟服务已启动: http://127.0.0.1:{state.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import multiprocessing
+import queue
+import time
+import requests
+from PyQt6.QtCore import QThread, pyqtSignal
+from video_analysis_engine import run_engine_worker
+from engine_service import DEFAULT_SERVICE_HOST, DEFAULT_SERVICE_PORT, FINISHED_JOB_STATES, JOB_CANCELLED
+
+class EngineProcessController(QThread):
+    """在子进程中运行分析引擎，负责事件转发、取消、崩溃重启和断点续跑"""
+
+    # 信号定义（与原引擎保持一致，GUI无需关心引擎运行在哪个进程）
+    progress_update = pyqtSignal(str)  # 进度更新信号
+    analysis_complete = pyqtSignal(dict)  # 分析完成信号
+    error_occurred = pyqtSignal(str)  # 错误信号
+
+    def __init__(self, config, max_restarts=3, cancel_grace=30):
+        super().__init__()
+        self.config = config
+        self.max_restarts = max_restarts  # 子进程崩溃后的最大重启次数
+        self.cancel_grace = cancel_grace  # 取消后等待子进程自行退出的时间（秒）
+        # 使用spawn方式启动，避免子进程继承Qt和Playwright的线程状态
+        self.mp_context = multiprocessing.get_context('spawn')
+        self.cancel_event = self.mp_context.Event()
+        self.process = None
+        self.completed_keys = set()  # 已完成的任务键，重启后跳过
+        self.crash_counts = {}  # 每个任务导致崩溃的次数
+        self.current_key = None
+        self.metrics = {}  # 子进程最近一次上报的运行指标
+
+    def cancel(self):
+        """请求取消分析，子进程会在当前视频结束后停止"""
+        if not self.cancel_event.is_set():
+            self.cancel_event.set()
+            self.progress_update.emit("⏹️ 正在取消，当前视频处理结束后停止...")
+
+    def run(self):
+        """主执行方法：启动子进程并在崩溃时重启"""
+        restarts = 0
+        while True:
+            finished = self.run_once()
+            if finished or self.cancel_event.is_set():
+                return
+
+            if restarts >= self.max_restarts:
+                self.error_occurred.emit(f"分析进程连续崩溃 {restarts + 1} 次，已停止。")
+                return
+
+            restarts += 1
+            if self.current_key is not None:
+                self.crash_counts[self.current_key] = self.crash_counts.get(self.current_key, 0) + 1
+            self.progress_update.emit(f"⚠️ 分析进程意外退出，正在从上次完成的位置重启 ({restarts}/{self.max_restarts})...")
+            time.sleep(2)
+
+    def run_once(self):
+        """运行一次子进程，返回是否正常结束（子进程自行退出而非崩溃）"""
+        # 已完成的任务以及连续两次导致崩溃的任务在重启后跳过
+        poisoned_keys = {key for key, count in self.crash_counts.items() if count >= 2}
+        config = dict(self.config)
+        config['skip_keys'] = sorted(self.completed_keys | poisoned_keys)
+        if 'pacing_gap_seconds' in self.metrics:
+            # 重启后沿用崩溃前的节奏，不从初始间隔重新学习
+            config['pacing_initial_gap'] = self.metrics['pacing_gap_seconds']
+        for key in poisoned_keys - self.completed_keys:
+            self.progress_update.emit(f"⚠️ 任务多次导致进程崩溃，已跳过: {key}")
+
+        event_queue = self.mp_context.Queue()
+        self.process = self.mp_context.Process(
+            target=run_engine_worker,
+            args=(config, event_queue, self.cancel_event),
+            daemon=True
+        )
+        self.process.start()
+        self.current_key = None
+
+        exited_cleanly = False
+        cancel_deadline = None
+        while True:
+            try:
+                event = event_queue.get(timeout=0.2)
+            except queue.Empty:
+                event = None
+
+            if event is not None:
+                if event['type'] == 'exit':
+                    exited_cleanly = True
+                    break
+                self.handle_event(event)
+                continue
+
+            if not self.process.is_alive():
+                # 进程已退出，取出残留事件后结束
+                exited_cleanly = self.drain_events(event_queue)
+                break
+
+            if self.cancel_event.is_set():
+                if cancel_deadline is None:
+                    cancel_deadline = time.time() + self.cancel_grace
+                elif time.time() > cancel_deadline:
+                    self.progress_update.emit("⚠️ 分析进程未在规定时间内退出，强制结束。")
+                    self.process.terminate()
+                    self.process.join(5)
+                    self.analysis_complete.emit({'success': False, 'cancelled': True, 'message': '已强制取消分析', 'results_count': 0})
+                    return True
+
+        self.process.join(5)
+        if exited_cleanly:
+            return True
+        if self.cancel_event.is_set():
+            self.analysis_complete.emit({'success': False, 'cancelled': True, 'message': '已取消分析', 'results_count': 0})
+            return True
+        return False
+
+    def drain_events(self, event_queue):
+        """处理子进程退出前留在队列中的事件，返回是否收到了正常退出事件"""
+        exited_cleanly = False
+        while True:
+            try:
+                event = event_queue.get_nowait()
+            except (queue.Empty, EOFError, OSError):
+                return exited_cleanly
+            if event['type'] == 'exit':
+                exited_cleanly = True
+            else:
+                self.handle_event(event)
+
+    def handle_event(self, event):
+        """分发子进程事件"""
+        event_type = event['type']
+        if event_type == 'progress':
+            self.progress_update.emit(event['message'])
+        elif event_type == 'error':
+            self.error_occurred.emit(event['message'])
+        elif event_type == 'item_started':
+            self.current_key = event['key']
+        elif event_type == 'item_finished':
+            if event['success']:
+                self.completed_keys.add(event['key'])
+            self.current_key = None
+        elif event_type == 'metrics':
+            self.metrics = event['metrics']
+        elif event_type == 'complete':
+            self.analysis_complete.emit(event['result'])
+
+
+class ServiceJobController(QThread):
+    """把分析任务提交到常驻服务（engine_service.py），并轮询进度；浏览器连接由服务保持"""
+
+    # 信号定义（与 EngineProcessController 保持一致）
+    progress_update = pyqtSignal(str)  # 进度更新信号
+    analysis_complete = pyqtSignal(dict)  # 分析完成信号
+    error_occurred = pyqtSignal(str)  # 错误信号
+
+    def __init__(self, config, service_url=None, poll_interval=1.0):
+        super().__init__()
+        self.config = config
+        self.service_url = service_url or f"http://{DEFAULT_SERVICE_HOST}:{DEFAULT_SERVICE_PORT}"
+        self.poll_interval = poll_interval
+        self.job_id = None
+        self.cancel_requested = False
+
+    @staticmethod
+    def is_service_available(service_url=None, timeout=0.5):
+        """检测常驻服务是否在运行"""
+        service_url = service_url or f"http://{DEFAULT_SERVICE_HOST}:{DEFAULT_SERVICE_PORT}"
+        try:
+            return requests.get(f"{service_url}/health", timeout=timeout).ok
+        except requests.exceptions.RequestException:
+            return False
+
+    def cancel(self):
+        """请求取消任务"""
+        if self.cancel_requested:
+            return
+        self.cancel_requested = True
+        self.progress_update.emit("⏹️ 正在取消，当前视频处理结束后停止...")
+        if self.job_id:
+            try:
+                requests.post(f"{self.service_url}/jobs/{self.job_id}/cancel", timeout=5)
+            except requests.exceptions.RequestException as e:
+                self.progress_update.emit(f"⚠️ 发送取消请求失败: {e}")
+
+    def run(self):
+        """提交任务并轮询，直到任务结束"""
+        try:
+            res = requests.post(f"{self.service_url}/jobs", json=self.config, timeout=10)
+            data = res.json()
+            if not res.ok:
+                self.error_occurred.emit(f"提交任务到常驻服务失败: {data.get('error', res.status_code)}")
+                return
+            self.job_id = data['job_id']
+            self.progress_update.emit(f"已提交到常驻服务，任务ID: {self.job_id}")
+            if self.cancel_requested:
+                requests.post(f"{self.service_url}/jobs/{self.job_id}/cancel", timeout=5)
+
+            next_event = 0
+            while True:
+                res = requests.get(f"{self.service_url}/jobs/{self.job_id}", params={'since': next_event}, timeout=10)
+                job = res.json()
+                for event in job['events']:
+                    if event['type'] == 'error':
+                        self.error_occurred.emit(event['message'])
+                    else:
+                        self.progress_update.emit(event['message'])
+                next_event = job['next_event']
+
+                if job['status'] in FINISHED_JOB_STATES:
+                    if job['result']:
+                        self.analysis_complete.emit(job['result'])
+                    elif job['status'] == JOB_CANCELLED:
+                        self.analysis_complete.emit({'success': False, 'cancelled': True, 'message': '已取消分析', 'results_count': 0})
+                    return
+                time.sleep(self.poll_interval)
+        except requests.exceptions.RequestException as e:
+            self.error_occurred.emit(f"与常驻服务通信失败: {e}")
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频分析常驻服务
+保持比特浏览器的CDP连接和页面常驻，通过本地HTTP接口接收任务（Excel文件、视频文件夹或单个YouTube链接），
+排队依次执行，并提供状态查询。
+
+启动: python engine_service.py --config service_config.json
+"""
+
+import argparse
+import itertools
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from video_analysis_engine import VideoAnalysisEngine
+
+DEFAULT_SERVICE_HOST = "127.0.0.1"
+DEFAULT_SERVICE_PORT = 54380
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+FINISHED_JOB_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+# 最多保留的已结束任务数，超出时删除最早的，避免长期运行时任务记录（含日志）无限增长
+DEFAULT_MAX_FINISHED_JOBS = 200
+
+
+class AnalysisJob:
+    """一个排队的分析任务"""
+
+    def __init__(self, job_id, config):
+        self.job_id = job_id
+        self.config = config
+        self.status = JOB_QUEUED
+        self.events = []  # 进度和错误日志 [{'type': 'progress'|'error', 'message': ...}]
+        self.result = None
+        self.cancel_event = threading.Event()
+        self.created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.started_at = None
+        self.finished_at = None
+
+    def to_dict(self, since=0):
+        """转换为接口返回的数据，since 用于增量获取日志"""
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'analysis_type': self.config.get('analysis_type'),
+            'source': self.config.get('file_path') or self.config.get('url'),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'result': self.result,
+            'events': self.events[since:],
+            'next_event': len(self.events)
+        }
+
+
+class EngineService:
+    """常驻分析服务：单个工作线程持有引擎和浏览器，按顺序执行任务队列"""
+
+    def __init__(self, base_config):
+        self.base_config = dict(base_config, keep_browser=True)
+        self.jobs = {}
+        self.max_finished_jobs = base_config.get('service_max_finished_jobs', DEFAULT_MAX_FINISHED_JOBS)
+        self.job_queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.job_ids = itertools.count(1)
+        self.current_job = None
+        self.stop_event = threading.Event()
+        # Playwright同步接口要求在创建它的线程中使用，因此引擎只在工作线程内创建和调用
+        self.engine = None
+        self.worker = threading.Thread(target=self.worker_loop, name="engine-worker", daemon=True)
+
+    def start(self):
+        self.worker.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.current_job:
+            self.current_job.cancel_event.set()
+        self.job_queue.put(None)
+        self.worker.join(60)
+
+    def submit(self, job_config):
+        """提交任务，返回任务对象"""
+        analysis_type = job_config.get('analysis_type')
+        if analysis_type not in ('youtube', 'local', 'url'):
+            raise ValueError("analysis_type 必须是 youtube、local 或 url")
+        if analysis_type == 'url' and not job_config.get('url'):
+            raise ValueError("url 任务需要提供 url")
+        if analysis_type != 'url' and not job_config.get('file_path'):
+            raise ValueError("youtube/local 任务需要提供 file_path")
+
+        config = dict(self.base_config)
+        config.update(job_config)
+        config['keep_browser'] = True
+        for required in ('output_path', 'prompt', 'bit_window_id'):
+            if not config.get(required):
+                raise ValueError(f"缺少配置项: {required}")
+
+        with self.lock:
+            job = AnalysisJob(str(next(self.job_ids)), config)
+            self.jobs[job.job_id] = job
+            self.prune_jobs()
+        self.job_queue.put(job.job_id)
+        return job
+
+    def prune_jobs(self):
+        """删除超出保留数量的最早的已结束任务（调用方持有锁）"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_JOB_STATES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def list_jobs(self):
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id):
+        """取消任务：排队中的任务直接取消，运行中的任务在当前视频结束后停止"""
+        job = self.jobs.get(job_id)
+        if not job:
+            return None
+        job.cancel_event.set()
+        with self.lock:
+            if job.status == JOB_QUEUED:
+                job.status = JOB_CANCELLED
+                job.finished_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        return job
+
+    def health(self):
+        """服务状态：浏览器是否保持连接、队列长度"""
+        engine = self.engine
+        browser_ready = False
+        if engine and engine.page is not None:
+            try:
+                browser_ready = not engine.page.is_closed()
+            except Exception:
+                browser_ready = False
+        return {
+            'ok': True,
+            'browser_ready': browser_ready,
+            'queued_jobs': sum(1 for job in self.list_jobs() if job.status == JOB_QUEUED),
+            'running_job': self.current_job.job_id if self.current_job else None,
+            'metrics': engine.get_metrics() if engine else {}
+        }
+
+    def on_event(self, event_type, message):
+        job = self.current_job
+        if job:
+            job.events.append({'type': event_type, 'message': message})
+
+    def on_complete(self, result):
+        job = self.current_job
+        if job:
+            job.result = result
+
+    def worker_loop(self):
+        """工作线程：依次执行排队的任务，任务之间保持浏览器连接"""
+        self.engine = VideoAnalysisEngine(self.base_config)
+        self.engine.progress_update.connect(lambda message: self.on_event('progress', message))
+        self.engine.error_occurred.connect(lambda message: self.on_event('error', message))
+        self.engine.analysis_complete.connect(self.on_complete)
+
+        try:
+            while not self.stop_event.is_set():
+                job_id = self.job_queue.get()
+                if job_id is None:
+                    break
+                job = self.jobs.get(job_id)
+                with self.lock:
+                    if job is None or job.status != JOB_QUEUED:
+                        continue
+                    job.status = JOB_RUNNING
+                    job.started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                self.current_job = job
+                started = time.time()
+                try:
+                    self.engine.apply_config(job.config, job.cancel_event)
+                    self.engine.run()
+                except Exception as e:
+                    job.events.append({'type': 'error', 'message': f"任务执行失败: {e}"})
+                finally:
+                    self.current_job = None
+
+                with self.lock:
+                    if job.result and job.result.get('cancelled'):
+                        job.status = JOB_CANCELLED
+                    elif job.result and job.result.get('success'):
+                        job.status = JOB_COMPLETED
+                    else:
+                        job.status = JOB_FAILED
+                    job.finished_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                job.events.append({'type': 'progress', 'message': f"任务耗时 {time.time() - started:.1f} 秒"})
+        finally:
+            self.engine.cleanup_browser()
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """本地HTTP接口
+
+    POST /jobs              提交任务 {"analysis_type": "youtube|local|url", "file_path"|"url": ..., ...}
+    GET  /jobs              任务列表
+    GET  /jobs/<id>?since=N 任务状态（since 为增量日志起点）
+    POST /jobs/<id>/cancel  取消任务
+    GET  /health            服务和浏览器状态
+    GET  /metrics           运行指标（自适应节奏的当前间隔、最近错误率等）
+    """
+
+    service = None  # 由 run_service 设置
+
+    def log_message(self, format, *args):
+        pass  # 轮询请求很频繁，不打印访问日志
+
+    def send_json(self, status_code, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        body = json.loads(self.rfile.read(length).decode('utf-8'))
+        if not isinstance(body, dict):
+            raise ValueError("请求内容必须是JSON对象")
+        return body
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        parts = [p for p in path.split('/') if p]
+        if parts == ['health']:
+            self.send_json(200, self.service.health())
+        elif parts == ['metrics']:
+            engine = self.service.engine
+            self.send_json(200, engine.get_metrics() if engine else {})
+        elif parts == ['jobs']:
+            jobs = [job.to_dict(since=len(job.events)) for job in self.service.list_jobs()]
+            self.send_json(200, {'jobs': jobs})
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self.service.jobs.get(parts[1])
+            if not job:
+                self.send_json(404, {'error': '任务不存在'})
+                return
+            since = 0
+            for pair in query.split('&'):
+                if pair.startswith('since='):
+                    try:
+                        since = max(0, int(pair[len('since='):]))
+                    except ValueError:
+                        pass
+            self.send_json(200, job.to_dict(since=since))
+        else:
+            self.send_json(404, {'error': '未知接口'})
+
+    def do_POST(self):
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+        try:
+            if parts == ['jobs']:
+                job = self.service.submit(self.read_json())
+                self.send_json(200, job.to_dict())
+            elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+                job = self.service.cancel(parts[1])
+                if not job:
+                    self.send_json(404, {'error': '任务不存在'})
+                else:
+                    self.send_json(200, job.to_dict(since=len(job.events)))
+            else:
+                self.send_json(404, {'error': '未知接口'})
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+
+
+def run_service(base_config, host=DEFAULT_SERVICE_HOST, port=DEFAULT_SERVICE_PORT):
+    """启动常驻服务，阻塞直到 Ctrl+C"""
+    service = EngineService(base_config)
+    service.start()
+    ServiceRequestHandler.service = service
+    server = ThreadingHTTPServer((host, port), ServiceRequestHandler)
+    print(f"视频分析服务已启动: http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("正在停止服务...")
+    finally:
+        server.server_close()
+        service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="视频分析常驻服务")
+    parser.add_argument('--config', help="JSON配置文件，包含 bit_window_id、output_path、prompt、min_delay、max_delay 等默认配置")
+    parser.add_argument('--host', default=DEFAULT_SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_SERVICE_PORT)
+    parser.add_argument('--bit-window-id', help="比特浏览器窗口ID")
+    parser.add_argument('--output-path', help="默认输出路径")
+    parser.add_argument('--prompt-file', help="默认提示词文件")
+    args = parser.parse_args()
+
+    base_config = {}
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            base_config.update(json.load(f))
+    if args.bit_window_id:
+        base_config['bit_window_id'] = args.bit_window_id
+    if args.output_path:
+        base_config['output_path'] = args.output_path
+    if args.prompt_file:
+        with open(args.prompt_file, 'r', encoding='utf-8') as f:
+            base_config['prompt'] = f.read().strip()
+
+    run_service(base_config, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+def open_inotify(folder_path):
+    """在Linux上创建inotify监视，返回文件描述符；不支持时返回None"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | getattr(os, 'O_CLOEXEC', 0))
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, os.fsencode(folder_path), WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+class FolderWatcher:
+    """监视文件夹中新出现的视频：优先使用inotify，不可用时定时扫描；文件大小稳定后才视为写入完成"""
+
+    def __init__(self, folder_path, extensions, stable_seconds=5, poll_interval=2,
+                 rescan_interval=60, use_inotify=True):
+        self.folder_path = folder_path
+        self.extensions = set(extensions)
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval  # inotify模式下的兜底全量扫描间隔
+        self.use_inotify = use_inotify
+        self.inotify_fd = None
+        self.known = set()  # 已交给分析队列的文件
+        self.pending = {}  # 文件路径 -> (大小, 修改时间, 开始保持不变的时间)
+        self.last_scan = 0
+
+    @property
+    def mode(self):
+        return "inotify" if self.inotify_fd is not None else f"每{self.poll_interval}秒扫描"
+
+    def start(self):
+        """开始监视，并把文件夹中已有的视频加入待确认列表"""
+        if self.use_inotify:
+            self.inotify_fd = open_inotify(self.folder_path)
+        self.scan()
+
+    def close(self):
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+    def is_video(self, name):
+        return os.path.splitext(name)[1].lower() in self.extensions
+
+    def add_candidate(self, file_path):
+        if file_path not in self.known and file_path not in self.pending:
+            self.pending[file_path] = None
+
+    def scan(self):
+        """全量扫描文件夹"""
+        self.last_scan = time.time()
+        try:
+            with os.scandir(self.folder_path) as entries:
+                for entry in entries:
+                    if entry.is_file() and self.is_video(entry.name):
+                        self.add_candidate(os.path.join(self.folder_path, entry.name))
+        except OSError:
+            pass
+
+    def read_events(self, timeout):
+        """等待并读取inotify事件，把有变化的视频文件加入待确认列表"""
+        readable, _, _ = select.select([self.inotify_fd], [], [], timeout)
+        if not readable:
+            return
+        try:
+            data = os.read(self.inotify_fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + INOTIFY_EVENT_HEADER.size <= len(data):
+            _, mask, _, name_length = INOTIFY_EVENT_HEADER.unpack_from(data, offset)
+            offset += INOTIFY_EVENT_HEADER.size
+            name = data[offset:offset + name_length].rstrip(b'\0')
+            offset += name_length
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出时可能漏掉文件，改为全量扫描
+                self.scan()
+            elif name:
+                name = os.fsdecode(name)
+                if self.is_video(name):
+                    self.add_candidate(os.path.join(self.folder_path, name))
+
+    def collect_stable(self):
+        """检查待确认的文件，返回大小和修改时间在 stable_seconds 内保持不变的文件"""
+        now = time.time()
+        ready = []
+        for file_path, previous in list(self.pending.items()):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                # 文件已被删除或移走
+                del self.pending[file_path]
+                continue
+            signature = (stat.st_size, stat.st_mtime)
+            if previous is None or previous[:2] != signature:
+                self.pending[file_path] = signature + (now,)
+                continue
+            if stat.st_size > 0 and now - previous[2] >= self.stable_seconds:
+                del self.pending[file_path]
+                self.known.add(file_path)
+                ready.append(file_path)
+        return sorted(ready)
+
+    def wait_for_new_files(self, timeout=1.0):
+        """等待最多 timeout 秒，返回已写入完成的新视频文件（可能为空列表）"""
+        if self.inotify_fd is not None:
+            self.read_events(timeout)
+            if time.time() - self.last_scan >= self.rescan_interval:
+                self.scan()
+        else:
+            time.sleep(timeout)
+            if time.time() - self.last_scan >= self.poll_interval:
+                self.scan()
+        return self.collect_stable()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输出目录布局
+结果很多时，输出目录下直接放几万个视频文件夹会让网络共享和部分文件系统的列目录、同步甚至创建文件夹都变慢。
+支持三种布局：
+  flat - 每个视频一个文件夹，直接放在输出目录下（默认，与以前相同）
+  date - 按分析日期分区，例如 2024/05/<名称>
+  hash - 按名称哈希前缀分片，例如 ab/cd/<名称>
+
+输出目录使用的布局记录在 <输出目录>/.output_layout.json 中（第一次保存结果或迁移后写入），
+之后的分析、重新导出和迁移都按记录的布局查找和保存结果。
+
+迁移已有结果: python output_layout.py migrate --output-path <输出目录> --layout hash [--workers 16] [--dry-run]
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import sqlite3
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+LAYOUT_FLAT = 'flat'
+LAYOUT_DATE = 'date'
+LAYOUT_HASH = 'hash'
+LAYOUTS = (LAYOUT_FLAT, LAYOUT_DATE, LAYOUT_HASH)
+
+LAYOUT_FILE_NAME = ".output_layout.json"
+
+
+class OutputLayout:
+    """根据布局计算视频文件夹相对于输出目录的路径"""
+
+    def __init__(self, layout=LAYOUT_FLAT, date_format='%Y/%m', hash_levels=2):
+        if layout not in LAYOUTS:
+            raise ValueError(f"未知的输出布局: {layout}（可选: {', '.join(LAYOUTS)}）")
+        self.layout = layout
+        self.date_format = date_format
+        self.hash_levels = hash_levels  # 哈希分片的层数，每层两位十六进制（256个子文件夹）
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            layout=config.get('output_layout', LAYOUT_FLAT),
+            date_format=config.get('output_date_format', '%Y/%m'),
+            hash_levels=config.get('output_hash_levels', 2)
+        )
+
+    @classmethod
+    def load(cls, output_path):
+        """读取输出目录记录的布局，没有记录时返回None"""
+        layout_path = os.path.join(output_path, LAYOUT_FILE_NAME)
+        if not os.path.exists(layout_path):
+            return None
+        with open(layout_path, 'r', encoding='utf-8') as f:
+            return cls.from_config(json.load(f))
+
+    def save(self, output_path):
+        """把布局记录到输出目录"""
+        os.makedirs(output_path, exist_ok=True)
+        layout_path = os.path.join(output_path, LAYOUT_FILE_NAME)
+        temp_path = f"{layout_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_config(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, layout_path)
+
+    def to_config(self):
+        return {'output_layout': self.layout, 'output_date_format': self.date_format, 'output_hash_levels': self.hash_levels}
+
+    def __eq__(self, other):
+        return isinstance(other, OutputLayout) and self.to_config() == other.to_config()
+
+    def describe(self):
+        if self.layout == LAYOUT_DATE:
+            return f"{self.layout}（{self.date_format}）"
+        if self.layout == LAYOUT_HASH:
+            return f"{self.layout}（{self.hash_levels}层）"
+        return self.layout
+
+    def relative_dir(self, name, when=None):
+        """视频文件夹的相对路径；date 布局按 when（默认当前时间）分区"""
+        if self.layout == LAYOUT_HASH:
+            digest = hashlib.sha1(name.encode('utf-8')).hexdigest()
+            return os.path.join(*[digest[level * 2:level * 2 + 2] for level in range(self.hash_levels)], name)
+        if self.layout == LAYOUT_DATE:
+            return os.path.join(*(when or datetime.now()).strftime(self.date_format).split('/'), name)
+        return name
+
+
+def find_video_folders(output_path):
+    """在任意布局的输出目录中找出所有视频文件夹：文件夹中有以文件夹名开头的结果文件（名称.xlsx、名称_xxx.txt等）"""
+    folders = []
+    for root, dirs, files in os.walk(output_path):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]  # 跳过清单、归档、缓存等隐藏目录
+        if root == output_path:
+            continue
+        name = os.path.basename(root)
+        if any(os.path.splitext(f)[0] == name or f.startswith(name + "_") for f in files):
+            folders.append(root)
+            dirs[:] = []  # 视频文件夹内不再继续查找
+    return folders
+
+
+def folder_time(folder):
+    """视频文件夹的结果保存时间（取最早的结果文件修改时间），用于按日期分区"""
+    times = [os.path.getmtime(os.path.join(folder, f)) for f in os.listdir(folder)
+             if os.path.isfile(os.path.join(folder, f))]
+    return datetime.fromtimestamp(min(times)) if times else datetime.now()
+
+
+def move_folder(source, target):
+    """移动一个视频文件夹，返回 (源路径, 目标路径, 错误信息)"""
+    try:
+        if os.path.exists(target):
+            return source, target, "目标已存在"
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.move(source, target)
+        return source, target, None
+    except Exception as e:
+        return source, target, str(e)
+
+
+def remove_empty_parents(path, stop_at):
+    """删除迁移后留下的空分区/分片文件夹"""
+    path = os.path.dirname(path)
+    while os.path.abspath(path) != os.path.abspath(stop_at):
+        try:
+            os.rmdir(path)
+        except OSError:
+            break
+        path = os.path.dirname(path)
+
+
+def update_manifest_paths(output_path, moves):
+    """更新输出清单中记录的文件路径"""
+    from output_manifest import MANIFEST_FILE_NAME
+
+    manifest_path = os.path.join(output_path, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path) or not moves:
+        return 0
+    moved_dirs = {os.path.abspath(source): target for source, target in moves}
+    conn = sqlite3.connect(manifest_path, timeout=30)
+    updated = 0
+    with conn:
+        for row_id, output_file in conn.execute("SELECT id, output_file FROM storyboards").fetchall():
+            if not output_file:
+                continue
+            target = moved_dirs.get(os.path.abspath(os.path.dirname(output_file)))
+            if target:
+                conn.execute("UPDATE storyboards SET output_file = ? WHERE id = ?",
+                             (os.path.join(target, os.path.basename(output_file)), row_id))
+                updated += 1
+    conn.close()
+    return updated
+
+
+def migrate(output_path, layout, workers=16, dry_run=False, log=print):
+    """把输出目录中已有的视频文件夹并行移动到新布局并记录新布局，返回 (移动数, 失败数)"""
+    started = time.time()
+    current = OutputLayout.load(output_path)
+    log(f"输出目录当前记录的布局: {current.describe() if current else '未记录'}，目标布局: {layout.describe()}")
+    folders = find_video_folders(output_path)
+    plan = []
+    for folder in folders:
+        name = os.path.basename(folder)
+        when = folder_time(folder) if layout.layout == LAYOUT_DATE else None
+        target = os.path.join(output_path, layout.relative_dir(name, when))
+        if os.path.abspath(target) != os.path.abspath(folder):
+            plan.append((folder, target))
+    log(f"共找到 {len(folders)} 个视频文件夹，其中 {len(plan)} 个需要移动到 {layout.layout} 布局")
+    if dry_run:
+        for source, target in plan[:20]:
+            log(f"  {os.path.relpath(source, output_path)} -> {os.path.relpath(target, output_path)}")
+        return 0, 0
+
+    moves, failed = [], 0
+    # 移动主要是文件系统元数据操作（网络共享上延迟较高），用线程池并行
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for source, target, error in executor.map(lambda pair: move_folder(*pair), plan):
+            if error:
+                failed += 1
+                log(f"❌ {os.path.relpath(source, output_path)}: {error}")
+            else:
+                moves.append((source, target))
+    for source, _ in moves:
+        remove_empty_parents(source, output_path)
+    updated = update_manifest_paths(output_path, moves)
+    # 之后的分析和重新导出按记录的布局保存；个别文件夹移动失败时重新运行迁移即可
+    layout.save(output_path)
+    log(f"迁移完成: 移动 {len(moves)} 个，失败 {failed} 个，更新清单记录 {updated} 条，用时 {time.time() - started:.1f} 秒")
+    if failed:
+        log("⚠️ 部分文件夹移动失败，仍在原位置，请处理后重新运行迁移")
+    return len(moves), failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="输出目录布局迁移")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help="把已有结果移动到新布局")
+    migrate_parser.add_argument('--output-path', required=True, help="输出目录")
+    migrate_parser.add_argument('--layout', required=True, choices=LAYOUTS, help="目标布局")
+    migrate_parser.add_argument('--date-format', default='%Y/%m', help="date 布局的分区格式，默认 %%Y/%%m")
+    migrate_parser.add_argument('--hash-levels', type=int, default=2, help="hash 布局的分片层数，默认2")
+    migrate_parser.add_argument('--workers', type=int, default=16, help="并行移动的线程数")
+    migrate_parser.add_argument('--dry-run', action='store_true', help="只显示迁移计划，不移动")
+    args = parser.parse_args()
+
+    layout = OutputLayout(args.layout, args.date_format, args.hash_levels)
+    migrate(args.output_path, layout, args.workers, args.dry_run)
+    if not args.dry_run:
+        print(f"新布局已记录到 {os.path.join(args.output_path, LAYOUT_FILE_NAME)}，之后的分析和重新导出自动按该布局保存。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输出清单
+每个保存的分镜表都记录到输出目录下的SQLite数据库：视频键、输出文件夹名、输出文件、提示词哈希、分镜行和分析耗时。
+分镜提示词建立FTS5全文索引（trigram分词，支持中文子串搜索），查找某个分镜出自哪个视频、某个视频是否已分析都只需毫秒。
+清理后的文件夹名由清单统一分配，不同视频清理后同名时自动加序号，不会互相覆盖。
+
+搜索分镜: python output_manifest.py search --output-path <输出目录> "关键词"
+查询视频: python output_manifest.py check --output-path <输出目录> <视频键或标题>
+"""
+
+import os
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+
+MANIFEST_FILE_NAME = ".output_manifest.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS names (
+    name TEXT PRIMARY KEY COLLATE NOCASE,
+    video_key TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS storyboards (
+    id INTEGER PRIMARY KEY,
+    video_key TEXT NOT NULL,
+    variant TEXT NOT NULL DEFAULT '',
+    title TEXT,
+    name TEXT,
+    output_file TEXT,
+    prompt_hash TEXT,
+    shot_count INTEGER,
+    analysis_seconds REAL,
+    saved_at TEXT,
+    UNIQUE (video_key, variant)
+);
+CREATE INDEX IF NOT EXISTS storyboards_title ON storyboards (title);
+CREATE TABLE IF NOT EXISTS shots (
+    storyboard_id INTEGER NOT NULL,
+    shot INTEGER,
+    keyframe_prompt TEXT,
+    video_prompt TEXT
+);
+CREATE INDEX IF NOT EXISTS shots_storyboard ON shots (storyboard_id);
+"""
+
+# trigram分词按3个字符切分，中文没有空格也能按子串匹配
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS shots_fts USING fts5(
+    keyframe_prompt, video_prompt, storyboard_id UNINDEXED, shot UNINDEXED, tokenize='trigram'
+)
+"""
+FTS_MIN_QUERY_LENGTH = 3  # trigram索引无法匹配更短的查询，此时退回LIKE扫描
+
+
+class OutputManifest:
+    """输出清单：记录保存的分镜表、分配不冲突的输出文件夹名、全文搜索分镜提示词"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        # 常驻服务中可能在不同线程中使用；多个进程同时写入时等待锁
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.execute(FTS_SCHEMA)
+            self.fts_enabled = True
+        except sqlite3.OperationalError:  # SQLite版本过旧，没有FTS5或trigram分词
+            self.fts_enabled = False
+        self.conn.commit()
+
+    @classmethod
+    def for_output(cls, output_path):
+        os.makedirs(output_path, exist_ok=True)
+        return cls(os.path.join(output_path, MANIFEST_FILE_NAME))
+
+    def close(self):
+        self.conn.close()
+
+    def name_for(self, key):
+        row = self.conn.execute("SELECT name FROM names WHERE video_key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def reserve_name(self, key, base_name, max_length=100, exists=None):
+        """为视频分配输出文件夹名：同一视频始终使用同一个名字，与其他视频冲突时加 _2、_3 等序号
+
+        exists(name) 用于检查清单建立之前已有的同名文件夹，避免覆盖。
+        """
+        number = 1
+        while True:
+            name = self.name_for(key)
+            if name:
+                return name
+            if number == 1:
+                candidate = base_name
+            else:
+                suffix = f"_{number}"
+                candidate = base_name[:max_length - len(suffix)].rstrip() + suffix
+            number += 1
+            if exists and exists(candidate):
+                continue
+            try:
+                with self.conn:
+                    self.conn.execute("INSERT INTO names (name, video_key) VALUES (?, ?)", (candidate, key))
+                return candidate
+            except sqlite3.IntegrityError:
+                # 名字已被其他视频占用，或其他进程刚为该视频分配了名字（下一轮循环会读到）
+                continue
+
+    def record(self, key, title, name, output_file, prompt_hash, rows, analysis_seconds=None, variant=''):
+        """记录（或更新）一个保存的分镜表及其分镜行"""
+        with self.conn:
+            self.conn.execute(
+                """INSERT INTO storyboards (video_key, variant, title, name, output_file, prompt_hash,
+                                            shot_count, analysis_seconds, saved_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (video_key, variant) DO UPDATE SET
+                       title = excluded.title, name = excluded.name, output_file = excluded.output_file,
+                       prompt_hash = excluded.prompt_hash, shot_count = excluded.shot_count,
+                       analysis_seconds = COALESCE(excluded.analysis_seconds, storyboards.analysis_seconds),
+                       saved_at = excluded.saved_at""",
+                (key, variant or '', title, name, output_file, prompt_hash, len(rows), analysis_seconds,
+                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            storyboard_id = self.conn.execute(
+                "SELECT id FROM storyboards WHERE video_key = ? AND variant = ?", (key, variant or '')
+            ).fetchone()[0]
+            # 全文索引的rowid与shots表的rowid一致，按rowid删除旧索引，不需要扫描整个索引
+            if self.fts_enabled:
+                self.conn.execute(
+                    "DELETE FROM shots_fts WHERE rowid IN (SELECT rowid FROM shots WHERE storyboard_id = ?)",
+                    (storyboard_id,))
+            self.conn.execute("DELETE FROM shots WHERE storyboard_id = ?", (storyboard_id,))
+            for shot, keyframe, video in rows:
+                cursor = self.conn.execute(
+                    "INSERT INTO shots (storyboard_id, shot, keyframe_prompt, video_prompt) VALUES (?, ?, ?, ?)",
+                    (storyboard_id, shot, keyframe, video))
+                if self.fts_enabled:
+                    self.conn.execute(
+                        "INSERT INTO shots_fts (rowid, keyframe_prompt, video_prompt, storyboard_id, shot) VALUES (?, ?, ?, ?, ?)",
+                        (cursor.lastrowid, keyframe, video, storyboard_id, shot))
+        return storyboard_id
+
+    def output_file_for_name(self, name):
+        """该文件夹名对应视频上次保存的分镜表文件"""
+        row = self.conn.execute(
+            "SELECT output_file FROM storyboards WHERE name = ? AND variant = '' ORDER BY saved_at DESC LIMIT 1", (name,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def is_analyzed(self, key):
+        """视频是否已保存过分镜表"""
+        return self.conn.execute(
+            "SELECT 1 FROM storyboards WHERE video_key = ? AND variant = ''", (key,)
+        ).fetchone() is not None
+
+    def analyzed_keys(self, keys):
+        """批量检查，返回已保存过分镜表的视频键集合"""
+        keys = list(keys)
+        found = set()
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            found.update(row[0] for row in self.conn.execute(
+                f"SELECT video_key FROM storyboards WHERE variant = '' AND video_key IN ({placeholders})", batch))
+        return found
+
+    def lookup(self, text, limit=20):
+        """按视频键精确查找，或按标题/文件夹名模糊查找"""
+        columns = "video_key, variant, title, name, output_file, prompt_hash, shot_count, analysis_seconds, saved_at"
+        rows = self.conn.execute(f"SELECT {columns} FROM storyboards WHERE video_key = ?", (text,)).fetchall()
+        if not rows:
+            pattern = f"%{text}%"
+            rows = self.conn.execute(
+                f"SELECT {columns} FROM storyboards WHERE title LIKE ? OR name LIKE ? ORDER BY saved_at DESC LIMIT ?",
+                (pattern, pattern, limit)).fetchall()
+        names = columns.split(", ")
+        return [dict(zip(names, row)) for row in rows]
+
+    def search(self, query, limit=50):
+        """在分镜提示词中搜索，返回 [{'video_key', 'title', 'output_file', 'shot', 'keyframe_prompt', 'video_prompt'}]"""
+        if self.fts_enabled and len(query) >= FTS_MIN_QUERY_LENGTH:
+            phrase = '"' + query.replace('"', '""') + '"'
+            rows = self.conn.execute(
+                """SELECT s.video_key, s.title, s.output_file, f.shot, f.keyframe_prompt, f.video_prompt
+                   FROM shots_fts f JOIN storyboards s ON s.id = f.storyboard_id
+                   WHERE shots_fts MATCH ? ORDER BY rank LIMIT ?""", (phrase, limit)).fetchall()
+        else:
+            pattern = f"%{query}%"
+            rows = self.conn.execute(
+                """SELECT s.video_key, s.title, s.output_file, h.shot, h.keyframe_prompt, h.video_prompt
+                   FROM shots h JOIN storyboards s ON s.id = h.storyboard_id
+                   WHERE h.keyframe_prompt LIKE ? OR h.video_prompt LIKE ? LIMIT ?""",
+                (pattern, pattern, limit)).fetchall()
+        names = ('video_key', 'title', 'output_file', 'shot', 'keyframe_prompt', 'video_prompt')
+        return [dict(zip(names, row)) for row in rows]
+
+    def stats(self):
+        storyboard_count, shot_total, seconds = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(shot_count), 0), AVG(analysis_seconds) FROM storyboards WHERE variant = ''"
+        ).fetchone()
+        return {'videos': storyboard_count, 'shots': shot_total,
+                'avg_analysis_seconds': round(seconds, 1) if seconds is not None else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="输出清单：搜索分镜提示词、查询视频是否已分析")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    search_parser = subparsers.add_parser('search', help="在分镜提示词中搜索")
+    search_parser.add_argument('query')
+    search_parser.add_argument('--limit', type=int, default=50)
+    check_parser = subparsers.add_parser('check', help="按视频键或标题查询是否已分析")
+    check_parser.add_argument('text')
+    subparsers.add_parser('stats', help="清单统计")
+    for sub in subparsers.choices.values():
+        sub.add_argument('--output-path', required=True, help="输出目录")
+    args = parser.parse_args()
+
+    manifest_path = os.path.join(args.output_path, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        print(f"没有找到输出清单: {manifest_path}")
+        return
+    manifest = OutputManifest(manifest_path)
+    started = time.time()
+    if args.command == 'search':
+        results = manifest.search(args.query, args.limit)
+        for result in results:
+            print(f"[{result['title']}] 分镜{result['shot']}  {result['output_file']}")
+            print(f"    关键帧: {result['keyframe_prompt']}")
+            print(f"    图生视频: {result['video_prompt']}")
+        print(f"共 {len(results)} 条结果（{(time.time() - started) * 1000:.1f} 毫秒）")
+    elif args.command == 'check':
+        results = manifest.lookup(args.text)
+        for result in results:
+            name = f"{result['title']}" + (f" [{result['variant']}]" if result['variant'] else "")
+            print(f"✅ {name}: {result['shot_count']} 个分镜，保存于 {result['saved_at']} -> {result['output_file']}")
+        if not results:
+            print("❌ 未分析")
+    else:
+        for name, value in manifest.stats().items():
+            print(f"{name}: {value}")
+    manifest.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import time
+
+# CDP Performance.getMetrics 返回的指标中需要记录的部分
+TRACKED_METRICS = ('JSHeapUsedSize', 'JSHeapTotalSize', 'Nodes', 'Documents', 'JSEventListeners')
+
+
+def parse_metrics(raw):
+    """把CDP返回的 {'metrics': [{'name', 'value'}]} 整理为页面内存采样"""
+    values = {entry['name']: entry['value'] for entry in (raw or {}).get('metrics', [])}
+    return {
+        'heap_mb': round(values.get('JSHeapUsedSize', 0) / 1024 / 1024, 1),
+        'heap_total_mb': round(values.get('JSHeapTotalSize', 0) / 1024 / 1024, 1),
+        'dom_nodes': int(values.get('Nodes', 0)),
+        'documents': int(values.get('Documents', 0)),
+        'listeners': int(values.get('JSEventListeners', 0)),
+        'sampled_at': time.time()
+    }
+
+
+class PageRecycler:
+    """标签页回收策略：根据页面内存采样和已处理的视频数决定何时关闭旧页面、换用新标签页
+
+    同一个页面处理几百个长对话后，渲染进程的JS堆和DOM节点不断增长，每一步操作都越来越慢。
+    每个视频结束后采样一次，JS堆超过 heap_limit_mb、DOM节点超过 dom_node_limit，
+    或当前页面已处理 max_items 个视频时回收页面；任一阈值为0表示不按该项回收。
+    """
+
+    def __init__(self, max_items=100, heap_limit_mb=1024, dom_node_limit=150000):
+        self.max_items = max_items
+        self.heap_limit_mb = heap_limit_mb
+        self.dom_node_limit = dom_node_limit
+        self.items_on_page = 0  # 当前页面已处理的视频数
+        self.last_sample = None
+        self.peak_heap_mb = 0
+        self.peak_dom_nodes = 0
+        self.samples = 0
+        self.recycles = 0
+        self.last_reason = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            max_items=config.get('recycle_page_after_items', 100),
+            heap_limit_mb=config.get('recycle_page_heap_mb', 1024),
+            dom_node_limit=config.get('recycle_page_dom_nodes', 150000)
+        )
+
+    def record_item(self, sample=None):
+        """记录当前页面处理完一个视频（sample 为此时的内存采样，采样失败时为None），需要回收时返回原因"""
+        self.items_on_page += 1
+        if sample:
+            self.samples += 1
+            self.last_sample = sample
+            self.peak_heap_mb = max(self.peak_heap_mb, sample['heap_mb'])
+            self.peak_dom_nodes = max(self.peak_dom_nodes, sample['dom_nodes'])
+            if self.heap_limit_mb and sample['heap_mb'] >= self.heap_limit_mb:
+                return f"JS堆 {sample['heap_mb']:.0f} MB 超过 {self.heap_limit_mb} MB"
+            if self.dom_node_limit and sample['dom_nodes'] >= self.dom_node_limit:
+                return f"DOM节点 {sample['dom_nodes']} 个超过 {self.dom_node_limit} 个"
+        if self.max_items and self.items_on_page >= self.max_items:
+            return f"当前页面已处理 {self.items_on_page} 个视频"
+        return None
+
+    def page_replaced(self, reason=None):
+        """页面已换成新标签页（回收或重新连接浏览器），重新开始计数"""
+        self.items_on_page = 0
+        if reason:
+            self.recycles += 1
+            self.last_reason = reason
+
+    def metrics(self):
+        return {
+            'items_on_page': self.items_on_page,
+            'last_sample': self.last_sample,
+            'peak_heap_mb': self.peak_heap_mb,
+            'peak_dom_nodes': self.peak_dom_nodes,
+            'samples': self.samples,
+            'recycles': self.recycles,
+            'last_recycle_reason': self.last_reason
+        }
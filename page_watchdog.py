@@ -0,0 +1,90 @@
+import time
+
+# 页面存活探测：渲染进程卡死时 wait_for_function 在超时后抛出异常，而 evaluate 会一直等待
+PROBE_SCRIPT = "() => true"
+
+
+class PageWatchdog:
+    """页面与浏览器连接的看门狗：监听渲染进程崩溃、页面关闭和CDP连接断开事件，并用带超时的探测发现卡死的页面
+
+    事件只在Playwright处理消息时（任何页面操作期间）送达，因此调用方在每个视频开始前、
+    长时间等待期间和任务失败时调用 check()，发现页面失效后断开旧连接、重新打开比特浏览器窗口并连接。
+    """
+
+    def __init__(self, probe_timeout=10000, probe_interval=30, reconnect_attempts=3, reconnect_delay=5):
+        self.probe_timeout = probe_timeout  # 毫秒
+        self.probe_interval = probe_interval  # 长时间等待期间两次探测之间的秒数
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay  # 第一次重连失败后的等待秒数，之后每次翻倍
+        self.crashed_pages = set()
+        self.disconnected = False
+        self.last_probe = 0
+        self.events = []  # 最近的失效记录 (时间, 原因)
+        self.reconnects = 0
+        self.recovery_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            probe_timeout=config.get('watchdog_probe_timeout', 10000),
+            probe_interval=config.get('watchdog_probe_interval', 30),
+            reconnect_attempts=config.get('browser_reconnect_attempts', 3),
+            reconnect_delay=config.get('browser_reconnect_delay', 5)
+        )
+
+    def attach(self, browser, context):
+        """连接浏览器后注册事件；之后在该上下文中打开的标签页（预热、回收）自动加入监听"""
+        self.crashed_pages = set()
+        self.disconnected = False
+        browser.on("disconnected", lambda _browser: self.mark_disconnected())
+        context.on("page", self.watch_page)
+        for page in context.pages:
+            self.watch_page(page)
+
+    def watch_page(self, page):
+        page.on("crash", lambda crashed_page: self.crashed_pages.add(crashed_page))
+
+    def mark_disconnected(self):
+        self.disconnected = True
+
+    def check(self, browser, page, probe=True):
+        """页面失效时返回原因，正常时返回None；probe 为True时对页面做一次带超时的存活探测"""
+        if self.disconnected or (browser is not None and not browser.is_connected()):
+            return "浏览器连接已断开"
+        if page is None:
+            return None
+        if page in self.crashed_pages:
+            return "页面渲染进程崩溃"
+        if page.is_closed():
+            return "页面已被关闭"
+        if probe:
+            self.last_probe = time.time()
+            try:
+                page.wait_for_function(PROBE_SCRIPT, timeout=self.probe_timeout)
+            except Exception as e:
+                if self.disconnected or page in self.crashed_pages:
+                    return self.check(browser, page, probe=False)
+                return f"页面 {self.probe_timeout / 1000:.0f} 秒内没有响应（{str(e).splitlines()[0]}）"
+        return None
+
+    def probe_due(self):
+        """长时间等待期间是否该再探测一次"""
+        return time.time() - self.last_probe >= self.probe_interval
+
+    def reconnect_delays(self):
+        """每次重连之前的等待秒数，第一次立即重连"""
+        return [0] + [self.reconnect_delay * (2 ** attempt) for attempt in range(self.reconnect_attempts - 1)]
+
+    def record_failure(self, reason):
+        self.events = (self.events + [(time.strftime('%Y-%m-%d %H:%M:%S'), reason)])[-10:]
+
+    def record_recovery(self, seconds):
+        self.reconnects += 1
+        self.recovery_seconds += seconds
+
+    def metrics(self):
+        return {
+            'reconnects': self.reconnects,
+            'avg_recovery_seconds': round(self.recovery_seconds / self.reconnects, 1) if self.reconnects else None,
+            'recent_failures': [f"{when} {reason}" for when, reason in self.events]
+        }
@@ -0,0 +1,58 @@
+import re
+
+# 提示词结果的格式
+FORMAT_TABLE = 'table'  # 分镜表：解析表格、检查截断续写、导出Excel
+FORMAT_TEXT = 'text'  # 普通文本（风格分析、摘要等）：原样保存为文本文件
+
+DEFAULT_PRIMARY_NAME = "分镜表"
+
+# 提示词文本中的分隔行：===== 名称 =====，名称后加"(表格)"表示该提示词的结果按分镜表解析
+SEPARATOR_PATTERN = re.compile(r'^={5,}\s*(.*?)\s*=*\s*$')
+TABLE_MARKER_PATTERN = re.compile(r'\s*[(（]\s*表格\s*[)）]\s*$')
+
+
+def split_prompt_text(text):
+    """按分隔行把提示词文本拆分为 [{'name', 'prompt', 'format'}]；第一个分隔行之前的内容是第一个提示词"""
+    prompts = []
+    name, format_, lines = DEFAULT_PRIMARY_NAME, FORMAT_TABLE, []
+    for line in text.split('\n'):
+        match = SEPARATOR_PATTERN.match(line.strip())
+        if not match:
+            lines.append(line)
+            continue
+        prompts.append({'name': name, 'prompt': '\n'.join(lines).strip(), 'format': format_})
+        label = match.group(1)
+        format_ = FORMAT_TABLE if TABLE_MARKER_PATTERN.search(label) else FORMAT_TEXT
+        name = TABLE_MARKER_PATTERN.sub('', label) or f"提示词{len(prompts) + 1}"
+        lines = []
+    prompts.append({'name': name, 'prompt': '\n'.join(lines).strip(), 'format': format_})
+    return [prompt for prompt in prompts if prompt['prompt']]
+
+
+def normalize_prompts(prompt_config):
+    """把配置中的提示词整理为 [{'name', 'prompt', 'format'}]
+
+    prompt_config 可以是字符串（可用分隔行写多个提示词）或列表，
+    列表元素为字符串或 {'name': 名称, 'prompt': 提示词, 'format': 'table'/'text'}。
+    第一个提示词总是分镜表，结果按原来的文件名保存；其余默认是普通文本。
+    """
+    if isinstance(prompt_config, str):
+        prompt_config = split_prompt_text(prompt_config) or [prompt_config]
+
+    prompts = []
+    used_names = set()
+    for index, entry in enumerate(prompt_config or []):
+        if isinstance(entry, str):
+            entry = {'prompt': entry}
+        default_name = DEFAULT_PRIMARY_NAME if index == 0 else f"提示词{index + 1}"
+        name = entry.get('name') or default_name
+        if name in used_names:
+            name = f"{name}_{index + 1}"
+        used_names.add(name)
+        prompts.append({
+            'name': name,
+            'prompt': entry.get('prompt', ''),
+            # 第一个提示词的结果是分镜表，决定任务是否成功
+            'format': FORMAT_TABLE if index == 0 else (entry.get('format') or FORMAT_TEXT)
+        })
+    return prompts or [{'name': DEFAULT_PRIMARY_NAME, 'prompt': '', 'format': FORMAT_TABLE}]
@@ -0,0 +1,146 @@
+import time
+
+# 默认拦截的资源类型：只拦截字体，图片和媒体可能用于上传后的视频预览，需要时通过配置开启
+DEFAULT_BLOCKED_RESOURCE_TYPES = ('font',)
+
+# 默认拦截的URL（包含即匹配，不区分大小写）：统计、广告和遥测上报，以及网页字体的样式表
+DEFAULT_BLOCKED_URL_PATTERNS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'play.google.com/log',
+    'fonts.googleapis.com',
+)
+
+# 用于估算节省流量的已知大小最多记录的URL数
+MAX_KNOWN_SIZES = 5000
+
+
+def format_bytes(size_bytes):
+    if size_bytes >= 1024 * 1024:
+        return f"{size_bytes / 1024 / 1024:.1f} MB"
+    return f"{size_bytes / 1024:.0f} KB"
+
+
+def url_key(url):
+    """去掉查询参数，同一个资源带不同时间戳等参数时按同一个URL记录大小"""
+    return url.split('?', 1)[0].split('#', 1)[0]
+
+
+class RequestFilter:
+    """新对话页面的请求过滤：拦截自动化流程用不到的字体和遥测请求，统计拦截数、节省流量和页面加载用时
+
+    只在导航到新对话页面期间注册到该页面（page.route，加载完成后 unroute），不影响之后的上传和预览。
+
+    允许列表优先于拦截规则。observe 为True时只统计会被拦截的请求和它们的实际大小，不拦截，
+    可先用来确认过滤规则不影响流程并测量节省的流量；拦截模式下节省的流量按观察到的大小估算，
+    没有观察过的请求计入"大小未知"。
+    """
+
+    def __init__(self, enabled=True, resource_types=DEFAULT_BLOCKED_RESOURCE_TYPES,
+                 url_patterns=DEFAULT_BLOCKED_URL_PATTERNS, allow_patterns=(), observe=False):
+        self.enabled = enabled
+        self.resource_types = set(resource_types)
+        self.url_patterns = [pattern.lower() for pattern in url_patterns]
+        self.allow_patterns = [pattern.lower() for pattern in allow_patterns]
+        self.observe = observe
+        self.action_name = "可拦截" if observe else "拦截"  # 日志中的说法，观察模式下请求并没有被拦截
+        self.known_sizes = {}  # URL（不含查询参数） -> 观察到的响应大小
+        self.observed = set()  # 观察模式下等待完成的请求
+        self.blocked = 0
+        self.blocked_by_reason = {}
+        self.bytes_saved = 0
+        self.unknown_sizes = 0
+        self.page_loads = 0
+        self.load_seconds = 0.0
+        self.load_started_counts = (0, 0)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            enabled=config.get('request_filter', True),
+            resource_types=config.get('request_filter_resource_types', DEFAULT_BLOCKED_RESOURCE_TYPES),
+            url_patterns=config.get('request_filter_url_patterns', DEFAULT_BLOCKED_URL_PATTERNS),
+            allow_patterns=config.get('request_filter_allow_patterns', ()),
+            observe=config.get('request_filter_mode', 'block') == 'observe'
+        )
+
+    def match(self, resource_type, url):
+        """请求需要拦截时返回原因（资源类型或匹配的URL规则），否则返回None"""
+        lowered = url.lower()
+        if not lowered.startswith('http') or any(pattern in lowered for pattern in self.allow_patterns):
+            return None
+        if resource_type in self.resource_types:
+            return resource_type
+        for pattern in self.url_patterns:
+            if pattern in lowered:
+                return pattern
+        return None
+
+    def handle_route(self, route):
+        """page.route / context.route 的处理函数"""
+        request = route.request
+        if not self.enabled:
+            route.fallback()
+            return
+        reason = self.match(request.resource_type, request.url)
+        if reason is None:
+            route.fallback()
+            return
+        if self.observe:
+            self.observed.add(request)
+            self.count(reason, None)
+            route.fallback()
+            return
+        self.count(reason, self.known_sizes.get(url_key(request.url)))
+        route.abort('blockedbyclient')
+
+    def count(self, reason, size):
+        self.blocked += 1
+        self.blocked_by_reason[reason] = self.blocked_by_reason.get(reason, 0) + 1
+        if size is None:
+            if not self.observe:
+                self.unknown_sizes += 1
+        else:
+            self.bytes_saved += size
+
+    def handle_request_finished(self, request):
+        """观察模式下记录会被拦截的请求的实际大小（requestfinished 事件）"""
+        if request not in self.observed:
+            return
+        self.observed.discard(request)
+        try:
+            sizes = request.sizes()
+            size = sizes['responseBodySize'] + sizes['responseHeadersSize']
+        except Exception:
+            return
+        self.bytes_saved += size
+        if len(self.known_sizes) < MAX_KNOWN_SIZES:
+            self.known_sizes[url_key(request.url)] = size
+
+    def handle_request_failed(self, request):
+        self.observed.discard(request)
+
+    def begin_load(self):
+        """开始加载一个新对话页面，记录此时的拦截计数"""
+        self.load_started_counts = (self.blocked, self.bytes_saved)
+
+    def finish_load(self, started):
+        """页面加载完成，返回本次加载的 (用时秒数, 拦截请求数, 节省字节数)"""
+        seconds = time.time() - started
+        self.page_loads += 1
+        self.load_seconds += seconds
+        blocked, bytes_saved = self.load_started_counts
+        return seconds, self.blocked - blocked, self.bytes_saved - bytes_saved
+
+    def metrics(self):
+        return {
+            'enabled': self.enabled,
+            'mode': 'observe' if self.observe else 'block',
+            'blocked_requests': self.blocked,
+            'blocked_by_reason': dict(self.blocked_by_reason),
+            'bytes_saved': self.bytes_saved,
+            'unknown_size_requests': self.unknown_sizes,
+            'page_loads': self.page_loads,
+            'avg_load_seconds': round(self.load_seconds / self.page_loads, 2) if self.page_loads else None
+        }
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型原始回复归档
+每次获取到的分析结果都压缩保存，并按 视频键 + 提示词哈希 建立索引。
+解析逻辑修复后，可以离线用进程池重新解析归档的回复并重新导出Excel，不需要打开浏览器重新生成。
+
+重新导出: python response_archive.py reexport --output-path <输出目录> [--workers 8] [--key 关键字] [--prompt-hash 哈希] [--layout hash]
+查看归档: python response_archive.py list --output-path <输出目录>
+"""
+
+import os
+import gzip
+import json
+import time
+import hashlib
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from output_layout import OutputLayout, LAYOUTS
+
+# 回复类型
+ROLE_ANSWER = 'answer'  # 一次完整生成（包括对话中的重新生成），会替换之前的结果
+ROLE_CONTINUATION = 'continuation'  # 截断后的续写，与之前的结果合并
+
+
+def prompt_hash(prompt):
+    """提示词哈希，用于区分不同提示词生成的回复"""
+    return hashlib.sha1((prompt or '').encode('utf-8')).hexdigest()[:12]
+
+
+class ResponseArchive:
+    """原始回复归档：回复内容按哈希压缩存储（相同内容只存一份），索引逐行追加到 index.jsonl"""
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        self.index_path = os.path.join(archive_dir, "index.jsonl")
+        os.makedirs(os.path.join(archive_dir, "objects"), exist_ok=True)
+
+    def object_path(self, content_hash):
+        return os.path.join(self.archive_dir, "objects", content_hash[:2], f"{content_hash}.txt.gz")
+
+    def add(self, key, title, prompt, content, role=ROLE_ANSWER, **extra):
+        """归档一条回复，返回索引记录"""
+        data = content.encode('utf-8')
+        content_hash = hashlib.sha1(data).hexdigest()
+        path = self.object_path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = path + ".tmp"
+            with gzip.open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+        record = {
+            'key': key,
+            'title': title,
+            'prompt_hash': prompt_hash(prompt),
+            'content_hash': content_hash,
+            'role': role,
+            'archived_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'ts': time.time()
+        }
+        record.update(extra)
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+        return record
+
+    def read(self, content_hash):
+        with gzip.open(self.object_path(content_hash), 'rb') as f:
+            return f.read().decode('utf-8')
+
+    def records(self):
+        """按归档顺序读取全部索引记录（跳过写入中断的最后一行）"""
+        if not os.path.exists(self.index_path):
+            return []
+        records = []
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records
+
+    def videos(self, key_filter=None, prompt_filter=None):
+        """按视频分组的归档记录 {(视频键, 提示词哈希): [记录...]}，每组按时间排序"""
+        grouped = {}
+        for record in self.records():
+            if key_filter and key_filter not in record['key'] and key_filter not in record.get('title', ''):
+                continue
+            if prompt_filter and record['prompt_hash'] != prompt_filter:
+                continue
+            grouped.setdefault((record['key'], record['prompt_hash']), []).append(record)
+        return grouped
+
+
+def replay_attempt(records, read, parse):
+    """按顺序重放一次分析尝试中的回复：完整生成替换结果，续写按记录的起始分镜合并"""
+    from storyboard_completeness import merge_continuation
+
+    rows = []
+    for record in records:
+        content_rows = parse(read(record['content_hash']))
+        if record['role'] == ROLE_CONTINUATION:
+            if rows and content_rows:
+                rows = merge_continuation(rows, content_rows, record['resume_from'], drop_last=record.get('drop_last', False))
+        elif content_rows:
+            rows = content_rows
+    return rows
+
+
+def group_attempts(records):
+    """按片段和尝试分组 {片段序号: [[记录...], ...]}，每个片段内最近的尝试排在最前
+
+    最近一次分析使用了分段时只取分段的记录，否则只取未分段的记录。
+    """
+    segmented = records[-1].get('chunk') is not None
+    attempts = {}  # 片段序号 -> {尝试ID: [记录]}
+    for record in records:
+        chunk = record.get('chunk')
+        if (chunk is not None) != segmented:
+            continue
+        attempts.setdefault(chunk, {}).setdefault(record.get('attempt'), []).append(record)
+    return {chunk: sorted(attempts[chunk].values(), key=lambda items: items[-1]['ts'], reverse=True)
+            for chunk in sorted(attempts, key=lambda value: -1 if value is None else value)}
+
+
+def rebuild_rows(records, read, parse):
+    """根据一个视频的全部归档记录重建分镜行
+
+    每个片段（未分段的视频视为一个片段）取最近一次能解析出结果的尝试；
+    最近一次分析使用了分段时，按片段顺序合并并连续编号。
+    """
+    segmented = records[-1].get('chunk') is not None
+    merged = []
+    for attempts in group_attempts(records).values():
+        chunk_rows = []
+        # 从最近的尝试往前找，直到解析出结果
+        for attempt_records in attempts:
+            chunk_rows = replay_attempt(attempt_records, read, parse)
+            if chunk_rows:
+                break
+        for _, keyframe, video in chunk_rows if segmented else []:
+            merged.append((len(merged) + 1, keyframe, video))
+        if not segmented:
+            merged = chunk_rows
+    return merged
+
+
+def rebuild_text(records, read):
+    """文本格式提示词的结果：每个片段取最近一次尝试的最后一条回复，分段时按片段依次拼接"""
+    parts = []
+    for chunk, attempts in group_attempts(records).items():
+        text = read(attempts[0][-1]['content_hash'])
+        parts.append(text if chunk is None else f"【片段 {chunk + 1}】\n{text}")
+    return "\n\n".join(parts)
+
+
+# 进程池中每个工作进程持有一个不连接浏览器的引擎，只用于解析和导出
+_worker_engine = None
+_worker_archive = None
+_worker_problems = []  # 引擎在当前任务中报告的问题（保存或写入清单失败等），作为该任务的错误返回
+
+
+def collect_worker_problem(message):
+    if message.startswith(('⚠️', '❌')):
+        _worker_problems.append(message)
+
+
+def init_reexport_worker(archive_dir, output_path, layout_config=None):
+    global _worker_engine, _worker_archive
+    from video_analysis_engine import VideoAnalysisEngine
+    config = {'output_path': output_path, 'prompt': '', 'archive_responses': False}
+    config.update(layout_config or {})  # 输出目录布局，未指定时按导出目录中记录的布局
+    _worker_engine = VideoAnalysisEngine(config)
+    _worker_engine.progress_update.connect(collect_worker_problem)
+    _worker_engine.error_occurred.connect(lambda message: _worker_problems.append(f"❌ {message}"))
+    _worker_archive = ResponseArchive(archive_dir)
+    # 布局只在第一次使用时核对，提前核对，以免与记录不同的提示被算作第一个任务的错误（主进程已提示）
+    _worker_engine.get_output_layout()
+    del _worker_problems[:]
+
+
+def reexport_video(task):
+    """在工作进程中重新解析一个视频的归档回复并写出Excel，返回 (标题, 分镜数, 错误信息)"""
+    records = task['records']
+    title = records[-1]['title']
+    variant = records[-1].get('variant')  # 提示词矩阵中其余提示词的名称
+    output_format = records[-1].get('format', 'table')
+    key = records[-1]['key']
+    del _worker_problems[:]
+    try:
+        if _worker_engine.get_output_manifest() is None:
+            return title, 0, "；".join(_worker_problems) or "输出清单不可用"
+        if output_format == 'text':
+            content = rebuild_text(records, _worker_archive.read)
+            row_count = 0
+        else:
+            rows = rebuild_rows(records, _worker_archive.read, _worker_engine.parse_tab_separated_table)
+            if not rows:
+                return title, 0, "没有解析出分镜"
+            content = _worker_engine.format_table_content(rows)
+            row_count = len(rows)
+
+        if variant is None:
+            # 与分析时相同的保存流程：由输出清单分配文件夹名并更新清单中的分镜
+            saved = _worker_engine.save_single_result(
+                {'url': key, 'title': title, 'content': content, 'prompt_hash': records[-1]['prompt_hash']}, key)
+            if not saved:
+                return title, row_count, "；".join(_worker_problems) or "保存失败"
+            return title, row_count, "；".join(_worker_problems) or None
+
+        output_name = _worker_engine.resolve_output_name(key, title)
+        result = _worker_engine.save_extra_output(task['output_path'], output_name,
+                                                  {'name': variant, 'format': output_format, 'content': content})
+        if not (result and result.get('success')):
+            return title, row_count, (result or {}).get('message', "保存失败")
+        _worker_engine.record_output(key, title, output_name, result, records[-1]['prompt_hash'], variant=variant)
+        # 分配文件夹名或写入输出清单失败时结果虽已保存，但清单没有更新，同样算作失败
+        return title, row_count, "；".join(_worker_problems) or None
+    except Exception as e:
+        return title, 0, str(e)
+
+
+def reexport(archive_dir, output_path, workers=None, key_filter=None, prompt_filter=None, log=print, layout=None):
+    """用进程池重新解析并导出归档中的全部视频，返回 (成功数, 失败数)
+
+    layout 为导出时使用的输出目录布局（OutputLayout），为None时按导出目录中记录的布局。
+    """
+    archive = ResponseArchive(archive_dir)
+    groups = archive.videos(key_filter, prompt_filter)
+    if not groups:
+        log("归档中没有匹配的回复")
+        return 0, 0
+
+    # 同一个输出（视频 + 提示词矩阵中的位置）用不同提示词生成过时，只导出最近一次的
+    latest = {}
+    for (key, _), records in groups.items():
+        output_key = (key, records[-1].get('variant'))
+        if output_key not in latest or records[-1]['ts'] > latest[output_key][-1]['ts']:
+            latest[output_key] = records
+    tasks = [{'records': records, 'output_path': output_path} for records in latest.values()]
+
+    started = time.time()
+    log(f"开始重新导出 {len(tasks)} 个结果...")
+    succeeded = failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_reexport_worker,
+                             initargs=(archive_dir, output_path, layout.to_config() if layout else None)) as executor:
+        for title, row_count, error in executor.map(reexport_video, tasks, chunksize=16):
+            if error:
+                failed += 1
+                log(f"❌ {title}: {error}")
+            else:
+                succeeded += 1
+    log(f"重新导出完成: 成功 {succeeded} 个，失败 {failed} 个，用时 {time.time() - started:.1f} 秒")
+    return succeeded, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型原始回复归档：查看与离线重新导出")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('reexport', "重新解析归档的回复并重新导出Excel"), ('list', "列出归档的视频")):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--output-path', required=True, help="分析时使用的输出目录")
+        sub.add_argument('--archive-dir', help="归档目录，默认为 <输出目录>/.response_archive")
+        sub.add_argument('--key', help="只处理视频键或标题包含该关键字的视频")
+        sub.add_argument('--prompt-hash', help="只处理指定提示词哈希的回复")
+    subparsers.choices['reexport'].add_argument('--export-path', help="导出目录，默认覆盖输出目录中的原有结果")
+    subparsers.choices['reexport'].add_argument('--workers', type=int, help="进程数，默认为CPU核数")
+    subparsers.choices['reexport'].add_argument('--layout', choices=LAYOUTS, help="导出目录的布局，默认按输出目录中记录的布局")
+    subparsers.choices['reexport'].add_argument('--date-format', default='%Y/%m', help="date 布局的分区格式，默认 %%Y/%%m")
+    subparsers.choices['reexport'].add_argument('--hash-levels', type=int, default=2, help="hash 布局的分片层数，默认2")
+    args = parser.parse_args()
+
+    archive_dir = args.archive_dir or os.path.join(args.output_path, ".response_archive")
+    if args.command == 'list':
+        groups = ResponseArchive(archive_dir).videos(args.key, args.prompt_hash)
+        for (key, hash_value), records in sorted(groups.items(), key=lambda item: item[1][-1]['ts']):
+            output_name = records[-1].get('variant') or "分镜表"
+            print(f"{records[-1]['archived_at']}  {hash_value}  {output_name}  {len(records):3d} 条回复  {records[-1]['title']}  ({key})")
+        print(f"共 {len(groups)} 个视频/提示词组合")
+    else:
+        export_path = args.export_path or args.output_path
+        if args.layout:
+            layout = OutputLayout(args.layout, args.date_format, args.hash_levels)
+        else:
+            layout = OutputLayout.load(args.output_path)
+        recorded = OutputLayout.load(export_path)
+        if recorded and layout and recorded != layout:
+            print(f"⚠️ 导出目录已按 {recorded.describe()} 布局保存结果，忽略 {layout.describe()} 布局；切换布局请使用 python output_layout.py migrate")
+            layout = recorded
+        if layout:
+            print(f"按 {layout.describe()} 布局导出")
+        reexport(archive_dir, export_path, args.workers, args.key, args.prompt_hash, layout=layout)
+
+
+if __name__ == "__main__":
+    main()
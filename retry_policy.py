@@ -0,0 +1,121 @@
+import time
+import random
+
+# 失败类型
+FAILURE_UI_MISSING = 'ui_missing'  # 页面元素找不到（页面改版、加载不完整）
+FAILURE_UPLOAD_STALL = 'upload_stall'  # 上传后文件一直没有处理完成
+FAILURE_GENERATION = 'generation_error'  # 模型生成出错（页面上出现错误提示）
+FAILURE_EMPTY_RESULT = 'empty_result'  # 生成完成但结果为空或无法解析
+FAILURE_BROWSER = 'browser_disconnected'  # 浏览器或页面连接断开
+FAILURE_UNKNOWN = 'unknown'
+
+FAILURE_NAMES = {
+    FAILURE_UI_MISSING: "页面元素缺失",
+    FAILURE_UPLOAD_STALL: "上传卡住",
+    FAILURE_GENERATION: "生成错误",
+    FAILURE_EMPTY_RESULT: "结果为空或无法解析",
+    FAILURE_BROWSER: "浏览器连接断开",
+    FAILURE_UNKNOWN: "未知错误",
+}
+
+# 每类失败的重试策略：
+#   chat_retries  - 在当前对话中直接重新生成的次数（不重新上传）
+#   page_retries  - 立即在新页面上重做整个任务的次数
+#   defer_retries - 推迟到队列末尾重试的次数，每次推迟按指数退避等待
+#   backoff       - 第一次推迟的等待秒数，之后每次翻倍，最多 backoff_max 秒
+DEFAULT_RETRY_POLICIES = {
+    FAILURE_GENERATION: {'chat_retries': 3, 'page_retries': 1, 'defer_retries': 2, 'backoff': 60, 'backoff_max': 900},
+    FAILURE_EMPTY_RESULT: {'chat_retries': 1, 'page_retries': 1, 'defer_retries': 1, 'backoff': 60, 'backoff_max': 900},
+    FAILURE_UI_MISSING: {'chat_retries': 0, 'page_retries': 1, 'defer_retries': 2, 'backoff': 30, 'backoff_max': 600},
+    FAILURE_UPLOAD_STALL: {'chat_retries': 0, 'page_retries': 1, 'defer_retries': 2, 'backoff': 120, 'backoff_max': 1800},
+    FAILURE_BROWSER: {'chat_retries': 0, 'page_retries': 1, 'defer_retries': 2, 'backoff': 30, 'backoff_max': 600},
+    FAILURE_UNKNOWN: {'chat_retries': 0, 'page_retries': 0, 'defer_retries': 1, 'backoff': 60, 'backoff_max': 600},
+}
+
+# 重试决定
+RETRY_PAGE = 'retry_page'
+RETRY_DEFER = 'defer'
+RETRY_GIVE_UP = 'give_up'
+
+# 出现在异常信息中时视为浏览器连接断开
+BROWSER_DISCONNECT_MARKERS = (
+    'target closed', 'target page, context or browser has been closed', 'browser has been closed',
+    'connection closed', 'browser has disconnected', 'websocket', 'econnrefused', 'econnreset',
+    'target crashed', 'page crashed',
+)
+
+
+class AnalysisFailure(Exception):
+    """带失败类型的分析错误，由重试策略决定如何处理"""
+
+    def __init__(self, failure_class, message):
+        super().__init__(message)
+        self.failure_class = failure_class
+
+
+def classify_failure(error):
+    """把异常归类为失败类型"""
+    if isinstance(error, AnalysisFailure):
+        return error.failure_class
+    message = str(error).lower()
+    if any(marker in message for marker in BROWSER_DISCONNECT_MARKERS):
+        return FAILURE_BROWSER
+    if type(error).__name__ == 'TimeoutError' and ('locator' in message or 'waiting for' in message):
+        return FAILURE_UI_MISSING
+    return FAILURE_UNKNOWN
+
+
+class RetryTracker:
+    """按任务和失败类型记录重试次数，决定下一步：新页面重试、推迟重试或放弃"""
+
+    def __init__(self, policies=None):
+        self.policies = {key: dict(value) for key, value in DEFAULT_RETRY_POLICIES.items()}
+        for failure_class, overrides in (policies or {}).items():
+            self.policies.setdefault(failure_class, dict(DEFAULT_RETRY_POLICIES[FAILURE_UNKNOWN])).update(overrides)
+        self.page_attempts = {}  # (任务键, 失败类型) -> 已用的新页面重试次数
+        self.defer_attempts = {}  # (任务键, 失败类型) -> 已用的推迟次数
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('retry_policies'))
+
+    def chat_retries(self, failure_class):
+        return self.policies.get(failure_class, self.policies[FAILURE_UNKNOWN])['chat_retries']
+
+    def decide(self, key, failure_class):
+        """返回 (决定, 推迟等待秒数)"""
+        policy = self.policies.get(failure_class, self.policies[FAILURE_UNKNOWN])
+        attempt_key = (key, failure_class)
+        page_used = self.page_attempts.get(attempt_key, 0)
+        if page_used < policy['page_retries']:
+            self.page_attempts[attempt_key] = page_used + 1
+            return RETRY_PAGE, 0
+        defer_used = self.defer_attempts.get(attempt_key, 0)
+        if defer_used < policy['defer_retries']:
+            self.defer_attempts[attempt_key] = defer_used + 1
+            delay = min(policy['backoff'] * (2 ** defer_used), policy['backoff_max'])
+            # 加入抖动，避免多个任务同时到期
+            return RETRY_DEFER, delay * random.uniform(0.8, 1.2)
+        return RETRY_GIVE_UP, 0
+
+
+class DeferredQueue:
+    """推迟重试的任务：队列处理完后按到期时间依次取出"""
+
+    def __init__(self):
+        self.entries = []  # [(到期时间, 序号, 任务)]
+        self.counter = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def push(self, item, delay_seconds):
+        self.counter += 1
+        self.entries.append((time.time() + delay_seconds, self.counter, item))
+        self.entries.sort(key=lambda entry: entry[:2])
+
+    def next_ready_at(self):
+        return self.entries[0][0] if self.entries else None
+
+    def pop(self):
+        return self.entries.pop(0)[2]
@@ -40,13 +40,19 @@ if sys.platform == 'darwin':  # 仅在macOS上执行
     
     sys.stderr = WarningFilter(sys.stderr)
 
-try:
-    from video_analysis_gui import main
-    main()
-except ImportError as e:
-    print("缺少必要的依赖包，请运行以下命令安装：")
-    print("pip install PyQt6")
-    print(f"错误详情: {e}")
-except Exception as e:
-    print(f"程序运行出错: {e}")
-    input("按任意键退出...") 
\ No newline at end of file
+# 分析引擎运行在spawn方式启动的子进程中，子进程会重新导入本脚本，
+# 因此启动GUI的代码必须放在 __main__ 保护之下
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()  # 兼容打包后的可执行文件
+
+    try:
+        from video_analysis_gui import main
+        main()
+    except ImportError as e:
+        print("缺少必要的依赖包，请运行以下命令安装：")
+        print("pip install PyQt6")
+        print(f"错误详情: {e}")
+    except Exception as e:
+        print(f"程序运行出错: {e}")
+        input("按任意键退出...") 
\ No newline at end of file
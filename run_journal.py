@@ -0,0 +1,103 @@
+import os
+import re
+import json
+import hashlib
+from datetime import datetime
+
+# 任务状态（按处理顺序）
+STATE_QUEUED = 'queued'  # 已加入队列
+STATE_ANALYZING = 'analyzing'  # 正在分析
+STATE_CAPTURED = 'captured'  # 已获取模型回复（内容已写入日志）
+STATE_SAVED = 'saved'  # 分镜表已保存
+STATE_MARKED = 'marked'  # 已在Excel中标记 / 已移动到完成文件夹
+STATE_REJECTED = 'rejected'  # 探测阶段判定无法分析（附带原因）
+
+STATE_ORDER = [STATE_QUEUED, STATE_ANALYZING, STATE_CAPTURED, STATE_SAVED, STATE_MARKED]
+
+
+class RunJournal:
+    """运行日志：以追加方式记录每个任务的处理状态，用于崩溃后精确续跑"""
+
+    def __init__(self, output_path, source, worker=None):
+        journal_dir = os.path.join(output_path, ".analysis_journal")
+        os.makedirs(journal_dir, exist_ok=True)
+        # 每个数据源（Excel文件或视频文件夹）对应一个日志文件；多个进程通过工作队列共同处理时每个进程一个
+        source_hash = hashlib.sha1(os.path.abspath(source).encode('utf-8')).hexdigest()[:12]
+        base_name = os.path.splitext(os.path.basename(os.path.normpath(source)))[0]
+        base_name = re.sub(r'[^\w\-]+', '_', base_name)[:40] or "source"
+        worker_suffix = "_" + re.sub(r'[^\w\-]+', '_', worker) if worker else ""
+        self.path = os.path.join(journal_dir, f"{base_name}_{source_hash}{worker_suffix}.jsonl")
+        self.entries = {}
+        self.load()
+        self.compact()
+
+    def load(self):
+        """重放日志文件，得到每个任务的最新状态"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 崩溃时最后一行可能只写了一半，忽略即可
+                    continue
+                key = record.pop('key', None)
+                if key is None:
+                    continue
+                entry = self.entries.setdefault(key, {})
+                entry.update(record)
+
+    def compact(self):
+        """把日志压缩为每个任务一行，避免文件无限增长"""
+        if not self.entries:
+            return
+        # 已标记完成的任务不再需要保留模型回复内容
+        for entry in self.entries.values():
+            if entry.get('state') == STATE_MARKED:
+                entry.pop('result', None)
+                entry.pop('chunks', None)
+                entry.pop('chunk_extras', None)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for key, entry in self.entries.items():
+                f.write(json.dumps(dict(entry, key=key), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def record(self, key, state, **data):
+        """追加一条状态记录，并立即落盘"""
+        record = {'key': key, 'state': state, 'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        record.update(data)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        record.pop('key')
+        self.entries.setdefault(key, {}).update(record)
+
+    def record_queued(self, keys):
+        """批量记录新加入队列的任务（已有记录的任务保持原状态）"""
+        new_keys = [key for key in keys if key not in self.entries]
+        if not new_keys:
+            return
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for key in new_keys:
+                f.write(json.dumps({'key': key, 'state': STATE_QUEUED, 'time': now}, ensure_ascii=False) + "\n")
+                self.entries[key] = {'state': STATE_QUEUED, 'time': now}
+            f.flush()
+            os.fsync(f.fileno())
+
+    def get(self, key):
+        """获取任务的最新记录，不存在时返回None"""
+        return self.entries.get(key)
+
+    def state(self, key):
+        """获取任务的最新状态，不存在时返回None"""
+        entry = self.entries.get(key)
+        return entry.get('state') if entry else None
@@ -0,0 +1,167 @@
+import time
+
+# 页面元素选择器：每个元素按顺序列出多个写法，第一个是当前页面的写法，后面是页面改版后的备用写法
+DEFAULT_SELECTORS = {
+    'prompt_input': [
+        "//ms-chunk-input//textarea",
+        "ms-chunk-input textarea",
+        "textarea[aria-label*='prompt' i]",
+    ],
+    'add_chunk_button': [
+        "//ms-add-chunk-menu//button/span[@class='mat-mdc-button-persistent-ripple mdc-icon-button__ripple']",
+        "ms-add-chunk-menu button",
+        "button[aria-label*='Insert' i]",
+    ],
+    'upload_button': [
+        "button:has-text('Upload')",
+        "[role='menuitem']:has-text('Upload')",
+    ],
+    'youtube_button': [
+        "//button[.//span[text()='YouTube Video']]",
+        "button:has-text('YouTube')",
+        "[role='menuitem']:has-text('YouTube')",
+    ],
+    'youtube_url_input': [
+        "//input[@aria-label='YouTube URL']",
+        "input[aria-label*='YouTube' i]",
+        "mat-dialog-container input",
+    ],
+    'save_button': [
+        "//button[.//span[text()='Save']]",
+        "mat-dialog-container button:has-text('Save')",
+    ],
+    'video_chunk': [
+        "//ms-video-chunk",
+        "ms-chunk-input ms-video-chunk",
+    ],
+    'upload_progress': [
+        "ms-video-chunk [role='progressbar']",
+        "ms-video-chunk mat-progress-bar",
+        "ms-chunk-input [role='progressbar']",
+    ],
+    'run_button': [
+        "//button[contains(@class, 'run-button')]",
+        "run-button button",
+    ],
+    'run_button_enabled': [
+        "//button[contains(@class, 'run-button') and @aria-disabled='false' and not(@disabled)]",
+        "run-button button[aria-disabled='false']:not([disabled])",
+    ],
+    'stop_button': [
+        "//run-button/button/div[.//text()[contains(., 'Stop')]]",
+        "run-button button:has-text('Stop')",
+    ],
+    'generation_error': [
+        "(//ms-chat-turn)[last()]//ms-prompt-feedback/button/span[1]",
+    ],
+}
+
+
+class SelectorCircuitOpenError(Exception):
+    """同一页面元素连续多次找不到，判断页面已改版，整个运行应立即停止"""
+
+
+class SelectorRegistry:
+    """集中管理页面元素选择器：按顺序尝试备用写法，记录匹配的写法和耗时，连续找不到时熔断
+
+    第一次找不到某个元素时按调用方的完整超时等待；之后该元素改用快速超时，
+    连续 breaker_threshold 次找不到时抛出 SelectorCircuitOpenError，几秒内结束运行而不是每个视频都等满超时。
+    """
+
+    def __init__(self, selectors=None, breaker_threshold=3, fast_fail_timeout=5000):
+        self.selectors = {name: list(variants) for name, variants in DEFAULT_SELECTORS.items()}
+        for name, variants in (selectors or {}).items():
+            self.selectors[name] = list(variants)
+        self.breaker_threshold = breaker_threshold
+        self.fast_fail_timeout = fast_fail_timeout  # 毫秒
+        self.preferred = {}  # 元素名 -> 上次匹配的写法序号
+        self.consecutive_misses = {}  # 元素名 -> 连续找不到的次数
+        self.stats = {}  # 元素名 -> {'hits': {写法序号: 次数}, 'misses': n, 'total_ms': ms, 'max_ms': ms}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            selectors=config.get('selectors'),
+            breaker_threshold=config.get('selector_breaker_threshold', 3),
+            fast_fail_timeout=config.get('selector_fast_fail_timeout', 5000)
+        )
+
+    def reset_breaker(self):
+        self.consecutive_misses = {}
+
+    def ordered_variants(self, name):
+        """上次匹配的写法排在最前"""
+        variants = list(enumerate(self.selectors[name]))
+        preferred = self.preferred.get(name)
+        if preferred is not None and preferred < len(variants):
+            variants.insert(0, variants.pop(preferred))
+        return variants
+
+    def resolve(self, page, name):
+        """返回组合了所有写法的定位器（不等待），用于快速检查元素状态"""
+        combined = None
+        for _, selector in self.ordered_variants(name):
+            locator = page.locator(selector)
+            combined = locator if combined is None else combined.or_(locator)
+        return combined.first
+
+    def locate(self, page, name, timeout=10000, state='visible', track_misses=True):
+        """等待任一写法匹配，返回对应的定位器；超时返回None
+
+        所有写法组合为一个定位器同时等待，总等待时间不会随备用写法数量增加。
+        """
+        if track_misses and self.consecutive_misses.get(name, 0) >= self.breaker_threshold:
+            raise SelectorCircuitOpenError(f"页面元素 '{name}' 连续 {self.consecutive_misses[name]} 次找不到，页面可能已改版")
+        if track_misses and self.consecutive_misses.get(name):
+            timeout = min(timeout, self.fast_fail_timeout)
+
+        stats = self.stats.setdefault(name, {'hits': {}, 'misses': 0, 'total_ms': 0, 'max_ms': 0})
+        started = time.time()
+        try:
+            self.resolve(page, name).wait_for(state=state, timeout=timeout)
+        except Exception:
+            stats['misses'] += 1
+            if track_misses:
+                self.consecutive_misses[name] = self.consecutive_misses.get(name, 0) + 1
+            return None
+        elapsed_ms = (time.time() - started) * 1000
+
+        # 找出实际匹配的写法，下次优先尝试
+        matched_index, matched = None, None
+        for index, selector in self.ordered_variants(name):
+            locator = page.locator(selector).first
+            try:
+                if locator.is_visible() if state == 'visible' else locator.count() > 0:
+                    matched_index, matched = index, locator
+                    break
+            except Exception:
+                continue
+        if matched is None:
+            # 匹配后元素又立即消失，按第一个写法返回
+            matched_index, matched = self.ordered_variants(name)[0][0], self.resolve(page, name)
+
+        self.preferred[name] = matched_index
+        self.consecutive_misses[name] = 0
+        stats['hits'][matched_index] = stats['hits'].get(matched_index, 0) + 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        return matched
+
+    def summary(self):
+        """每个元素的匹配情况：使用的写法、平均/最长耗时、找不到的次数"""
+        result = {}
+        for name, stats in self.stats.items():
+            hit_count = sum(stats['hits'].values())
+            result[name] = {
+                'hits': {str(index): count for index, count in sorted(stats['hits'].items())},
+                'misses': stats['misses'],
+                'avg_ms': round(stats['total_ms'] / hit_count) if hit_count else None,
+                'max_ms': round(stats['max_ms'])
+            }
+        return result
+
+    def fallback_report(self):
+        """返回使用了备用写法的元素，提示需要更新主写法"""
+        return {name: counts for name, counts in
+                ((name, stats['hits']) for name, stats in self.stats.items())
+                if any(index > 0 for index in counts)}
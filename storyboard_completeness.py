@@ -0,0 +1,88 @@
+# 分镜表完整性检查：判断模型输出的分镜表是否被截断，以及续写结果的合并
+
+# 句末标点：正常结束的单元格通常以这些字符结尾
+SENTENCE_ENDINGS = tuple("。！？.!?…」』”\"）)】]；;")
+
+DEFAULT_CONTINUATION_PROMPT = (
+    "上一条回复的分镜表在分镜{shot}处被截断了。请从分镜{shot}开始继续输出剩余的全部分镜，"
+    "保持相同的表格格式（分镜、关键帧图片生成提示词、图生视频提示词三列），不要重复分镜{shot}之前的内容。"
+)
+
+
+def ends_mid_cell(text, reference_cells):
+    """判断单元格是否在句子中间被截断
+
+    只有在其他单元格大多以句末标点结尾时才判断，避免把不写标点的输出风格误判为截断。
+    """
+    text = text.strip()
+    if not text or text.endswith(SENTENCE_ENDINGS):
+        return False
+    finished = [cell for cell in reference_cells if cell.strip()]
+    if len(finished) < 2:
+        return False
+    punctuated = sum(1 for cell in finished if cell.strip().endswith(SENTENCE_ENDINGS))
+    return punctuated / len(finished) >= 0.8
+
+
+def check_completeness(rows):
+    """检查解析出的分镜行 [(分镜号, 关键帧提示词, 图生视频提示词)]
+
+    返回 {'complete': 是否完整, 'issues': [问题描述], 'resume_from': 续写起始分镜号,
+          'last_row_truncated': 最后一行是否被截断}
+    """
+    if not rows:
+        return {'complete': True, 'issues': [], 'resume_from': None, 'last_row_truncated': False}
+
+    issues = []
+    resume_candidates = []
+    shot_numbers = [shot for shot, _, _ in rows]
+
+    # 编号断档：1到最大编号之间缺失的分镜
+    present = set(shot_numbers)
+    missing = [shot for shot in range(min(shot_numbers), max(shot_numbers) + 1) if shot not in present]
+    if missing:
+        preview = "、".join(str(shot) for shot in missing[:5]) + ("..." if len(missing) > 5 else "")
+        issues.append(f"缺少分镜 {preview}")
+        resume_candidates.append(missing[0])
+
+    last_shot, _, last_video = rows[-1]
+    earlier_video_cells = [video for _, _, video in rows[:-1]]
+    last_row_truncated = True
+    if not last_video.strip():
+        issues.append(f"最后一行（分镜{last_shot}）缺少图生视频提示词")
+    elif ends_mid_cell(last_video, earlier_video_cells):
+        issues.append(f"最后一行（分镜{last_shot}）在句子中间结束")
+    else:
+        last_row_truncated = False
+    if last_row_truncated:
+        resume_candidates.append(last_shot)
+
+    return {
+        'complete': not issues,
+        'issues': issues,
+        'resume_from': min(resume_candidates) if resume_candidates else None,
+        'last_row_truncated': last_row_truncated
+    }
+
+
+def merge_continuation(rows, continuation_rows, resume_from, drop_last=False):
+    """合并续写结果：保留 resume_from 之前的行，续写的行覆盖 resume_from 及之后的分镜
+
+    模型续写时有时会从1重新编号，此时按 resume_from 起顺延编号。
+    """
+    if not continuation_rows:
+        return list(rows)
+    if continuation_rows[0][0] < resume_from:
+        continuation_rows = [(resume_from + offset, keyframe, video)
+                             for offset, (_, keyframe, video) in enumerate(continuation_rows)]
+
+    merged = {shot: (shot, keyframe, video) for shot, keyframe, video in rows if shot < resume_from}
+    for shot, keyframe, video in continuation_rows:
+        if shot >= resume_from and shot not in merged:
+            merged[shot] = (shot, keyframe, video)
+    # 原结果中 resume_from 之后、续写没有覆盖到的行仍然保留（drop_last 时去掉被截断的最后一行）
+    truncated_shot = rows[-1][0] if rows and drop_last else None
+    for shot, keyframe, video in rows:
+        if shot >= resume_from and shot not in merged and shot != truncated_shot:
+            merged[shot] = (shot, keyframe, video)
+    return [merged[shot] for shot in sorted(merged)]
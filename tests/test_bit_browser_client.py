@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+比特浏览器API客户端的离线测试：使用 bit_browser_fake_server 模拟服务，
+验证健康检查、失败重试、打开/关闭窗口和通过 /json/version 发现CDP地址的流程。
+
+运行: python -m pytest tests 或 python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bit_browser_client import BitBrowserClient, BitBrowserAPIError
+from bit_browser_fake_server import start_fake_server
+
+
+class BitBrowserClientTest(unittest.TestCase):
+
+    def start(self, **options):
+        """启动模拟服务并创建指向它的客户端（重试不等待）"""
+        server, state = start_fake_server(0, **options)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        client = BitBrowserClient(api_url=f"http://127.0.0.1:{state.port}", max_retries=3, backoff=0)
+        self.addCleanup(client.close)
+        return client, state
+
+    def test_health_check(self):
+        client, state = self.start()
+        self.assertTrue(client.health_check())
+        self.assertEqual(state.request_counts['/health'], 1)
+
+    def test_open_and_close_browser(self):
+        client, state = self.start()
+        result = client.open_browser('window-1')
+        self.assertEqual(result['ws'], f"ws://127.0.0.1:{state.port}/devtools/browser/window-1")
+        self.assertEqual(state.open_windows, {'window-1'})
+        self.assertTrue(client.close_browser('window-1'))
+        self.assertEqual(state.open_windows, set())
+        with self.assertRaises(BitBrowserAPIError):
+            client.close_browser('window-1')
+
+    def test_open_browser_retries_after_server_errors(self):
+        client, state = self.start(fail_first=2)
+        result = client.open_browser('window-1')
+        self.assertTrue(result['ws'].endswith('/devtools/browser/window-1'))
+        self.assertEqual(state.request_counts['/browser/open'], 3)
+
+    def test_open_browser_gives_up_after_max_retries(self):
+        client, state = self.start(fail_first=10)
+        with self.assertRaises(BitBrowserAPIError):
+            client.open_browser('window-1')
+        self.assertEqual(state.request_counts['/browser/open'], 4)
+
+    def test_open_browser_discovers_cdp_when_ws_is_missing(self):
+        client, state = self.start(omit_ws=True)
+        result = client.open_browser('window-1')
+        self.assertEqual(result['http'], f"127.0.0.1:{state.port}")
+        self.assertTrue(result['ws'].startswith(f"ws://127.0.0.1:{state.port}/devtools/browser/fake-"))
+        self.assertEqual(state.request_counts['/json/version'], 1)
+        self.assertEqual(client.discover_cdp(result['http']), f"ws://127.0.0.1:{state.port}/devtools/browser/fake-2")
+
+
+if __name__ == "__main__":
+    unittest.main()
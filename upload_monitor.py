@@ -0,0 +1,160 @@
+import time
+
+# 注入页面的上传遥测脚本：拦截带文件内容的XHR和fetch请求，累计已发送的字节数
+# XHR通过upload进度事件得到实时字节数；fetch没有上传进度，请求完成时按请求体大小累计
+INSTALL_TELEMETRY_SCRIPT = """() => {
+    const isBinary = (body) => body && (body instanceof Blob || body instanceof ArrayBuffer ||
+                                        ArrayBuffer.isView(body) || body instanceof FormData);
+    if (!window.__uploadTelemetry) {
+        const telemetry = window.__uploadTelemetry = {loaded: 0, requests: 0, finished: 0, updated: 0};
+        const send = XMLHttpRequest.prototype.send;
+        XMLHttpRequest.prototype.send = function(body) {
+            if (isBinary(body)) {
+                let previous = 0;
+                window.__uploadTelemetry.requests += 1;
+                this.upload.addEventListener('progress', (event) => {
+                    window.__uploadTelemetry.loaded += event.loaded - previous;
+                    previous = event.loaded;
+                    window.__uploadTelemetry.updated = Date.now();
+                });
+                this.upload.addEventListener('loadend', () => {
+                    window.__uploadTelemetry.finished += 1;
+                    window.__uploadTelemetry.updated = Date.now();
+                });
+            }
+            return send.apply(this, arguments);
+        };
+        const originalFetch = window.fetch;
+        window.fetch = function(input, init) {
+            const body = init && init.body;
+            const promise = originalFetch.apply(this, arguments);
+            if (isBinary(body)) {
+                window.__uploadTelemetry.requests += 1;
+                const size = body.size || body.byteLength || 0;
+                promise.finally(() => {
+                    window.__uploadTelemetry.loaded += size;
+                    window.__uploadTelemetry.finished += 1;
+                    window.__uploadTelemetry.updated = Date.now();
+                });
+            }
+            return promise;
+        };
+    }
+    Object.assign(window.__uploadTelemetry, {loaded: 0, requests: 0, finished: 0, updated: 0});
+}"""
+
+READ_TELEMETRY_SCRIPT = "() => window.__uploadTelemetry || null"
+
+
+def format_size(size_bytes):
+    return f"{size_bytes / 1024 / 1024:.1f} MB"
+
+
+class UploadMonitor:
+    """上传阶段遥测与停滞检测
+
+    上传超时按文件大小计算（基础时间 + 文件大小 / 最低吞吐量），处理超时（上传完成到Run按钮激活）同理；
+    观察到上传进度后，如果有上传请求仍在进行（或页面进度条未到100%）却连续 stall_seconds 秒没有任何进展
+    （字节数、请求完成数、进度条都不变），立即判定为停滞；上传请求全部结束且不再有新请求时视为上传完成。
+    没有采集到任何进度时无法区分慢和卡住，只按总超时判断。
+    """
+
+    def __init__(self, file_size, base_timeout=60, min_throughput=512 * 1024, max_timeout=3600, stall_seconds=30,
+                 processing_base_timeout=120, processing_rate=4 * 1024 * 1024):
+        self.file_size = file_size
+        self.upload_timeout = min(base_timeout + file_size / min_throughput, max_timeout)
+        self.processing_timeout = min(processing_base_timeout + file_size / processing_rate, max_timeout)
+        self.stall_seconds = stall_seconds
+        self.started = time.time()
+        self.bytes_sent = 0
+        self.requests_started = 0
+        self.requests_finished = 0
+        self.progress = None  # 页面进度条的百分比
+        self.has_telemetry = False
+        self.last_activity = self.started
+        self.uploaded_at = None  # 字节发送完成（或页面进度到100%）的时间
+        self.finished_at = None  # Run按钮激活的时间
+
+    @classmethod
+    def from_config(cls, config, file_size):
+        return cls(
+            file_size,
+            base_timeout=config.get('upload_base_timeout', 60),
+            min_throughput=config.get('upload_min_throughput', 512 * 1024),
+            max_timeout=config.get('upload_max_timeout', 3600),
+            stall_seconds=config.get('upload_stall_seconds', 30),
+            processing_base_timeout=config.get('upload_processing_timeout', 120),
+            processing_rate=config.get('upload_processing_rate', 4 * 1024 * 1024)
+        )
+
+    def update(self, bytes_sent=None, requests_started=None, requests_finished=None, progress=None, now=None):
+        """记录一次采样，任何一项有进展都视为上传仍在进行"""
+        now = now or time.time()
+        advanced = False
+        if bytes_sent is not None and bytes_sent > self.bytes_sent:
+            self.bytes_sent = bytes_sent
+            advanced = True
+        if requests_started is not None and requests_started > self.requests_started:
+            self.requests_started = requests_started
+            advanced = True
+        if requests_finished is not None and requests_finished > self.requests_finished:
+            self.requests_finished = requests_finished
+            advanced = True
+        if progress is not None and progress != self.progress:
+            self.progress = progress
+            advanced = True
+        if advanced:
+            self.has_telemetry = True
+            self.last_activity = now
+        if self.uploaded_at is None and (self.bytes_sent >= self.file_size > 0 or (self.progress or 0) >= 100):
+            self.uploaded_at = now
+
+    def mark_finished(self, now=None):
+        self.finished_at = now or time.time()
+        if self.uploaded_at is None:
+            self.uploaded_at = self.finished_at
+
+    def check(self, now=None):
+        """返回失败原因，正常时返回None"""
+        now = now or time.time()
+        if self.uploaded_at is None:
+            if self.has_telemetry and now - self.last_activity > self.stall_seconds:
+                in_flight = self.requests_finished < self.requests_started
+                if not in_flight and (self.progress is None or self.progress >= 100):
+                    # 上传请求都已结束且没有新的请求：上传已完成，进入处理阶段
+                    self.uploaded_at = self.last_activity
+                    return self.check(now)
+                return (f"上传停滞：{now - self.last_activity:.0f} 秒没有进度"
+                        f"（已发送 {format_size(self.bytes_sent)} / {format_size(self.file_size)}）")
+            # 没有进度数据时分不清上传和处理阶段，总超时包含两者
+            timeout = self.upload_timeout + (0 if self.has_telemetry else self.processing_timeout)
+            if now - self.started > timeout:
+                return f"上传超时：{timeout:.0f} 秒内未完成（文件 {format_size(self.file_size)}）"
+        elif now - self.uploaded_at > self.processing_timeout:
+            return f"上传完成后等待处理超时（{self.processing_timeout:.0f} 秒）"
+        return None
+
+    def fraction(self):
+        """上传进度（0~1），未知时返回None"""
+        if self.progress is not None:
+            return min(self.progress / 100, 1.0)
+        if self.bytes_sent and self.file_size:
+            return min(self.bytes_sent / self.file_size, 1.0)
+        return None
+
+    def throughput(self):
+        """上传阶段的平均吞吐量（字节/秒）"""
+        end = self.uploaded_at or time.time()
+        elapsed = end - self.started
+        return self.file_size / elapsed if elapsed > 0 else None
+
+    def summary(self):
+        return {
+            'file_size': self.file_size,
+            'upload_seconds': round((self.uploaded_at or time.time()) - self.started, 1),
+            'processing_seconds': round(self.finished_at - self.uploaded_at, 1) if self.finished_at and self.uploaded_at else None,
+            'throughput_bytes_per_second': round(self.throughput() or 0),
+            'telemetry': self.has_telemetry,
+            'upload_timeout': round(self.upload_timeout),
+            'processing_timeout': round(self.processing_timeout)
+        }
@@ -5,26 +5,161 @@ import re
 from datetime import datetime
 import unicodedata
 from playwright.sync_api import sync_playwright
-from PyQt6.QtCore import QThread, pyqtSignal
-import requests
-import json
 import random
 import math
+import uuid
 import shutil
+import sqlite3
+from contextlib import nullcontext
+from bit_browser_client import BitBrowserClient
+from video_proxy import ProxyTranscoder, find_ffmpeg
+from video_segmenter import VideoSegmenter
+from folder_watcher import FolderWatcher
+from retry_policy import (RetryTracker, DeferredQueue, AnalysisFailure, classify_failure, FAILURE_NAMES,
+                          FAILURE_UI_MISSING, FAILURE_UPLOAD_STALL, FAILURE_GENERATION, FAILURE_EMPTY_RESULT,
+                          FAILURE_BROWSER, RETRY_PAGE, RETRY_DEFER)
+from adaptive_pacing import AdaptivePacer
+from storyboard_completeness import check_completeness, merge_continuation, DEFAULT_CONTINUATION_PROMPT
+from response_archive import ResponseArchive, ROLE_ANSWER, ROLE_CONTINUATION, prompt_hash
+from output_manifest import OutputManifest
+from output_layout import OutputLayout, LAYOUT_DATE
+from page_watchdog import PageWatchdog
+from page_recycler import PageRecycler, parse_metrics
+from request_filter import RequestFilter, format_bytes
+from work_queue import WorkQueue, LeaseKeeper, default_worker_id, QUEUE_PENDING, QUEUE_LEASED, QUEUE_DONE, QUEUE_FAILED
+from upload_monitor import UploadMonitor, INSTALL_TELEMETRY_SCRIPT, READ_TELEMETRY_SCRIPT, format_size
+from prompt_matrix import normalize_prompts, FORMAT_TABLE, FORMAT_TEXT
+from batch_prompt import build_batch_prompt, split_batch_response
+from selector_registry import SelectorRegistry, SelectorCircuitOpenError
+from video_fingerprint import FingerprintIndex, compute_fingerprints, np as fingerprint_numpy
+from video_probe import VideoProbeIndex, find_probe_tool, check_video
+from video_scheduler import VideoScheduler, TimingHistory, POLICY_FIFO
+from run_journal import RunJournal, STATE_ANALYZING, STATE_CAPTURED, STATE_SAVED, STATE_MARKED, STATE_REJECTED
 
-class VideoAnalysisEngine(QThread):
+# Gemini AI Studio 新对话页面
+NEW_CHAT_URL = "https://aistudio.google.com/prompts/new_chat"
+
+
+# 支持的本地视频格式
+SUPPORTED_VIDEO_FORMATS = ['.mp4', '.mov', '.avi', '.mkv', '.webm', '.flv']
+
+
+class BrowserUnavailableError(Exception):
+    """浏览器无法启动或连接，整个运行无法继续"""
+
+
+class EngineSignal:
+    """轻量信号对象，接口与pyqtSignal的connect/emit保持一致，使引擎不依赖Qt即可在子进程中运行"""
+
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def disconnect(self, slot=None):
+        if slot is None:
+            self._slots.clear()
+        elif slot in self._slots:
+            self._slots.remove(slot)
+
+    def emit(self, *args):
+        for slot in list(self._slots):
+            slot(*args)
+
+
+class VideoAnalysisEngine:
     """视频分析引擎，使用Playwright和比特浏览器API进行自动化操作"""
     
-    # 信号定义
-    progress_update = pyqtSignal(str)  # 进度更新信号
-    analysis_complete = pyqtSignal(dict)  # 分析完成信号
-    error_occurred = pyqtSignal(str)  # 错误信号
-    
-    def __init__(self, config):
-        super().__init__()
-        self.config = config
+    def __init__(self, config, cancel_event=None):
+        # 信号定义
+        self.progress_update = EngineSignal()  # 进度更新信号
+        self.analysis_complete = EngineSignal()  # 分析完成信号
+        self.error_occurred = EngineSignal()  # 错误信号
+        self.item_started = EngineSignal()  # 单个任务开始信号 (任务键)
+        self.item_finished = EngineSignal()  # 单个任务结束信号 (任务键, 是否成功)
+        self.metrics_update = EngineSignal()  # 运行指标信号 (指标字典)
+
         self.browser = None
         self.page = None
+        self.playwright = None
+        self.bit_client = None  # 比特浏览器API客户端，首次启动浏览器时创建
+        self.bit_client_settings = None  # 创建客户端时的API地址、超时和重试配置
+        self.prewarm_page = None  # 预热下一个视频的第二个标签页
+        self.prewarm_ready = False
+        self.has_next_item = False
+        self.proxy_transcoder = None  # 上传前代理转码（本地视频）
+        # 自适应节奏控制：常驻服务中跨任务保留，已学到的间隔不会因为新任务而重置
+        self.pacer = AdaptivePacer.from_config(config)
+        # 页面元素选择器注册表：备用写法、匹配统计和熔断
+        self.selectors = SelectorRegistry.from_config(config)
+        # 上传遥测的累计统计（常驻服务中跨任务累计）
+        self.upload_stats = {'files': 0, 'bytes': 0, 'seconds': 0.0, 'stalls': 0, 'last': None}
+        # 标签页回收：按页面内存采样和已处理视频数换用新标签页（常驻服务中跨任务计数）
+        self.page_recycler = PageRecycler.from_config(config)
+        self.page_used = False  # 上次采样之后是否用页面分析过视频
+        # 看门狗：发现页面崩溃、卡死或连接断开后重新连接浏览器（重连统计跨任务累计）
+        self.watchdog = PageWatchdog.from_config(config)
+        self.request_filter = None  # 新对话页面的请求过滤，每次运行按配置重新创建
+        self.request_filter_installed = False
+        self.last_analysis_finished = None
+        self.apply_config(config, cancel_event)
+    
+    def apply_config(self, config, cancel_event=None):
+        """设置本次运行的配置；常驻服务在多个任务之间复用同一个引擎和浏览器"""
+        self.config = config
+        # 取消事件（由父进程设置），以及重启后需要跳过的任务键
+        self.cancel_event = cancel_event
+        self.skip_keys = set(config.get('skip_keys', []))
+        # 提示词矩阵：上传一次后在同一对话中依次发送多个提示词，第一个是分镜表
+        self.prompts = normalize_prompts(config.get('prompt', ''))
+        self.current_prompt = self.prompts[0]
+        # 短视频批量模式：一个提示词附加多个短视频，回复按视频拆分
+        self.batch_size = max(1, int(config.get('batch_size', 4))) if config.get('batch_short_clips', False) else 1
+        self.batch_max_duration = config.get('batch_max_duration', 30)
+        # 常驻服务模式下运行结束后保留浏览器连接
+        self.keep_browser = config.get('keep_browser', False)
+        # 是否在生成期间用第二个标签页预热下一个视频的页面
+        self.prewarm_enabled = config.get('prewarm_next_tab', False)
+        # 每次运行单独创建的组件
+        self.journal = None  # 运行日志，记录每个任务的处理状态
+        self.scheduler = None  # 本地视频调度器
+        self.timing_history = None  # 历史耗时记录
+        self.segmenter = None  # 长视频分段
+        self.fingerprint_index = None  # 已分析视频的感知指纹索引
+        self.response_archive = None  # 模型原始回复归档，第一次获取到回复时创建
+        self.output_manifest = None  # 输出清单（SQLite），第一次保存结果时打开
+        self.config_errors = []  # 配置有误但可以按默认值继续的项，运行开始时作为错误上报
+        try:
+            self.output_layout = OutputLayout.from_config(config)  # 输出目录布局：平铺、按日期分区或按哈希分片
+        except ValueError as e:
+            self.config_errors.append(f"{e}，改为使用平铺布局")
+            self.output_layout = OutputLayout()
+        self.output_layout_resolved = False  # 是否已与输出目录中记录的布局核对
+        self.current_item = None  # 正在处理的任务，归档回复时记录视频键
+        self.current_chunk = None  # 分段分析时正在处理的片段序号
+        self.archive_attempt = None  # 当前一次生成的ID，同一对话中的重新生成和续写共用
+        self.retry_tracker = RetryTracker.from_config(config)  # 按失败类型决定重试方式
+        # 持久化工作队列：多个进程共同处理同一个数据源时，任务通过队列领取，不会重复处理
+        self.work_queue = None
+        self.lease_keeper = None  # 正在通过队列处理任务时为续租线程
+        self.queue_source = None
+        self.queue_completed = set()
+        self.run_started = None  # 通过队列分批处理时，时间预算从第一批开始计算
+        self.worker_id = config.get('queue_worker_id') or default_worker_id()
+        # 请求过滤：拦截页面加载中用不到的图片、字体和遥测请求；观察到的资源大小跨任务保留
+        previous_filter = self.request_filter
+        self.request_filter = RequestFilter.from_config(config)
+        if previous_filter:
+            self.request_filter.known_sizes = previous_filter.known_sizes
+        self.selectors.reset_breaker()
+        # 比特浏览器API地址、超时或重试配置变化时（常驻服务中的任务可以单独指定），下次启动浏览器时按新配置重新创建客户端
+        bit_client_settings = tuple(config.get(key) for key in (
+            'bit_api_url', 'bit_api_connect_timeout', 'bit_api_read_timeout', 'bit_api_retries', 'bit_api_backoff'))
+        if self.bit_client is not None and bit_client_settings != self.bit_client_settings:
+            self.bit_client.close()
+            self.bit_client = None
+        self.bit_client_settings = bit_client_settings
         # 添加延时配置，使用新的简化参数
         self.delay_config = {
             'min_delay': config.get('min_delay', 1),  # 最小延时时间（秒）
@@ -36,31 +171,50 @@ class VideoAnalysisEngine(QThread):
     
     def run(self):
         """主执行方法"""
+        # 构造引擎时信号尚未连接，配置错误在开始运行时上报
+        for message in self.config_errors:
+            self.error_occurred.emit(message)
         try:
             if self.config['analysis_type'] == 'youtube':
                 self.analyze_youtube_videos()
+            elif self.config['analysis_type'] == 'url':
+                self.analyze_single_url()
             else:
                 self.analyze_local_videos()
         except Exception as e:
             self.error_occurred.emit(f"分析过程中发生错误: {str(e)}")
     
+    def is_cancelled(self):
+        """检查是否收到取消请求"""
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def emit_cancelled(self, saved_count, total_videos):
+        """在任务之间响应取消请求"""
+        self.progress_update.emit("⏹️ 已收到取消请求，停止处理剩余视频。")
+        self.analysis_complete.emit({
+            'success': False,
+            'cancelled': True,
+            'message': f'已取消，成功保存 {saved_count}/{total_videos} 个视频',
+            'results_count': saved_count
+        })
+
     def analyze_youtube_videos(self):
         """分析YouTube视频，并标记已完成的任务"""
         try:
             self.progress_update.emit("正在读取并检查Excel文件...")
             excel_path = self.config['file_path']
             
+            status_col_name = "状态"
             try:
-                df = pd.read_excel(excel_path, engine='openpyxl')
+                df = self.read_youtube_sheet(excel_path, status_col_name)
             except FileNotFoundError:
                 self.error_occurred.emit(f"Excel文件不存在: {excel_path}")
                 return
 
-            # 确保状态列存在
-            status_col_name = "状态"
-            if status_col_name not in df.columns:
-                # 插入到第四列位置
-                df.insert(3, status_col_name, "")
+            # 标记完成时需要回写Excel
+            self.excel_path = excel_path
+            self.youtube_df = df
+            self.status_col_name = status_col_name
 
             # 找出需要分析的视频
             youtube_data = []
@@ -74,9 +228,14 @@ class VideoAnalysisEngine(QThread):
                     title = str(row.iloc[0]).strip() if pd.notna(row.iloc[0]) else f"视频_{index+1}"
                     url = str(row.iloc[1]).strip() if pd.notna(row.iloc[1]) else ""
                     if 'youtube.com' in url or 'youtu.be' in url:
+                        if url in self.skip_keys:
+                            self.progress_update.emit(f"➡️ 跳过(上次运行已处理): {title}")
+                            continue
                         youtube_data.append({
+                            'type': 'youtube',
                             'title': title,
                             'url': url,
+                            'key': url,
                             'index': index # 存储原始DataFrame索引
                         })
 
@@ -86,46 +245,21 @@ class VideoAnalysisEngine(QThread):
                 return
                 
             self.progress_update.emit(f"找到 {len(youtube_data)} 个新任务，开始分析...")
-            self.start_browser()
-            
-            saved_count = 0
-            total_videos = len(youtube_data)
-            for i, video_data in enumerate(youtube_data):
-                self.progress_update.emit(f"\n--- [ {i+1}/{total_videos} ] 开始处理: {video_data['title']} ---")
-                
-                try:
-                    result = self.analyze_single_youtube_video(video_data['url'], video_data['title'])
-                    
-                    if result and result.get('content'):
-                        self.progress_update.emit(f"✅ 分析完成，正在保存...")
-                        if self.save_single_result(result):
-                            saved_count += 1
-                            self.progress_update.emit(f"--- ✅ [ {i+1}/{total_videos} ] 保存成功 ---")
-                            
-                            # 关键步骤：更新Excel状态并保存
-                            try:
-                                df.loc[video_data['index'], status_col_name] = "已分析分镜提示词"
-                                df.to_excel(excel_path, index=False, engine='openpyxl')
-                                self.progress_update.emit(f"✏️ 已在Excel中标记 '{video_data['title']}' 为完成。")
-                            except Exception as e:
-                                self.progress_update.emit(f"⚠️ 更新Excel文件失败: {e}")
-
-                        else:
-                            self.progress_update.emit(f"--- ❌ [ {i+1}/{total_videos} ] 保存失败 ---\n")
-                    else:
-                        self.progress_update.emit(f"⚠️ 分析未返回有效结果，跳过。")
-
-                except Exception as e:
-                    self.error_occurred.emit(f"处理 '{video_data['title']}' 时出错: {e}")
-                    self.progress_update.emit("将尝试继续处理下一个视频...")
-
-            self.progress_update.emit("--- ✅ 所有视频处理流程完毕 ---")
-            self.analysis_complete.emit({'success': True, 'message': f'成功保存 {saved_count}/{total_videos} 个视频', 'results_count': saved_count})
+            self.open_journal(excel_path, youtube_data)
+            self.run_items(excel_path, youtube_data)
             
         except Exception as e:
             self.error_occurred.emit(f"YouTube分析流程失败: {str(e)}")
         finally:
-            self.cleanup_browser()
+            self.finish_run()
+
+    def read_youtube_sheet(self, excel_path, status_col_name):
+        """读取YouTube任务表，确保状态列存在"""
+        df = pd.read_excel(excel_path, engine='openpyxl')
+        if status_col_name not in df.columns:
+            # 插入到第四列位置
+            df.insert(3, status_col_name, "")
+        return df
     
     def analyze_local_videos(self):
         """分析文件夹内视频，并将已完成的移入子文件夹"""
@@ -139,135 +273,1300 @@ class VideoAnalysisEngine(QThread):
             # 创建"已分析"子文件夹
             completed_folder = os.path.join(folder_path, "已分析分镜提示词")
             os.makedirs(completed_folder, exist_ok=True)
+            self.completed_folder = completed_folder
+
+            if self.config.get('watch_folder'):
+                self.watch_local_folder(folder_path)
+                return
 
-            supported_formats = ['.mp4', '.mov', '.avi', '.mkv', '.webm', '.flv']
             video_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path)
                            if os.path.isfile(os.path.join(folder_path, f)) and 
-                           os.path.splitext(f)[1].lower() in supported_formats]
+                           os.path.splitext(f)[1].lower() in SUPPORTED_VIDEO_FORMATS]
 
             if not video_files:
                 self.error_occurred.emit(f"在文件夹 {folder_path} 中未找到支持的视频文件。")
                 return
 
+            if self.skip_keys:
+                video_files = [f for f in video_files if f not in self.skip_keys]
+                if not video_files:
+                    self.progress_update.emit("✅ 剩余视频均已在上次运行中处理，无需分析。")
+                    self.analysis_complete.emit({'success': True, 'message': '所有任务均已完成', 'results_count': 0})
+                    return
+
             self.progress_update.emit(f"在文件夹中找到 {len(video_files)} 个视频文件，准备开始处理...")
-            self.start_browser()
+            video_items = self.build_local_items(video_files)
+            self.open_journal(folder_path, video_items)
+            video_items = self.dedupe_local_videos(self.probe_local_videos(video_items))
+            if not video_items:
+                self.progress_update.emit("--- ✅ 所有视频处理流程完毕（没有可分析的视频） ---")
+                self.analysis_complete.emit({'success': True, 'message': '没有可分析的视频', 'results_count': 0})
+                return
+            video_items = self.schedule_local_videos(video_items)
+            self.start_segmenter()
+            self.start_proxy_transcoder()
+            self.run_items(folder_path, video_items)
 
-            saved_count = 0
-            total_videos = len(video_files)
-            for i, file_path in enumerate(video_files):
-                video_name = os.path.basename(file_path)
-                self.progress_update.emit(f"\n--- [ {i+1}/{total_videos} ] 开始处理: {video_name} ---")
-                
-                try:
-                    result = self.analyze_single_local_video(file_path)
-                    
-                    if result and result.get('content'):
-                        self.progress_update.emit(f"✅ 分析完成，正在保存...")
-                        if self.save_single_result(result):
-                            saved_count += 1
-                            self.progress_update.emit(f"--- ✅ [ {i+1}/{total_videos} ] 保存成功 ---")
+        except Exception as e:
+            self.error_occurred.emit(f"本地视频分析失败: {str(e)}")
+        finally:
+            self.finish_run()
 
-                            # 关键步骤：移动已处理的视频文件
-                            try:
-                                dest_path = os.path.join(completed_folder, video_name)
-                                shutil.move(file_path, dest_path)
-                                self.progress_update.emit(f"🚚 已将 '{video_name}' 移动到 '已分析分镜提示词' 文件夹。")
-                            except Exception as e:
-                                self.progress_update.emit(f"⚠️ 移动视频文件失败: {e}")
-                        else:
-                            self.progress_update.emit(f"--- ❌ [ {i+1}/{total_videos} ] 保存失败 ---\n")
-                    else:
-                        self.progress_update.emit(f"⚠️ 分析未返回有效结果。")
+    def build_local_items(self, video_files):
+        """把本地视频文件转换为任务"""
+        return [{
+            'type': 'local',
+            'title': os.path.basename(file_path),
+            'file_path': file_path,
+            'key': file_path
+        } for file_path in video_files]
 
-                except Exception as e:
-                    self.error_occurred.emit(f"处理 '{video_name}' 时出错: {e}")
-                    self.progress_update.emit("将尝试继续处理下一个视频...")
+    def watch_local_folder(self, folder_path):
+        """监视模式：持续处理文件夹中新写入完成的视频，直到收到取消请求；浏览器在两批视频之间保持连接"""
+        watcher = FolderWatcher(
+            folder_path, SUPPORTED_VIDEO_FORMATS,
+            stable_seconds=self.config.get('watch_stable_seconds', 5),
+            poll_interval=self.config.get('watch_poll_interval', 2)
+        )
+        watcher.start()
+        self.open_journal(folder_path, [])
+        self.start_segmenter()
+        self.start_proxy_transcoder()
+        self.progress_update.emit(f"👀 正在监视文件夹（{watcher.mode}），新视频写入完成后会自动加入队列...")
+
+        keepalive_interval = self.config.get('watch_keepalive_seconds', 300)
+        last_keepalive = time.time()
+        saved_count = 0
+        queued_count = 0
+        try:
+            while not self.is_cancelled():
+                new_files = [f for f in watcher.wait_for_new_files(timeout=1.0) if f not in self.skip_keys]
+                if not new_files:
+                    if time.time() - last_keepalive >= keepalive_interval:
+                        self.keep_browser_warm()
+                        last_keepalive = time.time()
+                    continue
+
+                self.progress_update.emit(f"📥 检测到 {len(new_files)} 个新视频: {', '.join(os.path.basename(f) for f in new_files)}")
+                video_items = self.build_local_items(new_files)
+                self.queue_in_journal(video_items)
+                video_items = self.dedupe_local_videos(self.probe_local_videos(video_items))
+                if not video_items:
+                    continue
+                video_items = self.schedule_local_videos(video_items)
+                queued_count += len(video_items)
+                batch_saved, finished = self.run_items(folder_path, video_items, report=False)
+                saved_count += batch_saved
+                if not finished:
+                    return
+                self.progress_update.emit(f"👀 本批视频处理完毕（累计保存 {saved_count}/{queued_count}），继续监视文件夹...")
+                self.keep_browser_warm()
+                last_keepalive = time.time()
+        finally:
+            watcher.close()
+
+        self.progress_update.emit("⏹️ 已停止监视文件夹。")
+        self.analysis_complete.emit({
+            'success': True,
+            'cancelled': True,
+            'message': f'已停止监视，成功保存 {saved_count}/{queued_count} 个视频',
+            'results_count': saved_count
+        })
+
+    def keep_browser_warm(self):
+        """监视模式空闲时检查浏览器连接，并预先打开下一个视频的新对话页面"""
+        if self.page is None:
+            return
+        try:
+            self.ensure_browser()
+            self.has_next_item = True
+            self.prewarm_next_page()
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 空闲时检查浏览器连接失败，将在下一个视频开始时重试: {e}")
+
+    def analyze_single_url(self):
+        """分析单个YouTube链接（常驻服务的临时任务），结果只保存不回写Excel"""
+        try:
+            url = self.config['url'].strip()
+            if 'youtube.com' not in url and 'youtu.be' not in url:
+                self.error_occurred.emit(f"不是有效的YouTube链接: {url}")
+                return
+
+            item = {
+                'type': 'youtube',
+                'title': self.config.get('title') or url,
+                'url': url,
+                'key': url,
+                'index': None  # 不对应Excel行，无需标记
+            }
+            self.open_journal(url, [item])
+            self.process_items([item])
+
+        except Exception as e:
+            self.error_occurred.emit(f"单个链接分析失败: {str(e)}")
+        finally:
+            self.finish_run()
+
+    def probe_local_videos(self, items):
+        """探测阶段：并行读取时长、编码、分辨率和大小，在打开浏览器之前剔除无法分析的文件"""
+        if not self.config.get('probe_videos', True):
+            return items
+        tool, tool_path = find_probe_tool(self.config)
+        if not tool:
+            self.progress_update.emit("⚠️ 未找到ffprobe/ffmpeg，跳过视频探测")
+            return items
+
+        self.progress_update.emit(f"正在探测 {len(items)} 个视频的元数据...")
+        index = VideoProbeIndex(os.path.join(self.config['output_path'], ".video_probe_index.json"))
+        results = index.probe_all([item['file_path'] for item in items], tool, tool_path,
+                                  workers=self.config.get('probe_workers', 4))
+
+        # 启用代理转码时上传的是代理文件，不检查原文件大小
+        max_size_mb = 0 if self.config.get('proxy_transcode') else self.config.get('max_upload_mb', 2000)
+        accepted = []
+        for item in items:
+            info = results.get(item['file_path'], {})
+            reason = check_video(info, max_size_mb=max_size_mb,
+                                 max_duration=self.config.get('max_video_duration', 0))
+            if reason:
+                self.progress_update.emit(f"⛔ 跳过无法分析的视频 '{item['title']}': {reason}")
+                self.record_state(item['key'], STATE_REJECTED, reason=reason)
+                continue
+            item['duration'] = info.get('duration')
+            item['probe'] = info
+            accepted.append(item)
+
+        rejected_count = len(items) - len(accepted)
+        if rejected_count:
+            self.progress_update.emit(f"探测完成: {len(accepted)} 个可分析，{rejected_count} 个已拒绝（原因见上方日志和运行日志）")
+        else:
+            self.progress_update.emit(f"✅ 探测完成: {len(accepted)} 个视频均可分析")
+        return accepted
+
+    def dedupe_local_videos(self, items):
+        """重复检测：按感知指纹查找与已分析视频（或本批中较早的视频）近似重复的文件，标记或跳过"""
+        if not items or not self.config.get('dedupe_videos'):
+            return items
+        ffmpeg_path = find_ffmpeg(self.config.get('ffmpeg_path'))
+        if fingerprint_numpy is None or not ffmpeg_path:
+            self.progress_update.emit("⚠️ 重复检测需要NumPy和ffmpeg，已跳过")
+            return items
+
+        if self.fingerprint_index is None:
+            index_dir = self.config.get('fingerprint_index_dir') or os.path.join(self.config['output_path'], ".fingerprint_index")
+            try:
+                self.fingerprint_index = FingerprintIndex(index_dir)
+            except Exception as e:
+                self.progress_update.emit(f"⚠️ 无法打开指纹索引，跳过重复检测: {e}")
+                return items
+
+        measurable = [item for item in items if item.get('duration')]
+        self.progress_update.emit(f"正在计算 {len(measurable)} 个视频的感知指纹（已索引 {len(self.fingerprint_index)} 个视频）...")
+        fingerprints = compute_fingerprints(measurable, ffmpeg_path, workers=self.config.get('probe_workers', 4))
+
+        threshold = self.config.get('duplicate_threshold', 8)
+        skip_duplicates = self.config.get('duplicate_action', 'skip') == 'skip'
+        accepted = []
+        for item in items:
+            fingerprint = fingerprints.get(item['file_path'])
+            if fingerprint is None or isinstance(fingerprint, Exception):
+                if isinstance(fingerprint, Exception):
+                    self.progress_update.emit(f"⚠️ 无法计算 '{item['title']}' 的指纹: {fingerprint}")
+                accepted.append(item)
+                continue
+
+            match, distance = self.fingerprint_index.find_duplicate(fingerprint, threshold, exclude_key=item['key'])
+            if match is not None:
+                reason = f"与 '{match['title']}' 近似重复（距离 {distance:.1f}）"
+                if skip_duplicates:
+                    self.progress_update.emit(f"⛔ 跳过重复视频 '{item['title']}': {reason}")
+                    self.record_state(item['key'], STATE_REJECTED, reason=reason, duplicate_of=match['key'])
+                    continue
+                self.progress_update.emit(f"⚠️ '{item['title']}' {reason}，仍然分析")
+                item['duplicate_of'] = match['key']
 
+            item['fingerprint'] = fingerprint
+            self.fingerprint_index.add_pending(fingerprint, {'key': item['key'], 'title': item['title']})
+            accepted.append(item)
+        return accepted
+
+    def index_fingerprint(self, item):
+        """视频分析完成后把指纹写入索引"""
+        if self.fingerprint_index is None or item.get('fingerprint') is None:
+            return
+        try:
+            self.fingerprint_index.add(item['fingerprint'], {
+                'key': item['key'],
+                'title': item['title'],
+                'duration': item.get('duration'),
+                'analyzed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            })
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 写入指纹索引失败: {e}")
+
+    def schedule_local_videos(self, items):
+        """按调度策略排列本地视频队列，并根据历史耗时预估总时间"""
+        self.timing_history = TimingHistory(os.path.join(self.config['output_path'], ".timing_history.json"))
+        policy = self.config.get('schedule_policy', POLICY_FIFO)
+        try:
+            self.scheduler = VideoScheduler(policy, self.timing_history,
+                                            time_budget_seconds=self.config.get('time_budget_minutes', 0) * 60)
+        except ValueError as e:
+            self.progress_update.emit(f"⚠️ {e}，使用原始顺序")
+            self.scheduler = VideoScheduler(POLICY_FIFO, self.timing_history)
+
+        ordered = self.scheduler.order(items)
+        estimated_minutes = self.scheduler.estimate_total(ordered) / 60
+        self.progress_update.emit(
+            f"调度策略: {self.scheduler.policy}，预计总耗时约 {estimated_minutes:.0f} 分钟"
+            f"（开销 {self.timing_history.overhead:.0f}s + 每分钟视频 {self.timing_history.seconds_per_minute:.0f}s）"
+        )
+        return ordered
+
+    def record_timing(self, item, elapsed_seconds):
+        """记录本地视频的处理耗时，用于后续预估"""
+        if self.timing_history is None or item.get('duration') is None:
+            return
+        try:
+            self.timing_history.add(item['duration'], elapsed_seconds)
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 保存耗时记录失败: {e}")
+
+    def start_segmenter(self):
+        """按配置启用长视频分段"""
+        if not self.config.get('segment_long_videos'):
+            return
+        ffmpeg_path = find_ffmpeg(self.config.get('ffmpeg_path'))
+        if not ffmpeg_path:
+            self.progress_update.emit("⚠️ 未找到ffmpeg，长视频分段已禁用")
+            return
+        self.segmenter = VideoSegmenter.from_config(self.config, ffmpeg_path, log=self.progress_update.emit)
+        mode = "镜头切换" if self.segmenter.scene_detection else "固定间隔"
+        self.progress_update.emit(f"✂️ 已启用长视频分段：超过 {self.segmenter.threshold_seconds // 60} 分钟的视频按{mode}切分")
+
+    def start_proxy_transcoder(self):
+        """按配置启动上传前的代理转码进程池"""
+        if not self.config.get('proxy_transcode'):
+            return
+        self.proxy_transcoder = ProxyTranscoder.from_config(self.config, log=self.progress_update.emit)
+        if self.proxy_transcoder is None:
+            self.progress_update.emit("⚠️ 未找到ffmpeg，代理转码已禁用，将上传原文件")
+        else:
+            self.progress_update.emit(f"🎞️ 已启用代理转码，缓存目录: {self.proxy_transcoder.cache_dir}")
+
+    def finish_run(self):
+        """运行结束：常驻服务模式保留浏览器，否则断开连接"""
+        for name, hits in self.selectors.fallback_report().items():
+            self.progress_update.emit(f"⚠️ 页面元素 '{name}' 使用了备用选择器（写法序号: 次数 {hits}），主写法可能已失效")
+        if self.proxy_transcoder:
+            self.proxy_transcoder.shutdown()
+            self.proxy_transcoder = None
+        if self.output_manifest:
+            self.output_manifest.close()
+            self.output_manifest = None
+        if self.work_queue:
+            self.work_queue.close()
+            self.work_queue = None
+        request_metrics = self.request_filter.metrics()
+        if request_metrics['page_loads']:
+            self.progress_update.emit(
+                f"🧹 页面加载 {request_metrics['page_loads']} 次，平均 {request_metrics['avg_load_seconds']:.1f} 秒；"
+                f"{self.request_filter.action_name} {request_metrics['blocked_requests']} 个请求，约节省 {format_bytes(request_metrics['bytes_saved'])}"
+                + (f"（{request_metrics['unknown_size_requests']} 个大小未知）" if request_metrics['unknown_size_requests'] else ""))
+        if not self.keep_browser:
+            self.cleanup_browser()
+
+    def open_journal(self, source, items):
+        """打开运行日志并登记本次队列，日志不可用时不影响分析"""
+        try:
+            worker = self.worker_id if self.config.get('work_queue', False) else None
+            self.journal = RunJournal(self.config['output_path'], source, worker)
+        except Exception as e:
+            self.journal = None
+            self.progress_update.emit(f"⚠️ 无法打开运行日志，将不记录断点: {e}")
+            return
+        self.queue_in_journal(items)
+
+    def queue_in_journal(self, items):
+        """在运行日志中登记任务，并提示可直接恢复的结果"""
+        if not self.journal:
+            return
+        try:
+            self.journal.record_queued([item['key'] for item in items])
+            recoverable = sum(1 for item in items
+                              if self.journal.state(item['key']) in (STATE_CAPTURED, STATE_SAVED))
+            if recoverable:
+                self.progress_update.emit(f"♻️ 运行日志中有 {recoverable} 个任务的结果可直接恢复，无需重新生成。")
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 写入运行日志失败: {e}")
+
+    def record_state(self, key, state, **data):
+        """写入运行日志，写入失败只记录警告"""
+        if not self.journal:
+            return
+        try:
+            self.journal.record(key, state, **data)
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 写入运行日志失败: {e}")
+
+    def ensure_browser(self):
+        """按需启动浏览器：全部任务都能从日志恢复时无需打开浏览器；页面崩溃、卡死或连接断开时重新连接"""
+        if self.page is not None:
+            reason = self.watchdog.check(self.browser, self.page)
+            if reason:
+                self.recover_browser(reason)
+        if self.page is None:
+            self.connect_browser()
+        self.install_request_filter()
+        self.page_used = True
+
+    def connect_browser(self):
+        """打开比特浏览器窗口并连接，失败时按退避间隔重试，全部失败时抛出 BrowserUnavailableError
+
+        中间的失败只写入日志，由外层在全部重试失败后统一上报错误，界面不会在重连过程中弹出错误提示。
+        """
+        last_error = None
+        delays = self.watchdog.reconnect_delays()
+        for attempt, delay in enumerate(delays, start=1):
+            if delay:
+                self.progress_update.emit(f"⏳ {delay:.0f} 秒后第 {attempt} 次尝试连接浏览器...")
+                deadline = time.time() + delay
+                while time.time() < deadline and not self.is_cancelled():
+                    time.sleep(min(1, max(deadline - time.time(), 0)))
+                if self.is_cancelled():
+                    break
+            try:
+                self.start_browser()
+                return
+            except ValueError as e:
+                # 配置错误（例如没有窗口ID），重试没有意义
+                raise BrowserUnavailableError(str(e)) from e
+            except Exception as e:
+                last_error = e
+                self.progress_update.emit(f"⚠️ 第 {attempt}/{len(delays)} 次连接浏览器失败: {e}")
+                self.cleanup_browser()
+        if last_error is None:
+            raise BrowserUnavailableError("已取消")
+        raise BrowserUnavailableError(f"连接浏览器失败（已尝试 {len(delays)} 次）: {last_error}") from last_error
+
+    def recover_browser(self, reason):
+        """页面或连接失效：断开旧连接，重新打开比特浏览器窗口并连接，恢复一个干净的页面"""
+        self.progress_update.emit(f"🐕 看门狗: {reason}，正在重新连接浏览器...")
+        self.watchdog.record_failure(reason)
+        started = time.time()
+        self.cleanup_browser()
+        self.connect_browser()
+        try:
+            # 重新连接后保留的仍是原来的第一个标签页，崩溃或卡死的页面需要换掉
+            self.open_fresh_page()
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 打开新标签页失败，继续使用原页面: {e}")
+        elapsed = time.time() - started
+        self.watchdog.record_recovery(elapsed)
+        self.progress_update.emit(f"✅ 已重新连接浏览器（用时 {elapsed:.1f} 秒）")
+        self.metrics_update.emit(self.get_metrics())
+
+    def install_request_filter(self):
+        """在浏览器上下文上注册请求完成事件，用于观察模式统计实际大小；拦截只在加载新对话页面期间生效（见 load_new_chat）"""
+        if self.request_filter_installed or not self.request_filter.enabled:
+            return
+        try:
+            # 处理函数每次取当前的过滤器，常驻服务中后续任务的配置同样生效
+            self.context.on("requestfinished", lambda request: self.request_filter.handle_request_finished(request))
+            self.context.on("requestfailed", lambda request: self.request_filter.handle_request_failed(request))
+            self.request_filter_installed = True
+            mode = "仅观察" if self.request_filter.observe else "拦截"
+            self.progress_update.emit(f"🧹 已启用请求过滤（{mode}）: 资源类型 {', '.join(sorted(self.request_filter.resource_types))}，"
+                                      f"URL规则 {len(self.request_filter.url_patterns)} 条")
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 注册请求过滤失败，页面将加载全部资源: {e}")
+
+    def process_items(self, items, report=True):
+        """依次处理任务队列，返回 (保存成功数, 是否处理完整个队列)
+
+        report 为False时（监视模式的每一批）处理完不发送完成信号；取消或时间预算用完时总会发送。
+        失败的任务按失败类型立即在新页面重试，或推迟到队列末尾按指数退避重试，不阻塞后面的任务。
+        """
+        if self.config.get('skip_analyzed_videos', False):
+            items = self.skip_analyzed_items(items)
+        saved_count = 0
+        total_videos = len(items)
+        run_started = self.run_started or time.time()
+        positions = {item['key']: i for i, item in enumerate(items)}
+        queue = list(items)
+        deferred = DeferredQueue()
+        while queue or deferred:
+            if self.is_cancelled():
+                self.emit_cancelled(saved_count, total_videos)
+                return saved_count, False
+
+            if queue:
+                item = queue.pop(0)
+            else:
+                if not self.wait_for_deferred(deferred):
+                    self.emit_cancelled(saved_count, total_videos)
+                    return saved_count, False
+                item = deferred.pop()
+            i = positions[item['key']]
+
+            if self.scheduler and not self.scheduler.should_start(item, time.time() - run_started):
+                remaining = len(queue) + len(deferred) + 1
+                self.progress_update.emit(f"⏱️ 预计超出时间预算，不再开始新任务，剩余 {remaining} 个视频留待下次运行。")
+                self.analysis_complete.emit({'success': True, 'message': f'时间预算已用完，成功保存 {saved_count}/{total_videos} 个视频，剩余 {remaining} 个', 'results_count': saved_count})
+                return saved_count, False
+
+            if self.is_batchable(item):
+                batch = [item] + [later for later in queue
+                                  if later['type'] == item['type'] and self.is_batchable(later)][:self.batch_size - 1]
+                if len(batch) > 1:
+                    for later in batch[1:]:
+                        queue.remove(later)
+                    saved_count += self.process_batch(batch, positions, total_videos, queue, deferred)
+                    self.check_page_memory()
+                    continue
+
+            self.progress_update.emit(f"\n--- [ {i+1}/{total_videos} ] 开始处理: {item['title']} ---")
+            self.item_started.emit(item['key'])
+            self.has_next_item = bool(queue or deferred)
+            item_success = False
+
+            self.current_item = item
+            try:
+                if self.proxy_transcoder:
+                    # 代理转码在浏览器之前提前处理后续几个视频
+                    self.proxy_transcoder.prefetch([later['file_path'] for later in [item] + queue
+                                                    if later['type'] == 'local' and not self.needs_segmentation(later)])
+                saved, item_success = self.process_item(item, i, total_videos)
+                if saved:
+                    saved_count += 1
+            except (BrowserUnavailableError, SelectorCircuitOpenError):
+                # 浏览器不可用或页面已改版时后续任务都无法进行，直接结束本次运行
+                raise
+            except Exception as e:
+                self.handle_item_failure(item, e, queue, deferred)
+            finally:
+                self.item_finished.emit(item['key'], item_success)
+            self.check_page_memory()
+
+        if report:
             self.progress_update.emit("--- ✅ 所有视频处理流程完毕 ---")
             self.analysis_complete.emit({'success': True, 'message': f'成功保存 {saved_count}/{total_videos} 个视频', 'results_count': saved_count})
+        return saved_count, True
+
+    def run_items(self, source, items, report=True):
+        """处理任务：启用工作队列时通过队列领取，否则由本进程直接处理，返回 (保存成功数, 是否处理完整个队列)"""
+        if self.config.get('work_queue', False):
+            return self.process_work_queue(source, items, report)
+        return self.process_items(items, report)
+
+    def process_work_queue(self, source, items, report=True):
+        """把任务登记到持久化工作队列，再按批领取处理，直到队列中没有可领取的任务
+
+        多个进程处理同一个数据源时各自登记（已登记的任务不会重复），领取时持有租约并在后台定期续租；
+        进程退出后租约过期，未完成的任务由其他进程接手。
+        """
+        try:
+            if self.work_queue is None:
+                self.work_queue = WorkQueue.from_config(self.config)
+        except (sqlite3.Error, OSError) as e:
+            self.progress_update.emit(f"⚠️ 无法打开工作队列，改为由本进程单独处理: {e}")
+            self.work_queue = None
+            return self.process_items(items, report)
+        added = self.work_queue.enqueue(source, [self.queue_payload(item) for item in items])
+        counts = self.work_queue.counts(source)
+        self.progress_update.emit(
+            f"🗂️ 工作队列（本进程 {self.worker_id}）: 新登记 {added} 个任务，等待 {counts[QUEUE_PENDING] + counts['expired']} 个，"
+            f"其他进程处理中 {counts[QUEUE_LEASED]} 个，已完成 {counts[QUEUE_DONE]} 个")
+
+        claim_size = self.config.get('queue_claim_size', max(self.batch_size, 2))
+        self.queue_source = source
+        self.lease_keeper = LeaseKeeper(self.work_queue, source, self.worker_id,
+                                        interval=self.config.get('queue_heartbeat_seconds', 60),
+                                        on_lost=self.on_queue_lease_lost).start()
+        saved_count = 0
+        processed_count = 0
+        self.run_started = time.time()
+        try:
+            while True:
+                if self.is_cancelled():
+                    self.emit_cancelled(saved_count, processed_count)
+                    return saved_count, False
+                claimed, reclaimed = self.work_queue.claim(source, self.worker_id, claim_size)
+                if not claimed:
+                    break
+                claimed = [self.restore_queue_item(item) for item in claimed]
+                if reclaimed:
+                    self.progress_update.emit(f"♻️ {len(reclaimed)} 个任务的租约已过期（原进程可能已退出），由本进程接手")
+                self.lease_keeper.hold(item['key'] for item in claimed)
+                processed_count += len(claimed)
+                finished = False
+                try:
+                    batch_saved, finished = self.process_items(claimed, report=False)
+                    saved_count += batch_saved
+                finally:
+                    self.release_queue_items(claimed, finished)
+                if not finished:
+                    return saved_count, False
+        finally:
+            self.lease_keeper.stop()
+            self.lease_keeper = None
+            self.run_started = None
+
+        counts = self.work_queue.counts(source)
+        if counts[QUEUE_LEASED]:
+            self.progress_update.emit(f"🗂️ 队列中已没有可领取的任务，还有 {counts[QUEUE_LEASED]} 个正由其他进程处理")
+        if counts[QUEUE_FAILED]:
+            self.progress_update.emit(f"⚠️ 队列中有 {counts[QUEUE_FAILED]} 个任务多次处理失败，可用 work_queue.py requeue 重新排队")
+        if report:
+            self.progress_update.emit("--- ✅ 所有视频处理流程完毕 ---")
+            self.analysis_complete.emit({'success': True, 'message': f'本进程成功保存 {saved_count}/{processed_count} 个视频',
+                                         'results_count': saved_count})
+        return saved_count, True
+
+    def queue_payload(self, item):
+        """登记到队列的任务内容：感知指纹（NumPy数组）转为列表，其余字段都是可以直接序列化的基本类型"""
+        payload = dict(item)
+        if payload.get('fingerprint') is not None:
+            payload['fingerprint'] = [int(value) for value in payload['fingerprint']]
+        return payload
 
+    def restore_queue_item(self, item):
+        """领取后还原任务：指纹恢复为NumPy数组，完成后写入指纹索引"""
+        if item.get('fingerprint') is not None and fingerprint_numpy is not None:
+            item['fingerprint'] = fingerprint_numpy.asarray(item['fingerprint'], dtype=fingerprint_numpy.uint64)
+        return item
+
+    def release_queue_items(self, claimed, finished):
+        """交还本批领取后没有完成的任务：处理失败的计入领取次数，取消或时间预算用完时原样放回队列"""
+        for item in claimed:
+            key = item['key']
+            self.lease_keeper.drop(key)
+            if key in self.queue_completed:
+                continue
+            error = None
+            if finished:
+                entry = self.journal.get(key) if self.journal else None
+                error = (entry or {}).get('error') or "处理未完成"
+            try:
+                if self.work_queue.release(self.queue_source, key, self.worker_id, error) == QUEUE_FAILED:
+                    self.progress_update.emit(f"⚠️ '{item['title']}' 已处理 {self.work_queue.max_attempts} 次仍未完成，在队列中标记为失败")
+            except Exception as e:
+                self.progress_update.emit(f"⚠️ 交还队列任务失败（租约过期后会自动回到队列）: {e}")
+
+    def complete_queue_item(self, key):
+        """在工作队列中标记任务完成"""
+        if self.lease_keeper is None:
+            return
+        try:
+            self.work_queue.complete(self.queue_source, key, self.worker_id)
+            self.queue_completed.add(key)
+            self.lease_keeper.drop(key)
         except Exception as e:
-            self.error_occurred.emit(f"本地视频分析失败: {str(e)}")
+            self.progress_update.emit(f"⚠️ 在工作队列中标记完成失败: {e}")
+
+    def on_queue_lease_lost(self, keys):
+        """续租线程发现租约已被其他进程接手（本进程长时间没有续租，例如系统休眠）"""
+        self.progress_update.emit(f"⚠️ {len(keys)} 个任务的租约已过期并被其他进程接手，这些任务可能被重复处理")
+
+    def skip_analyzed_items(self, items):
+        """跳过输出清单中已保存过分镜表的视频"""
+        manifest = self.get_output_manifest()
+        if manifest is None:
+            return items
+        analyzed = manifest.analyzed_keys(item['key'] for item in items)
+        if analyzed:
+            self.progress_update.emit(f"➡️ 输出清单显示 {len(analyzed)} 个视频已分析过，跳过")
+        for key in analyzed:
+            self.complete_queue_item(key)
+        return [item for item in items if item['key'] not in analyzed]
+
+    def handle_item_failure(self, item, error, queue, deferred):
+        """按失败类型处理失败的任务：新页面重试、推迟到队列末尾或放弃"""
+        failure_class = classify_failure(error)
+        if failure_class != FAILURE_BROWSER and self.page is not None:
+            # 页面崩溃或卡死时各个步骤报出的错误五花八门，由看门狗确认后按浏览器连接断开处理
+            reason = self.watchdog.check(self.browser, self.page)
+            if reason:
+                failure_class, error = FAILURE_BROWSER, f"{reason}（{error}）"
+        failure_name = FAILURE_NAMES[failure_class]
+        decision, delay = self.retry_tracker.decide(item['key'], failure_class)
+        if failure_class == FAILURE_BROWSER and self.page is not None:
+            # 立即重新连接，中断的任务和后面的任务都在新连接上继续；重连失败时结束本次运行
+            self.recover_browser(str(error))
+        if decision == RETRY_PAGE:
+            self.progress_update.emit(f"🔁 '{item['title']}' {failure_name}: {error}，立即在新页面重试")
+            queue.insert(0, item)
+        elif decision == RETRY_DEFER:
+            self.progress_update.emit(f"⏳ '{item['title']}' {failure_name}: {error}，推迟到队列末尾，约 {delay:.0f} 秒后重试")
+            deferred.push(item, delay)
+        else:
+            self.record_state(item['key'], STATE_ANALYZING, failure=failure_class, error=str(error))
+            self.error_occurred.emit(f"处理 '{item['title']}' 时出错（{failure_name}，已达到重试上限）: {error}")
+            self.progress_update.emit("将尝试继续处理下一个视频...")
+
+    def wait_for_pacing(self):
+        """两个视频之间按自适应节奏等待，间隔从上一个视频分析结束时开始计算"""
+        if self.last_analysis_finished is None:
+            return
+        wait_seconds = self.pacer.gap - (time.time() - self.last_analysis_finished)
+        if wait_seconds <= 0:
+            return
+        self.progress_update.emit(f"⏱️ 节奏控制: 等待 {wait_seconds:.0f} 秒后开始下一个视频")
+        deadline = time.time() + wait_seconds
+        while time.time() < deadline and not self.is_cancelled():
+            time.sleep(min(1, max(deadline - time.time(), 0)))
+
+    def record_pacing(self, success):
+        """把成功或与频率相关的失败反馈给节奏控制，并发布最新指标"""
+        previous_gap = self.pacer.gap
+        if success:
+            self.pacer.record_success()
+        else:
+            self.pacer.record_error()
+        if self.pacer.gap > previous_gap:
+            self.progress_update.emit(f"🐢 错误增多，视频间隔调整为 {self.pacer.gap:.0f} 秒（最近错误率 {self.pacer.error_rate:.0%}）")
+        elif self.pacer.gap < previous_gap and self.pacer.gap in (self.pacer.min_gap, self.pacer.max_gap):
+            self.progress_update.emit(f"🚀 运行稳定，视频间隔已降至 {self.pacer.gap:.0f} 秒")
+        self.metrics_update.emit(self.get_metrics())
+
+    def get_metrics(self):
+        """当前运行指标"""
+        metrics = self.pacer.metrics()
+        metrics['selectors'] = self.selectors.summary()
+        uploads = dict(self.upload_stats)
+        uploads['avg_throughput_bytes_per_second'] = round(uploads['bytes'] / uploads['seconds']) if uploads['seconds'] else None
+        metrics['uploads'] = uploads
+        metrics['page_memory'] = self.page_recycler.metrics()
+        metrics['request_filter'] = self.request_filter.metrics()
+        metrics['watchdog'] = self.watchdog.metrics()
+        return metrics
+
+    def sample_page_memory(self):
+        """通过CDP性能指标采样当前页面的JS堆和DOM节点数，失败时返回None"""
+        try:
+            session = self.context.new_cdp_session(self.page)
+            try:
+                session.send("Performance.enable")
+                return parse_metrics(session.send("Performance.getMetrics"))
+            finally:
+                session.detach()
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 采样页面内存失败: {e}")
+            return None
+
+    def check_page_memory(self):
+        """视频处理完后采样页面内存，达到阈值或处理数上限时回收标签页"""
+        if not self.page_used or self.page is None or self.page.is_closed():
+            return
+        self.page_used = False
+        sample = self.sample_page_memory()
+        if sample:
+            self.progress_update.emit(f"📊 页面内存: JS堆 {sample['heap_mb']:.0f} MB，DOM节点 {sample['dom_nodes']} 个")
+        reason = self.page_recycler.record_item(sample)
+        if reason:
+            self.recycle_page(reason)
+        self.metrics_update.emit(self.get_metrics())
+
+    def recycle_page(self, reason):
+        """换用新标签页，释放渲染进程积累的内存"""
+        self.progress_update.emit(f"♻️ 回收标签页（{reason}），换用新标签页")
+        try:
+            self.open_fresh_page()
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 打开新标签页失败，继续使用当前页面: {e}")
+            return
+        self.page_recycler.page_replaced(reason)
+
+    def open_fresh_page(self):
+        """在同一个浏览器上下文中打开新标签页，关闭旧页面（和预热页面）"""
+        # 先打开新标签页再关闭旧页面，避免窗口中没有标签页时被关闭
+        new_page = self.context.new_page()
+        old_pages = [self.page, self.prewarm_page]
+        self.page, self.prewarm_page, self.prewarm_ready = new_page, None, False
+        for page in old_pages:
+            try:
+                if page is not None and not page.is_closed():
+                    page.close()
+            except Exception as e:
+                self.progress_update.emit(f"⚠️ 关闭旧标签页失败: {e}")
+
+    def wait_for_deferred(self, deferred):
+        """队列处理完后等待最早的推迟任务到期，期间响应取消请求；被取消时返回False"""
+        wait_seconds = deferred.next_ready_at() - time.time()
+        if wait_seconds >= 1:
+            self.progress_update.emit(f"⏳ 还有 {len(deferred)} 个推迟的任务，{wait_seconds:.0f} 秒后重试...")
+        while time.time() < deferred.next_ready_at():
+            if self.is_cancelled():
+                return False
+            time.sleep(min(1, max(deferred.next_ready_at() - time.time(), 0)))
+        return True
+
+    def process_item(self, item, position, total_videos):
+        """处理单个任务，优先从运行日志恢复，返回 (是否已保存, 是否已标记完成)"""
+        key = item['key']
+        entry = self.journal.get(key) if self.journal else None
+        state = entry.get('state') if entry else None
+
+        if state == STATE_SAVED:
+            self.progress_update.emit("♻️ 运行日志显示结果已保存，仅补写完成标记。")
+        elif state == STATE_CAPTURED and entry.get('result'):
+            self.progress_update.emit("♻️ 运行日志中已有分析结果，直接重新保存。")
+            if not self.save_item_result(item, entry['result'], position, total_videos):
+                return False, False
+        else:
+            self.record_state(key, STATE_ANALYZING)
+            self.wait_for_pacing()
+            self.ensure_browser()
+            analysis_started = time.time()
+            try:
+                result = self.analyze_item(item)
+            finally:
+                self.last_analysis_finished = time.time()
+            if not (result and result.get('content')):
+                raise AnalysisFailure(FAILURE_EMPTY_RESULT, "分析未返回有效结果")
+            elapsed = time.time() - analysis_started
+            self.record_timing(item, elapsed)
+            self.record_pacing(success=True)
+            result['analysis_seconds'] = round(elapsed, 1)
+            return self.finish_item(item, result, position, total_videos)
+
+        return self.finish_item(item, None, position, total_videos)
+
+    def finish_item(self, item, result, position, total_videos):
+        """记录并保存新获取的分析结果（result为None表示结果已保存），然后标记完成，返回 (是否已保存, 是否已标记完成)"""
+        if result is not None:
+            self.record_state(item['key'], STATE_CAPTURED, result=result)
+            self.progress_update.emit(f"✅ 分析完成，正在保存...")
+            if not self.save_item_result(item, result, position, total_videos):
+                return False, False
+
+        self.index_fingerprint(item)
+        marked = self.mark_item_done(item)
+        if marked:
+            self.record_state(item['key'], STATE_MARKED)
+            self.complete_queue_item(item['key'])
+        return True, marked
+
+    def is_batchable(self, item):
+        """批量模式下可以与其他视频合并处理的短视频
+
+        本地视频需要探测到时长且不超过上限；YouTube视频通常没有时长信息，未知时视为短视频。
+        运行日志中已有结果的任务、单独重试的任务，以及使用提示词矩阵时都不合并。
+        """
+        if self.batch_size < 2 or item.get('batch_fallback') or len(self.prompts) > 1:
+            return False
+        entry = self.journal.get(item['key']) if self.journal else None
+        if entry and entry.get('state') in (STATE_CAPTURED, STATE_SAVED):
+            return False
+        duration = item.get('duration')
+        if item['type'] == 'youtube':
+            return duration is None or duration <= self.batch_max_duration
+        return duration is not None and duration <= self.batch_max_duration and not self.needs_segmentation(item)
+
+    def process_batch(self, batch, positions, total_videos, queue, deferred):
+        """批量分析多个短视频，返回保存成功数；回复中缺少或不完整的视频放回队列最前面单独处理"""
+        self.progress_update.emit(f"\n--- 📦 批量处理 {len(batch)} 个短视频: {'、'.join(item['title'] for item in batch)} ---")
+        for item in batch:
+            self.item_started.emit(item['key'])
+            self.record_state(item['key'], STATE_ANALYZING)
+        self.has_next_item = bool(queue or deferred)
+
+        results = {}
+        try:
+            self.wait_for_pacing()
+            self.ensure_browser()
+            analysis_started = time.time()
+            try:
+                results = self.analyze_batch(batch)
+            finally:
+                self.last_analysis_finished = time.time()
+            self.record_pacing(success=bool(results))
+            for item in batch:
+                if item['key'] in results:
+                    elapsed = (time.time() - analysis_started) / len(batch)
+                    self.record_timing(item, elapsed)
+                    results[item['key']]['analysis_seconds'] = round(elapsed, 1)
+        except (BrowserUnavailableError, SelectorCircuitOpenError):
+            for item in batch:
+                self.item_finished.emit(item['key'], False)
+            raise
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 批量分析失败（{FAILURE_NAMES[classify_failure(e)]}: {e}），改为逐个处理")
+
+        saved_count = 0
+        fallback = []
+        for item in batch:
+            if item['key'] not in results:
+                item['batch_fallback'] = True
+                fallback.append(item)
+                self.item_finished.emit(item['key'], False)
+                continue
+            item_success = False
+            try:
+                saved, item_success = self.finish_item(item, results[item['key']], positions[item['key']], total_videos)
+                if saved:
+                    saved_count += 1
+            except Exception as e:
+                self.handle_item_failure(item, e, queue, deferred)
+            finally:
+                self.item_finished.emit(item['key'], item_success)
+        if fallback:
+            self.progress_update.emit(f"↩️ {len(fallback)} 个视频没有出现在批量结果中或结果不完整，改为单独处理")
+            queue[:0] = fallback
+        return saved_count
+
+    def analyze_batch(self, items):
+        """在一个对话中附加多个短视频，用一个提示词生成，把回复按视频拆分，返回 {任务键: 结果}"""
+        self.open_new_chat()
+        self.smart_delay()
+
+        prompt = build_batch_prompt(self.prompts[0]['prompt'], [item['title'] for item in items],
+                                    self.config.get('batch_prompt_instruction'))
+        prompt_element = self.find_element('prompt_input', "提示词输入框")
+        self.human_like_input(prompt_element, prompt, "提示词")
+
+        for number, item in enumerate(items, start=1):
+            self.progress_update.emit(f"📎 附加视频 {number}/{len(items)}: {item['title']}")
+            if item['type'] == 'youtube':
+                self.attach_youtube_url(item['url'])
+            else:
+                file_path = item['file_path']
+                self.upload_local_file(self.proxy_transcoder.get_upload_path(file_path) if self.proxy_transcoder else file_path)
+
+        self.find_element('run_button', "Run按钮", state='attached')
+        self.progress_update.emit("等待Run按钮激活...")
+        # 本地视频在每次上传时已等待处理完成，YouTube视频需要等待页面解析链接
+        run_button = self.selectors.locate(self.page, 'run_button_enabled', timeout=60000 + 15000 * len(items), track_misses=False)
+        if run_button is None:
+            raise AnalysisFailure(FAILURE_UPLOAD_STALL, "附加多个视频后等待Run按钮激活超时")
+        self.human_like_click(run_button, "Run按钮")
+        self.prewarm_next_page()
+
+        # 按文本获取整条回复（包含所有视频的表格），重试时重新发送批量提示词；此时不归档整条回复
+        self.current_prompt = {'name': "批量", 'prompt': prompt, 'format': FORMAT_TEXT}
+        self.current_item = None
+        try:
+            reply = self.collect_generation_result()
         finally:
-            self.cleanup_browser()
+            self.current_prompt = self.prompts[0]
+
+        sections = split_batch_response(reply, len(items))
+        results = {}
+        for index, item in enumerate(items):
+            rows = self.parse_tab_separated_table(sections.get(index, ""))
+            check = check_completeness(rows)
+            if not rows or not check['complete']:
+                reason = "没有找到对应的分镜表" if not rows else '；'.join(check['issues'])
+                self.progress_update.emit(f"⚠️ 视频{index + 1}「{item['title']}」{reason}")
+                continue
+            # 每个视频对应的部分单独归档，重新导出时与单独分析的结果相同
+            self.current_item = item
+            self.archive_response(sections[index])
+            results[item['key']] = {
+                'url': item.get('url') or item['file_path'],
+                'title': item['title'],
+                'content': self.format_table_content(rows),
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+        self.current_item = None
+        self.progress_update.emit(f"📦 批量结果拆分完成: {len(results)}/{len(items)} 个视频获得完整分镜表")
+        return results
+
+    def analyze_item(self, item):
+        """根据任务类型调用对应的分析流程"""
+        if item['type'] == 'youtube':
+            return self.analyze_single_youtube_video(item['url'], item['title'])
+        if self.needs_segmentation(item):
+            return self.analyze_segmented_video(item)
+        return self.analyze_single_local_video(item['file_path'])
+
+    def needs_segmentation(self, item):
+        """本地长视频在启用分段时切分为多个片段分别分析"""
+        return (self.segmenter is not None and item['type'] == 'local'
+                and self.segmenter.needs_split(item.get('duration')))
+
+    def analyze_segmented_video(self, item):
+        """分段分析长视频：逐段生成分镜，已完成的片段记录在运行日志中，最后合并为连续编号的分镜表"""
+        file_path = item['file_path']
+        chunks = self.segmenter.split(file_path, item['duration'])
+        entry = self.journal.get(item['key']) if self.journal else None
+        chunk_contents = dict((entry or {}).get('chunks') or {})
+        chunk_extras = dict((entry or {}).get('chunk_extras') or {})  # 提示词矩阵中其余提示词的片段结果
+
+        merged_rows = []
+        extra_parts = {}  # 提示词名称 -> [(片段标签, 内容)]
+        for chunk in chunks:
+            chunk_id = str(chunk['index'])
+            label = f"片段 {chunk['index'] + 1}/{len(chunks)} ({chunk['start'] / 60:.1f}-{chunk['end'] / 60:.1f}分钟)"
+            content = chunk_contents.get(chunk_id)
+            if content:
+                self.progress_update.emit(f"♻️ {label} 已有结果，跳过生成")
+            else:
+                self.progress_update.emit(f"▶️ 开始分析{label}")
+                # 片段失败时异常向上传递，整个视频重试时从该片段继续
+                self.current_chunk = chunk['index']
+                try:
+                    chunk_result = self.analyze_single_local_video(chunk['path'])
+                finally:
+                    self.current_chunk = None
+                content = chunk_result['content']
+                chunk_contents[chunk_id] = content
+                if chunk_result.get('extra_outputs'):
+                    chunk_extras[chunk_id] = chunk_result['extra_outputs']
+                # 每完成一段就写入运行日志，重试时只需重做失败的片段
+                self.record_state(item['key'], STATE_ANALYZING, chunks=chunk_contents, chunk_extras=chunk_extras)
+            for output in chunk_extras.get(chunk_id, []):
+                extra_parts.setdefault(output['name'], []).append((label, output))
+
+            rows = self.parse_tab_separated_table(content)
+            if not rows:
+                self.progress_update.emit(f"⚠️ {label} 的结果中没有解析出分镜")
+            # 片段内按顺序重新编号，保证合并后的分镜号连续
+            for keyframe_video in rows:
+                merged_rows.append((len(merged_rows) + 1, keyframe_video[1], keyframe_video[2]))
+
+        if not merged_rows:
+            return None
+        self.progress_update.emit(f"🧩 已合并 {len(chunks)} 个片段，共 {len(merged_rows)} 个分镜")
+        return {
+            'url': file_path,
+            'title': item['title'],
+            'content': self.format_table_content(merged_rows),
+            'extra_outputs': [self.merge_chunk_outputs(prompt, extra_parts[prompt['name']])
+                              for prompt in self.prompts[1:] if prompt['name'] in extra_parts],
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def merge_chunk_outputs(self, prompt, parts):
+        """合并各片段中同一个提示词的结果：分镜表连续编号，文本按片段依次拼接"""
+        if prompt['format'] == FORMAT_TABLE:
+            rows = []
+            for _, output in parts:
+                for _, keyframe, video in self.parse_tab_separated_table(output['content']):
+                    rows.append((len(rows) + 1, keyframe, video))
+            content = self.format_table_content(rows)
+        else:
+            content = "\n\n".join(f"【{label}】\n{output['content']}" for label, output in parts)
+        return {'name': prompt['name'], 'format': prompt['format'], 'content': content}
+
+    def save_item_result(self, item, result, position, total_videos):
+        """保存分析结果并记录到运行日志"""
+        if self.save_single_result(result, item['key']):
+            self.record_state(item['key'], STATE_SAVED)
+            self.progress_update.emit(f"--- ✅ [ {position+1}/{total_videos} ] 保存成功 ---")
+            return True
+        self.progress_update.emit(f"--- ❌ [ {position+1}/{total_videos} ] 保存失败 ---\n")
+        return False
+
+    def mark_item_done(self, item):
+        """标记任务完成：YouTube模式回写Excel状态，本地模式移动视频文件"""
+        if item['type'] == 'youtube':
+            if item.get('index') is None:
+                return True
+            # 关键步骤：更新Excel状态并保存
+            try:
+                shared = self.lease_keeper is not None
+                # 多个进程共用同一个Excel：持有队列锁，重新读取后只改这一行，避免覆盖其他进程写入的状态
+                with self.work_queue.locked() if shared else nullcontext():
+                    if shared:
+                        self.youtube_df = self.read_youtube_sheet(self.excel_path, self.status_col_name)
+                    self.youtube_df.loc[item['index'], self.status_col_name] = "已分析分镜提示词"
+                    self.youtube_df.to_excel(self.excel_path, index=False, engine='openpyxl')
+                self.progress_update.emit(f"✏️ 已在Excel中标记 '{item['title']}' 为完成。")
+                return True
+            except Exception as e:
+                self.progress_update.emit(f"⚠️ 更新Excel文件失败: {e}")
+                return False
+
+        # 关键步骤：移动已处理的视频文件
+        try:
+            video_name = os.path.basename(item['file_path'])
+            dest_path = os.path.join(self.completed_folder, video_name)
+            shutil.move(item['file_path'], dest_path)
+            self.progress_update.emit(f"🚚 已将 '{video_name}' 移动到 '已分析分镜提示词' 文件夹。")
+            return True
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 移动视频文件失败: {e}")
+            return False
+
+    def open_new_chat(self):
+        """打开新对话页面；已预热好下一页时直接切换标签页，省去导航和加载等待"""
+        if self.prewarm_ready and self.prewarm_page is not None:
+            try:
+                if not self.prewarm_page.is_closed():
+                    # 切换后，旧页面作为下一次预热的标签页继续使用
+                    self.page, self.prewarm_page = self.prewarm_page, self.page
+                    self.prewarm_ready = False
+                    self.page.bring_to_front()
+                    self.progress_update.emit("⚡ 已切换到预热好的新对话页面")
+                    return
+            except Exception as e:
+                self.progress_update.emit(f"⚠️ 切换预热页面失败，改为直接导航: {e}")
+            self.prewarm_ready = False
+
+        self.progress_update.emit("正在导航到Gemini AI Studio...")
+        seconds, blocked, bytes_saved = self.load_new_chat(self.page)
+        if blocked:
+            self.progress_update.emit(f"⏱️ 页面加载用时 {seconds:.1f}s，{self.request_filter.action_name} {blocked} 个无关请求"
+                                      + (f"，约节省 {format_bytes(bytes_saved)}" if bytes_saved else ""))
+        else:
+            self.progress_update.emit(f"⏱️ 页面加载用时 {seconds:.1f}s")
+
+    def load_new_chat(self, page):
+        """导航到新对话页面并等待网络空闲，返回 (加载用时秒数, 拦截的请求数, 节省的字节数)"""
+        self.request_filter.begin_load()
+        started = time.time()
+        # 请求过滤只在该页面导航到新对话期间生效，之后的上传请求和视频预览不经过过滤
+        handler = self.request_filter.handle_route if self.request_filter.enabled else None
+        if handler:
+            try:
+                page.route("**/*", handler)
+            except Exception as e:
+                self.progress_update.emit(f"⚠️ 注册请求过滤失败，页面将加载全部资源: {e}")
+                handler = None
+        try:
+            page.goto(NEW_CHAT_URL, timeout=60000)
+            page.wait_for_load_state("networkidle", timeout=60000)
+        finally:
+            if handler:
+                try:
+                    page.unroute("**/*", handler)
+                except Exception as e:
+                    self.progress_update.emit(f"⚠️ 移除请求过滤失败: {e}")
+        return self.request_filter.finish_load(started)
+
+    def prewarm_next_page(self):
+        """在当前视频生成期间，用第二个标签页加载下一个视频的新对话页面并聚焦输入框"""
+        if not self.prewarm_enabled or not self.has_next_item or self.prewarm_ready:
+            return
+        try:
+            if self.prewarm_page is None or self.prewarm_page.is_closed():
+                self.prewarm_page = self.context.new_page()
+                # 新标签页会抢占前台，切回当前页面以免影响正在进行的操作
+                self.page.bring_to_front()
+            started = time.time()
+            _, blocked, _ = self.load_new_chat(self.prewarm_page)
+            prompt_element = self.selectors.locate(self.prewarm_page, 'prompt_input', timeout=10000, track_misses=False)
+            if prompt_element is None:
+                raise RuntimeError("预热页面上找不到提示词输入框")
+            prompt_element.focus()
+            self.prewarm_ready = True
+            self.progress_update.emit(f"⚡ 已预热下一个视频的页面 ({time.time() - started:.1f}s，{self.request_filter.action_name} {blocked} 个无关请求)")
+        except Exception as e:
+            self.prewarm_ready = False
+            self.progress_update.emit(f"⚠️ 预热下一页失败，下一个视频将直接导航: {e}")
 
     def analyze_single_local_video(self, file_path):
-        """在单个页面上分析本地视频"""
+        """在单个页面上分析本地视频，失败时抛出带失败类型的异常"""
+        # 启用代理转码时上传低分辨率代理文件，否则上传原文件（在打开页面之前等待转码完成）
+        upload_path = self.proxy_transcoder.get_upload_path(file_path) if self.proxy_transcoder else file_path
+
+        self.open_new_chat()
+
+        video_title = os.path.basename(file_path)
+        self.progress_update.emit(f"正在分析: {video_title}")
+        
+        self.smart_delay()
+
+        prompt_element = self.find_element('prompt_input', "提示词输入框")
+        self.human_like_input(prompt_element, self.prompts[0]['prompt'], "提示词")
+        
+        # 上传并等待Run按钮变为可点击状态（文件上传并处理完成后才会激活）
+        self.upload_local_file(upload_path)
+        run_button = self.selectors.locate(self.page, 'run_button_enabled', timeout=5000, track_misses=False)
+        if run_button is None:
+            raise AnalysisFailure(FAILURE_UPLOAD_STALL, "上传完成后Run按钮未激活")
+
+        # 6. 点击run按钮
+        self.human_like_click(run_button, "Run按钮")
+        
+        # 生成进行中，利用等待时间预热下一个视频的页面
+        self.prewarm_next_page()
+        
+        result_content, extra_outputs = self.collect_prompt_results()
+        return {
+            'url': file_path,
+            'title': video_title,
+            'content': result_content,
+            'extra_outputs': extra_outputs,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+    def upload_local_file(self, upload_path):
+        """通过添加菜单上传一个本地文件，等待上传和处理完成（Run按钮激活），返回上传遥测"""
+        self.progress_update.emit("准备上传文件...")
+        self.require_click('add_chunk_button', "选择按钮")
+        self.smart_delay()
+        
+        with self.page.expect_file_chooser() as fc_info:
+            self.require_click('upload_button', "Upload按钮")
+
+        # 在页面中注入上传遥测（拦截上传请求统计已发送字节数），每个文件重新计数
         try:
-            self.progress_update.emit("正在导航到Gemini AI Studio...")
-            self.page.goto("https://aistudio.google.com/prompts/new_chat", timeout=60000)
-            self.page.wait_for_load_state("networkidle", timeout=60000)
+            self.page.evaluate(INSTALL_TELEMETRY_SCRIPT)
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 注入上传遥测失败，只按超时判断: {e}")
+        
+        file_chooser = fc_info.value
+        file_chooser.set_files(upload_path)
+        self.progress_update.emit(f"正在上传文件（{format_size(os.path.getsize(upload_path))}），请稍候...")
 
-            video_title = os.path.basename(file_path)
-            self.progress_update.emit(f"正在分析: {video_title}")
-            
-            self.smart_delay()
+        # 先确认Run按钮存在：按钮本身找不到说明页面改版，不必等满上传超时
+        self.find_element('run_button', "Run按钮", state='attached')
+        return self.wait_for_upload(upload_path)
 
-            prompt_element = self.page.locator("//ms-chunk-input//textarea").first
-            self.human_like_input(prompt_element, self.config['prompt'], "提示词")
-            
-            self.progress_update.emit("准备上传文件...")
-            select_button = self.page.locator("//ms-add-chunk-menu//button/span[@class='mat-mdc-button-persistent-ripple mdc-icon-button__ripple']")
-            self.human_like_click(select_button, "选择按钮")
-            self.smart_delay()
-            
-            with self.page.expect_file_chooser() as fc_info:
-                upload_button = self.page.locator("button:has-text('Upload')")
-                self.human_like_click(upload_button, "Upload按钮")
-            
-            file_chooser = fc_info.value
-            file_chooser.set_files(file_path)
-            self.progress_update.emit("正在上传文件，请稍候...")
+    def read_upload_progress(self):
+        """读取页面中的上传遥测和进度条，返回 (已发送字节数, 开始的上传请求数, 完成的上传请求数, 进度条百分比)"""
+        bytes_sent = requests_started = requests_finished = progress = None
+        try:
+            telemetry = self.page.evaluate(READ_TELEMETRY_SCRIPT)
+            if telemetry:
+                bytes_sent = telemetry.get('loaded')
+                requests_started, requests_finished = telemetry.get('requests'), telemetry.get('finished')
+        except Exception:
+            pass
+        try:
+            value = self.selectors.resolve(self.page, 'upload_progress').get_attribute('aria-valuenow', timeout=500)
+            if value is not None:
+                progress = float(value)
+        except Exception:
+            pass
+        return bytes_sent, requests_started, requests_finished, progress
+
+    def wait_for_upload(self, upload_path):
+        """等待上传和处理完成（Run按钮激活），期间采集进度
 
-            # 4. 等待文件块出现在UI中，确认文件已添加
-            self.progress_update.emit("确认文件添加中...")
+        进度停止超过 upload_stall_seconds 秒立即判定为上传停滞并抛出异常（按失败类型重试），
+        不必等满固定超时；上传和处理的超时都按文件大小计算。
+        """
+        monitor = UploadMonitor.from_config(self.config, os.path.getsize(upload_path))
+        self.progress_update.emit(f"等待上传完成（上传超时 {monitor.upload_timeout:.0f} 秒，处理超时 {monitor.processing_timeout:.0f} 秒）...")
+        chunk_seen = False
+        uploaded_reported = False
+        last_report = time.time()
+        run_button_enabled = self.selectors.resolve(self.page, 'run_button_enabled')
+        video_chunk = self.selectors.resolve(self.page, 'video_chunk')
+        while True:
+            now = time.time()
+            monitor.update(*self.read_upload_progress(), now=now)
             try:
-                self.page.locator("//ms-video-chunk").first.wait_for(state="visible", timeout=30000)
-                self.progress_update.emit("✅ 文件已在输入区显示。")
+                if not chunk_seen and video_chunk.is_visible():
+                    chunk_seen = True
+                    self.progress_update.emit("✅ 文件已在输入区显示。")
+                if run_button_enabled.is_visible():
+                    monitor.mark_finished(now)
+                    break
             except Exception:
-                self.progress_update.emit("⚠️ 未检测到文件在输入区显示，但继续尝试...")
+                pass
+
+            failure = monitor.check(now)
+            if failure:
+                self.upload_stats['stalls'] += 1
+                raise AnalysisFailure(FAILURE_UPLOAD_STALL, failure)
+            if monitor.uploaded_at and not uploaded_reported:
+                uploaded_reported = True
+                self.progress_update.emit(f"📤 文件已上传（{monitor.throughput() / 1024 / 1024:.1f} MB/s），等待处理完成...")
+            elif now - last_report >= 15:
+                last_report = now
+                fraction = monitor.fraction()
+                progress_text = f"{fraction:.0%}" if fraction is not None else "进度未知"
+                self.progress_update.emit(f"⏳ 上传中: {progress_text}，已用 {now - monitor.started:.0f} 秒")
+            time.sleep(1)
+
+        summary = monitor.summary()
+        self.upload_stats['files'] += 1
+        self.upload_stats['bytes'] += summary['file_size']
+        self.upload_stats['seconds'] += summary['upload_seconds']
+        self.upload_stats['last'] = summary
+        self.progress_update.emit(
+            f"✅ Run按钮已激活（上传 {format_size(summary['file_size'])} 用时 {summary['upload_seconds']:.0f} 秒，"
+            f"平均 {summary['throughput_bytes_per_second'] / 1024 / 1024:.1f} MB/s）"
+        )
+        return monitor
+
+    def attach_youtube_url(self, youtube_url):
+        """通过添加菜单的YouTube对话框附加一个视频链接"""
+        self.require_click('add_chunk_button', "选择按钮")
+        self.smart_delay()
+        
+        self.require_click('youtube_button', "YouTube按钮")
+        self.smart_delay()
+        
+        url_input = self.find_element('youtube_url_input', "YouTube URL输入框")
+        self.human_like_input(url_input, youtube_url, "YouTube URL")
+        
+        self.require_click('save_button', "Save按钮")
+        time.sleep(self.delay_config['max_delay'])
 
-            # 5. 等待Run按钮变为可点击状态
-            self.progress_update.emit("等待Run按钮激活...")
-            run_button_selector = "//button[contains(@class, 'run-button') and @aria-disabled='false' and not(@disabled)]"
-            run_button = self.page.locator(run_button_selector).first
+    def find_element(self, name, description, timeout=10000, state='visible'):
+        """通过选择器注册表查找流程中必需的元素，找不到时按"页面元素缺失"处理"""
+        element = self.selectors.locate(self.page, name, timeout=timeout, state=state)
+        if element is None:
+            raise AnalysisFailure(FAILURE_UI_MISSING, f"找不到{description}")
+        return element
+
+    def require_click(self, name, description, timeout=15000):
+        """点击流程中必需的元素，元素不存在或点击失败时按"页面元素缺失"处理"""
+        element = self.find_element(name, description, timeout=timeout)
+        if not self.human_like_click(element, description):
+            raise AnalysisFailure(FAILURE_UI_MISSING, f"无法点击{description}")
+
+    def collect_prompt_results(self):
+        """获取第一个提示词的结果；启用提示词矩阵时在同一对话中依次发送其余提示词，视频只上传一次
+
+        返回 (分镜表内容, 其余提示词的结果列表)；其余提示词失败时只记录警告，不影响分镜表。
+        """
+        self.current_prompt = self.prompts[0]
+        content = self.collect_generation_result()
+        extra_outputs = []
+        for prompt in self.prompts[1:]:
+            self.current_prompt = prompt
+            self.progress_update.emit(f"💬 在同一对话中发送提示词「{prompt['name']}」...")
+            self.smart_delay()
+            self.send_followup(prompt['prompt'], f"Run按钮({prompt['name']})")
             try:
-                run_button.wait_for(state="visible", timeout=120000)
-                self.progress_update.emit("✅ Run按钮已激活。")
-            except Exception:
-                self.progress_update.emit("⚠️ 等待Run按钮激活超时，但仍会尝试继续...")
+                output = self.collect_generation_result()
+            except AnalysisFailure as e:
+                self.progress_update.emit(f"⚠️ 提示词「{prompt['name']}」没有获取到结果: {e}")
+                continue
+            extra_outputs.append({'name': prompt['name'], 'format': prompt['format'], 'content': output})
+        self.current_prompt = self.prompts[0]
+        return content, extra_outputs
 
-            # 6. 点击run按钮
-            self.human_like_click(run_button, "Run按钮")
-            
-            self.wait_for_analysis_completion()
-            
-            max_retries = 3
-            retry_count = 0
-            while retry_count < max_retries and self.check_generation_error():
-                self.progress_update.emit(f"检测到生成错误，重试 ({retry_count + 1}/{max_retries})...")
-                self.retry_generation()
-                self.wait_for_analysis_completion()
-                retry_count += 1
-            
+    def collect_generation_result(self):
+        """等待生成完成并获取结果；生成出错或结果为空时按重试策略在当前对话中重新生成"""
+        self.archive_attempt = uuid.uuid4().hex[:12]
+        is_table = self.current_prompt['format'] == FORMAT_TABLE
+        self.wait_for_analysis_completion()
+
+        max_retries = self.retry_tracker.chat_retries(FAILURE_GENERATION)
+        retry_count = 0
+        while self.check_generation_error():
+            # 生成错误往往成批出现，每次都反馈给节奏控制
+            self.record_pacing(success=False)
             if retry_count >= max_retries:
-                self.progress_update.emit("达到最大重试次数，跳过。")
-                return None
+                raise AnalysisFailure(FAILURE_GENERATION, f"重新生成 {retry_count} 次后仍然出错")
+            self.progress_update.emit(f"检测到生成错误，重试 ({retry_count + 1}/{max_retries})...")
+            time.sleep(random.uniform(2, 4))
+            self.retry_generation()
+            self.wait_for_analysis_completion()
+            retry_count += 1
 
+        max_empty_retries = self.retry_tracker.chat_retries(FAILURE_EMPTY_RESULT)
+        empty_count = 0
+        while True:
             time.sleep(2)
-            result_content = self.get_analysis_result()
-            
+            result_content = self.get_analysis_result() if is_table else self.get_last_reply_text()
+            self.archive_response(result_content)
             if result_content:
-                return {
-                    'url': file_path,
-                    'title': video_title,
-                    'content': result_content,
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
-            return None
-        except Exception as e:
-            self.progress_update.emit(f"分析本地视频时出错: {str(e)}")
-            return None
+                return self.continue_truncated_result(result_content) if is_table else result_content
+            self.record_pacing(success=False)
+            if empty_count >= max_empty_retries:
+                raise AnalysisFailure(FAILURE_EMPTY_RESULT, "生成完成但没有获取到有效的分镜结果")
+            self.progress_update.emit(f"结果为空或无法解析，要求模型重新输出 ({empty_count + 1}/{max_empty_retries})...")
+            self.retry_generation()
+            self.wait_for_analysis_completion()
+            empty_count += 1
 
     def start_browser(self):
         """通过比特浏览器API打开窗口并连接，只保留一个页面"""
@@ -277,37 +1576,21 @@ class VideoAnalysisEngine(QThread):
         if not bit_window_id:
             raise ValueError("未提供比特浏览器窗口ID")
 
-        # 比特浏览器本地API地址
-        bit_api_url = "http://127.0.0.1:54345"
-        headers = {'Content-Type': 'application/json'}
+        # 比特浏览器本地API客户端（复用连接池，带超时和重试）
+        if self.bit_client is None:
+            self.bit_client = BitBrowserClient.from_config(self.config, log=self.progress_update.emit)
 
-        # 1. 调用API打开浏览器窗口
+        # 1. 先做健康检查，再调用API打开浏览器窗口
         try:
+            self.bit_client.health_check()
             self.progress_update.emit(f"正在打开窗口ID: {bit_window_id}")
-            open_url = f"{bit_api_url}/browser/open"
-            open_data = {'id': bit_window_id}
-            res = requests.post(open_url, data=json.dumps(open_data), headers=headers)
-            res.raise_for_status() # 如果请求失败则抛出异常
-            res_json = res.json()
-            
-            # 检查API调用是否成功
-            if not res_json.get('success'):
-                error_message = f"API打开窗口失败: {res_json.get('msg', '无详细错误信息')}. "
-                error_message += f"完整API响应: {json.dumps(res_json, ensure_ascii=False)}"
-                raise Exception(error_message)
-
-            # 2. 从返回结果中获取CDP地址，键名是 'ws'
-            cdp_address = res_json.get('data', {}).get('ws')
-            if not cdp_address:
-                raise Exception(f"API返回结果中未找到CDP地址 (ws). 完整响应: {json.dumps(res_json, ensure_ascii=False)}")
-            
+            # 2. 从返回结果中获取CDP地址
+            cdp_address = self.bit_client.open_browser(bit_window_id)['ws']
             self.progress_update.emit(f"成功获取CDP地址")
 
-        except requests.exceptions.RequestException as e:
-            self.error_occurred.emit(f"无法连接到比特浏览器API，请确认比特浏览器已启动并且API服务在运行中。错误: {e}")
-            raise
         except Exception as e:
-            self.error_occurred.emit(f"打开比特浏览器窗口时出错: {e}")
+            # 由 connect_browser 决定是否重试，全部失败后才作为错误上报
+            self.progress_update.emit(f"❌ 打开比特浏览器窗口时出错: {e}")
             raise
 
         # 3. 使用Playwright连接到获取的CDP地址
@@ -326,6 +1609,8 @@ class VideoAnalysisEngine(QThread):
                         p.close()
             else:
                 self.page = self.context.new_page() # 如果没有页面则创建一个
+            self.page_recycler.page_replaced()
+            self.watchdog.attach(self.browser, self.context)
 
             # 添加反机器人检测设置
             self.progress_update.emit("正在设置反机器人检测...")
@@ -491,133 +1776,149 @@ class VideoAnalysisEngine(QThread):
             self.progress_update.emit("✅ 成功连接到比特浏览器，并已清理无关页面")
 
         except Exception as e:
-            self.error_occurred.emit(f"Playwright连接浏览器失败: {e}")
+            self.progress_update.emit(f"❌ Playwright连接浏览器失败: {e}")
             raise
             
     def analyze_single_youtube_video(self, youtube_url, video_title=""):
-        """在单个页面上分析YouTube视频，复用此页面"""
+        """在单个页面上分析YouTube视频，复用此页面；失败时抛出带失败类型的异常"""
+        # 1. 导航到目标网址
+        self.open_new_chat()
+        self.progress_update.emit("✅ 页面加载完成。")
+
+        display_title = video_title if video_title else youtube_url
+        self.progress_update.emit(f"正在分析: {display_title}")
+        
+        self.smart_delay()
+        
+        # 模拟用户行为 - 随机移动鼠标和轻微滚动
         try:
-            # 1. 导航到目标网址
-            self.progress_update.emit("正在导航到Gemini AI Studio...")
-            self.page.goto("https://aistudio.google.com/prompts/new_chat", timeout=60000)
-            self.page.wait_for_load_state("networkidle", timeout=60000)
-            self.progress_update.emit("✅ 页面加载完成。")
+            viewport_size = self.page.viewport_size
+            if viewport_size:
+                center_x = viewport_size['width'] // 2 + random.randint(-100, 100)
+                center_y = viewport_size['height'] // 2 + random.randint(-100, 100)
+                self.page.mouse.move(center_x, center_y)
+                time.sleep(0.5)
+                self.page.mouse.wheel(0, random.randint(-200, 200))
+                time.sleep(0.3)
+        except Exception:
+            pass # 用户行为模拟失败不影响主流程
 
-            display_title = video_title if video_title else youtube_url
-            self.progress_update.emit(f"正在分析: {display_title}")
-            
-            self.smart_delay()
-            
-            # 模拟用户行为 - 随机移动鼠标和轻微滚动
-            try:
-                viewport_size = self.page.viewport_size
-                if viewport_size:
-                    center_x = viewport_size['width'] // 2 + random.randint(-100, 100)
-                    center_y = viewport_size['height'] // 2 + random.randint(-100, 100)
-                    self.page.mouse.move(center_x, center_y)
-                    time.sleep(0.5)
-                    self.page.mouse.wheel(0, random.randint(-200, 200))
-                    time.sleep(0.3)
-            except Exception:
-                pass # 用户行为模拟失败不影响主流程
+        # 1. 在输入框中输入提示词
+        try:
+            prompt_element = self.find_element('prompt_input', "提示词输入框")
+            self.human_like_input(prompt_element, self.prompts[0]['prompt'], "提示词")
+        except Exception as e:
+            self.progress_update.emit(f"输入提示词失败: {str(e)}")
+            raise e
+        
+        # 2. 通过添加菜单的YouTube对话框附加视频链接
+        self.attach_youtube_url(youtube_url)
+        
+        # 3. 等待Run按钮变为可点击状态
+        self.find_element('run_button', "Run按钮", state='attached')
+        self.progress_update.emit("等待Run按钮激活...")
+        run_button = self.selectors.locate(self.page, 'run_button_enabled', timeout=60000, track_misses=False)
+        if run_button is not None:
+            self.progress_update.emit("✅ Run按钮已激活。")
+        else:
+            self.progress_update.emit("⚠️ 等待Run按钮激活超时，但仍会尝试继续...")
+            run_button = self.selectors.resolve(self.page, 'run_button')
 
-            # 1. 在输入框中输入提示词
-            try:
-                prompt_element = self.page.locator("//ms-chunk-input//textarea").first
-                prompt_element.wait_for(timeout=10000)
-                self.human_like_input(prompt_element, self.config['prompt'], "提示词")
-            except Exception as e:
-                self.progress_update.emit(f"输入提示词失败: {str(e)}")
-                raise e
-            
-            # 2. 点击选择按钮
-            select_button = self.page.locator("//ms-add-chunk-menu//button/span[@class='mat-mdc-button-persistent-ripple mdc-icon-button__ripple']")
-            self.human_like_click(select_button, "选择按钮")
-            self.smart_delay()
-            
-            # 3. 点击YouTube按钮
-            youtube_button = self.page.locator("//button[.//span[text()='YouTube Video']]")
-            self.human_like_click(youtube_button, "YouTube按钮")
-            self.smart_delay()
-            
-            # 4. 在弹出的输入框中填写网址
-            url_input = self.page.locator("//input[@aria-label='YouTube URL']")
-            self.human_like_input(url_input, youtube_url, "YouTube URL")
-            
-            # 5. 点击save按钮
-            save_button = self.page.locator("//button[.//span[text()='Save']]")
-            self.human_like_click(save_button, "Save按钮")
-            time.sleep(self.delay_config['max_delay'])
-            
-            # 6. 等待Run按钮变为可点击状态
-            self.progress_update.emit("等待Run按钮激活...")
-            run_button_selector = "//button[contains(@class, 'run-button') and @aria-disabled='false' and not(@disabled)]"
-            run_button = self.page.locator(run_button_selector).first
-            try:
-                run_button.wait_for(state="visible", timeout=60000)
-                self.progress_update.emit("✅ Run按钮已激活。")
-            except Exception as e:
-                self.progress_update.emit(f"⚠️ 等待Run按钮激活超时: {e}，但仍会尝试继续...")
+        # 4. 点击run按钮
+        self.human_like_click(run_button, "Run按钮")
+        
+        self.smart_delay()
+        
+        # 生成进行中，利用等待时间预热下一个视频的页面
+        self.prewarm_next_page()
+        
+        # 5. 等待AI分析完成，检查是否生成成功并获取结果
+        result_content, extra_outputs = self.collect_prompt_results()
+        return {
+            'url': youtube_url,
+            'title': video_title,
+            'content': result_content,
+            'extra_outputs': extra_outputs,
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+    
+    def continue_truncated_result(self, content):
+        """检查分镜表是否被截断；截断时在同一对话中要求模型从断点继续输出，并把续写的行合并进来"""
+        rows = self.parse_tab_separated_table(content)
+        check = check_completeness(rows)
+        if check['complete']:
+            return content
 
-            # 7. 点击run按钮
-            self.human_like_click(run_button, "Run按钮")
-            
-            self.smart_delay()
-            
-            # 8. 等待AI分析完成
+        max_rounds = self.config.get('continuation_max_rounds', 3)
+        prompt_template = self.config.get('continuation_prompt') or DEFAULT_CONTINUATION_PROMPT
+        rounds = 0
+        while not check['complete'] and rounds < max_rounds:
+            rounds += 1
+            resume_from = check['resume_from']
+            self.progress_update.emit(
+                f"✂️ 分镜表不完整（{'；'.join(check['issues'])}），要求模型从分镜{resume_from}继续输出 ({rounds}/{max_rounds})..."
+            )
+            self.send_followup(prompt_template.format(shot=resume_from), "Run按钮(续写)")
             self.wait_for_analysis_completion()
-            
-            # 9. 检查是否生成成功，如果失败则重试
-            max_retries = 3
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                if self.check_generation_error():
-                    self.progress_update.emit(f"检测到生成错误，重试 ({retry_count + 1}/{max_retries})...")
-                    time.sleep(random.uniform(2, 4))
-                    self.retry_generation()
-                    self.wait_for_analysis_completion()
-                    retry_count += 1
-                else:
-                    break
-            
-            if retry_count >= max_retries:
-                self.progress_update.emit("达到最大重试次数，跳过。")
-                return None
-            
-            # 10. 获取分析结果
+            if self.check_generation_error():
+                self.progress_update.emit("⚠️ 续写时出现生成错误，使用已获取的部分结果")
+                break
             time.sleep(2)
-            result_content = self.get_analysis_result()
-            
-            if result_content:
-                return {
-                    'url': youtube_url,
-                    'title': video_title,
-                    'content': result_content,
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
-            
-            return None
-            
+            continuation = self.get_analysis_result()
+            self.archive_response(continuation, ROLE_CONTINUATION, resume_from=resume_from,
+                                  drop_last=check['last_row_truncated'])
+            continuation_rows = self.parse_tab_separated_table(continuation) if continuation else []
+            if not continuation_rows:
+                self.progress_update.emit("⚠️ 续写结果中没有解析出分镜，使用已获取的部分结果")
+                break
+            rows = merge_continuation(rows, continuation_rows, resume_from, drop_last=check['last_row_truncated'])
+            self.progress_update.emit(f"🧩 已合并续写的 {len(continuation_rows)} 个分镜，共 {len(rows)} 个分镜")
+            check = check_completeness(rows)
+
+        if not check['complete']:
+            self.progress_update.emit(f"⚠️ 续写后分镜表仍不完整（{'；'.join(check['issues'])}），保存现有结果")
+        return self.format_table_content(rows)
+
+    def archive_response(self, content, role=ROLE_ANSWER, **extra):
+        """在解析之前归档模型的原始回复；归档失败只记录警告，不影响分析"""
+        if not content or not self.current_item or not self.config.get('archive_responses', True):
+            return
+        try:
+            if self.response_archive is None:
+                archive_dir = self.config.get('response_archive_dir') or os.path.join(self.config['output_path'], ".response_archive")
+                self.response_archive = ResponseArchive(archive_dir)
+            if self.current_chunk is not None:
+                extra['chunk'] = self.current_chunk
+            if self.current_prompt is not self.prompts[0]:
+                extra.update(variant=self.current_prompt['name'], format=self.current_prompt['format'])
+            self.response_archive.add(self.current_item['key'], self.current_item['title'], self.current_prompt['prompt'],
+                                      content, role, attempt=self.archive_attempt, **extra)
         except Exception as e:
-            self.progress_update.emit(f"分析视频时出错: {str(e)}")
-            return None
-    
+            self.progress_update.emit(f"⚠️ 归档模型回复失败: {e}")
+
     def wait_for_analysis_completion(self):
         """等待AI分析完成"""
         max_wait_time = 300  # 最多等待5分钟
         start_time = time.time()
         
         while time.time() - start_time < max_wait_time:
+            # 生成期间定期探测页面，渲染进程卡死时不必等满超时
+            if self.watchdog.probe_due():
+                reason = self.watchdog.check(self.browser, self.page)
+                if reason:
+                    raise AnalysisFailure(FAILURE_BROWSER, reason)
             try:
                 # 检测stop按钮是否消失
-                stop_button = self.page.locator("//run-button/button/div[.//text()[contains(., 'Stop')]]")
+                stop_button = self.selectors.resolve(self.page, 'stop_button')
                 if not stop_button.is_visible():
                     self.progress_update.emit("AI分析完成")
                     return True
                 time.sleep(2)
             except:
-                # 如果找不到stop按钮，可能已经完成
+                # 如果找不到stop按钮，可能已经完成；页面崩溃或连接断开时不能当作完成
+                reason = self.watchdog.check(self.browser, self.page, probe=False)
+                if reason:
+                    raise AnalysisFailure(FAILURE_BROWSER, reason)
                 return True
         
         self.progress_update.emit("等待超时")
@@ -626,27 +1927,33 @@ class VideoAnalysisEngine(QThread):
     def check_generation_error(self):
         """检查是否生成失败"""
         try:
-            error_element = self.page.locator("(//ms-chat-turn)[last()]//ms-prompt-feedback/button/span[1]")
+            error_element = self.selectors.resolve(self.page, 'generation_error')
             return error_element.is_visible()
         except:
             return False
     
     def retry_generation(self):
-        """重新生成"""
+        """重新生成：分镜表要求完整输出，其他提示词重新发送一次"""
+        if self.current_prompt['format'] == FORMAT_TABLE:
+            self.send_followup("按照要求输出完整分镜提示词", "Run按钮(重试)")
+        else:
+            self.send_followup(self.current_prompt['prompt'], "Run按钮(重试)")
+
+    def send_followup(self, text, description):
+        """在当前对话中发送一条追问"""
         try:
-            # 在输入框输入重试提示词
-            prompt_textarea = self.page.locator("//ms-chunk-input//textarea")
-            prompt_textarea.fill("按照要求输出完整分镜提示词")
+            # 在输入框输入追问内容
+            prompt_textarea = self.selectors.resolve(self.page, 'prompt_input')
+            prompt_textarea.fill(text)
             time.sleep(random.uniform(1, 2)) # 增加延时
             
-            # 点击run按钮 - 使用新的选择器
-            run_button_selector = "//button[contains(@class, 'run-button') and @aria-disabled='false' and not(@disabled)]"
-            run_button = self.page.locator(run_button_selector).first
-            self.human_like_click(run_button, "Run按钮(重试)")
+            # 点击run按钮
+            run_button = self.selectors.resolve(self.page, 'run_button_enabled')
+            self.human_like_click(run_button, description)
             time.sleep(random.uniform(1, 2)) # 增加延时
             
         except Exception as e:
-            self.progress_update.emit(f"重试时出错: {str(e)}")
+            self.progress_update.emit(f"发送追问时出错: {str(e)}")
     
     def get_analysis_result(self):
         """获取分析结果，专门提取表格内容"""
@@ -736,12 +2043,7 @@ class VideoAnalysisEngine(QThread):
                         self.progress_update.emit(f"✅ 成功通过HTML表格解析获取 {len(table_data)} 行数据")
                         
                         # 构建表格文本内容用于备份
-                        headers = ["分镜", "关键帧图片生成提示词", "图生视频提示词"]
-                        table_content = "\t".join(headers) + "\n"
-                        
-                        for row in table_data:
-                            shot_num, keyframe, video = row
-                            table_content += f"分镜{shot_num}\t{keyframe}\t{video}\n"
+                        table_content = self.format_table_content(table_data)
                         
                         self.progress_update.emit(f"✅ 成功通过HTML表格解析获取 {len(table_data)} 行数据")
                         return table_content
@@ -831,8 +2133,25 @@ class VideoAnalysisEngine(QThread):
             self.progress_update.emit(f"获取结果时出错: {str(e)}")
             return None
     
-    def save_single_result(self, result):
-        """保存单个分析结果"""
+    def get_last_reply_text(self):
+        """获取最后一条模型回复的文本（非分镜表的提示词使用），去掉界面按钮文字"""
+        try:
+            time.sleep(2)
+            reply = self.page.locator("div.chat-turn-container.model.render").last
+            if not reply.is_visible():
+                self.progress_update.emit("⚠️ 未找到模型回复")
+                return None
+            lines = [line.rstrip() for line in reply.inner_text().split('\n')
+                     if line.strip().lower() not in ('edit', 'more_vert', 'thumb_up', 'thumb_down')]
+            text = '\n'.join(lines).strip()
+            self.progress_update.emit(f"获取到回复内容长度: {len(text)} 字符")
+            return text or None
+        except Exception as e:
+            self.progress_update.emit(f"获取回复时出错: {str(e)}")
+            return None
+
+    def save_single_result(self, result, key=None):
+        """保存单个分析结果，并记录到输出清单"""
         if not result:
             return False
         
@@ -845,13 +2164,28 @@ class VideoAnalysisEngine(QThread):
             if not content:
                 return False
                 
+            key = key or result.get('url') or file_name
+            # 由输出清单分配文件夹名，不同视频清理后同名时不会互相覆盖
+            output_name = self.resolve_output_name(key, file_name)
             processed_result = self.process_text(
                 output_path, 
                 content, 
-                file_name
+                output_name
             )
-            
-            return processed_result and processed_result.get('success')
+            if not (processed_result and processed_result.get('success')):
+                return False
+            self.record_output(key, file_name, output_name, processed_result,
+                               result.get('prompt_hash') or prompt_hash(self.prompts[0]['prompt']),
+                               result.get('analysis_seconds'))
+
+            # 提示词矩阵中其余提示词的结果保存在同一个文件夹中
+            prompts = {prompt['name']: prompt['prompt'] for prompt in self.prompts}
+            for output in result.get('extra_outputs') or []:
+                saved = self.save_extra_output(output_path, output_name, output)
+                if saved and saved.get('success'):
+                    self.record_output(key, file_name, output_name, saved, prompt_hash(prompts.get(output['name'], '')),
+                                       variant=output['name'])
+            return True
                 
         except Exception as e:
             self.progress_update.emit(f"❌ 保存结果时发生严重错误: {str(e)}")
@@ -861,19 +2195,21 @@ class VideoAnalysisEngine(QThread):
         """关闭比特浏览器窗口并清理资源"""
         try:
             # 1. 清理Playwright资源
-            if hasattr(self, 'playwright') and self.playwright:
-                self.playwright.stop()
+            self.page = None
+            self.prewarm_page = None
+            self.prewarm_ready = False
+            self.request_filter_installed = False
+            self.browser = None
+            if self.playwright:
+                playwright, self.playwright = self.playwright, None
+                playwright.stop()
             self.progress_update.emit("Playwright会话已断开")
 
             # # 2. 通过API关闭浏览器窗口 (根据用户要求，暂时注释掉)
             # bit_window_id = self.config.get('bit_window_id')
-            # if bit_window_id:
+            # if bit_window_id and self.bit_client:
             #     try:
-            #         bit_api_url = "http://127.0.0.1:54345"
-            #         headers = {'Content-Type': 'application/json'}
-            #         close_url = f"{bit_api_url}/browser/close"
-            #         close_data = {'id': bit_window_id}
-            #         requests.post(close_url, data=json.dumps(close_data), headers=headers)
+            #         self.bit_client.close_browser(bit_window_id)
             #         self.progress_update.emit(f"已通过API关闭窗口ID: {bit_window_id}")
             #     except Exception as e:
             #         self.progress_update.emit(f"通过API关闭窗口时出错: {e}")
@@ -1089,8 +2425,16 @@ class VideoAnalysisEngine(QThread):
             self.progress_update.emit(f"❌ 表格解析错误: {e}")
             return []
 
-    def process_text(self, folder_path, text_content, file_name=None):
-        """处理文本并保存到Excel"""
+    def format_table_content(self, table_data):
+        """把 (分镜号, 关键帧提示词, 图生视频提示词) 行列表转换为制表符分隔的表格文本"""
+        headers = ["分镜", "关键帧图片生成提示词", "图生视频提示词"]
+        table_content = "\t".join(headers) + "\n"
+        for shot_num, keyframe, video in table_data:
+            table_content += f"分镜{shot_num}\t{keyframe}\t{video}\n"
+        return table_content
+
+    def process_text(self, folder_path, text_content, file_name=None, variant=None):
+        """处理文本并保存到Excel；variant 为提示词矩阵中其他分镜表提示词的名称，作为文件名后缀"""
         try:
             os.makedirs(folder_path, exist_ok=True)
 
@@ -1115,10 +2459,11 @@ class VideoAnalysisEngine(QThread):
             else:
                 sanitized_base_name = f"分析结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
             
-            subfolder_path = os.path.join(folder_path, sanitized_base_name)
+            subfolder_path = self.output_folder(folder_path, sanitized_base_name)
             os.makedirs(subfolder_path, exist_ok=True)
 
-            excel_file_path = os.path.join(subfolder_path, f"{sanitized_base_name}.xlsx")
+            excel_name = f"{sanitized_base_name}_{self.sanitize_filename(variant)}" if variant else sanitized_base_name
+            excel_file_path = os.path.join(subfolder_path, f"{excel_name}.xlsx")
             
             try:
                 with pd.ExcelWriter(excel_file_path, engine='openpyxl') as writer:
@@ -1138,7 +2483,7 @@ class VideoAnalysisEngine(QThread):
 
                 if os.path.exists(excel_file_path):
                     self.progress_update.emit(f"文件已保存到: {subfolder_path}")
-                    return {"success": True, "output_file": excel_file_path}
+                    return {"success": True, "output_file": excel_file_path, "rows": table_data}
                 else:
                     return {"success": False, "message": "Excel file not found after save."}
 
@@ -1150,6 +2495,91 @@ class VideoAnalysisEngine(QThread):
             self.progress_update.emit(f"❌ 处理和保存文本时发生严重错误: {e}")
             return {"success": False, "message": f"Processing failed: {str(e)}"}
 
+    def get_output_manifest(self):
+        """打开输出目录下的输出清单；未启用或打开失败时返回None"""
+        if self.output_manifest is None and self.config.get('output_manifest', True):
+            try:
+                self.output_manifest = OutputManifest.for_output(self.config['output_path'])
+            except Exception as e:
+                self.progress_update.emit(f"⚠️ 打开输出清单失败，不记录清单: {e}")
+                self.config['output_manifest'] = False
+        return self.output_manifest
+
+    def resolve_output_name(self, key, title):
+        """视频的输出文件夹名：清理标题后由输出清单去重，清单不可用时直接使用清理后的标题"""
+        sanitized_name = self.sanitize_filename(title)
+        manifest = self.get_output_manifest()
+        if manifest is None:
+            return sanitized_name
+        try:
+            output_path = self.config['output_path']
+            name = manifest.reserve_name(key, sanitized_name,
+                                         exists=lambda candidate: os.path.exists(self.output_folder(output_path, candidate)))
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 输出清单分配文件夹名失败: {e}")
+            return sanitized_name
+        if name != sanitized_name:
+            self.progress_update.emit(f"📛 '{sanitized_name}' 已被其他视频使用，本视频保存为 '{name}'")
+        return name
+
+    def get_output_layout(self):
+        """输出目录使用的布局：以输出目录中记录的布局为准，没有记录时按配置保存并记录下来"""
+        if self.output_layout_resolved:
+            return self.output_layout
+        self.output_layout_resolved = True
+        output_path = self.config['output_path']
+        try:
+            saved = OutputLayout.load(output_path)
+            if saved is None:
+                self.output_layout.save(output_path)
+                return self.output_layout
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 读取或记录输出目录布局失败，按 {self.output_layout.describe()} 布局保存: {e}")
+            return self.output_layout
+        if saved != self.output_layout and 'output_layout' in self.config:
+            self.progress_update.emit(f"⚠️ 输出目录已按 {saved.describe()} 布局保存结果，忽略配置的 {self.output_layout.describe()} 布局；"
+                                      f"切换布局请使用 python output_layout.py migrate")
+        self.output_layout = saved
+        return self.output_layout
+
+    def output_folder(self, folder_path, name):
+        """视频结果文件夹的路径：按输出布局计算；按日期分区时，同一视频重新保存仍写回原来的分区"""
+        layout = self.get_output_layout()
+        if layout.layout == LAYOUT_DATE:
+            manifest = self.get_output_manifest()
+            previous = manifest.output_file_for_name(name) if manifest else None
+            if previous and os.path.basename(os.path.dirname(previous)) == name:
+                return os.path.dirname(previous)
+        return os.path.join(folder_path, layout.relative_dir(name))
+
+    def record_output(self, key, title, output_name, saved, prompt_hash_value, analysis_seconds=None, variant=''):
+        """把保存的结果记录到输出清单，记录失败不影响保存"""
+        manifest = self.get_output_manifest()
+        if manifest is None:
+            return
+        try:
+            manifest.record(key, title, output_name, saved.get('output_file'), prompt_hash_value,
+                            saved.get('rows', []), analysis_seconds, variant)
+        except Exception as e:
+            self.progress_update.emit(f"⚠️ 写入输出清单失败: {e}")
+
+    def save_extra_output(self, folder_path, file_name, output):
+        """保存提示词矩阵中其余提示词的结果：分镜表格式导出Excel，文本格式保存为txt"""
+        if output['format'] == FORMAT_TABLE:
+            return self.process_text(folder_path, output['content'], file_name, variant=output['name'])
+        try:
+            sanitized_base_name = self.sanitize_filename(file_name)
+            subfolder_path = self.output_folder(folder_path, sanitized_base_name)
+            os.makedirs(subfolder_path, exist_ok=True)
+            text_file_path = os.path.join(subfolder_path, f"{sanitized_base_name}_{self.sanitize_filename(output['name'])}.txt")
+            with open(text_file_path, 'w', encoding='utf-8') as f:
+                f.write(output['content'])
+            self.progress_update.emit(f"「{output['name']}」已保存到: {text_file_path}")
+            return {"success": True, "output_file": text_file_path}
+        except Exception as e:
+            self.progress_update.emit(f"❌ 保存「{output['name']}」时发生错误: {e}")
+            return {"success": False, "message": str(e)}
+
     def smart_delay(self, delay_type='base'):
         """智能延时功能"""
         min_delay = self.delay_config.get('min_delay', 1)
@@ -1320,4 +2750,19 @@ class VideoAnalysisEngine(QThread):
         
         # 添加终点
         points.append((end_x, end_y))
-        return points 
\ No newline at end of file
+        return points
+
+
+def run_engine_worker(config, event_queue, cancel_event):
+    """子进程入口：运行分析引擎，并把信号转换为结构化事件发送给GUI进程"""
+    engine = VideoAnalysisEngine(config, cancel_event=cancel_event)
+    engine.progress_update.connect(lambda message: event_queue.put({'type': 'progress', 'message': message}))
+    engine.error_occurred.connect(lambda message: event_queue.put({'type': 'error', 'message': message}))
+    engine.analysis_complete.connect(lambda result: event_queue.put({'type': 'complete', 'result': result}))
+    engine.item_started.connect(lambda key: event_queue.put({'type': 'item_started', 'key': key}))
+    engine.item_finished.connect(lambda key, success: event_queue.put({'type': 'item_finished', 'key': key, 'success': success}))
+    engine.metrics_update.connect(lambda metrics: event_queue.put({'type': 'metrics', 'metrics': metrics}))
+    try:
+        engine.run()
+    finally:
+        event_queue.put({'type': 'exit'})
@@ -3,18 +3,30 @@ import os
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QGridLayout, QLabel, QLineEdit, QPushButton, 
                              QRadioButton, QButtonGroup, QTextEdit, QFileDialog,
-                             QMessageBox, QFrame, QSizePolicy, QScrollArea)
+                             QMessageBox, QFrame, QSizePolicy, QScrollArea, QCheckBox,
+                             QComboBox)
 from PyQt6.QtCore import Qt, pyqtSignal, QSettings
 from PyQt6.QtGui import QFont, QPixmap, QIcon
-from video_analysis_engine import VideoAnalysisEngine
+from engine_process import EngineProcessController, ServiceJobController
+from bit_browser_client import DEFAULT_BIT_API_URL
+from video_scheduler import POLICY_FIFO, POLICY_SHORTEST_FIRST, POLICY_LONGEST_FIRST, POLICY_DEADLINE
 import json
 import os
 
+# 调度策略在界面上的显示名称
+SCHEDULE_POLICY_NAMES = [
+    (POLICY_FIFO, "原始顺序"),
+    (POLICY_SHORTEST_FIRST, "短视频优先"),
+    (POLICY_LONGEST_FIRST, "长视频优先"),
+    (POLICY_DEADLINE, "限时完成"),
+]
+
 class VideoAnalysisGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.settings = QSettings("VideoAnalysis", "VideoAnalysisGUI")
         self.loading_settings = False  # 标记是否正在加载设置
+        self.analysis_engine = None  # 当前运行的分析进程控制器
         self.init_ui()
         self.load_settings()
         
@@ -73,6 +85,11 @@ class VideoAnalysisGUI(QMainWindow):
                 color: #333333;
                 spacing: 8px;
             }
+            QCheckBox {
+                font-size: 14px;
+                color: #333333;
+                spacing: 8px;
+            }
             QRadioButton::indicator {
                 width: 18px;
                 height: 18px;
@@ -209,6 +226,15 @@ class VideoAnalysisGUI(QMainWindow):
         main_layout.addWidget(self.bit_window_id_label)
         main_layout.addWidget(self.bit_window_id_input)
         
+        # 比特浏览器本地API地址（默认 http://127.0.0.1:54345）
+        bit_api_layout = QHBoxLayout()
+        bit_api_label = QLabel("比特浏览器API地址:")
+        bit_api_layout.addWidget(bit_api_label)
+        self.bit_api_url_input = QLineEdit(DEFAULT_BIT_API_URL)
+        self.bit_api_url_input.setPlaceholderText(DEFAULT_BIT_API_URL)
+        bit_api_layout.addWidget(self.bit_api_url_input, 1)
+        main_layout.addLayout(bit_api_layout)
+        
         # 操作延时配置 - 超简化版本
         delay_layout = QHBoxLayout()
         delay_layout.setContentsMargins(0, 10, 0, 10)
@@ -242,6 +268,68 @@ class VideoAnalysisGUI(QMainWindow):
         delay_layout.addStretch()
         main_layout.addLayout(delay_layout)
         
+        # 高级选项
+        options_layout = QHBoxLayout()
+        options_layout.setContentsMargins(0, 0, 0, 5)
+        options_label = QLabel("高级选项:")
+        options_label.setFont(QFont("Arial", 14, QFont.Weight.Bold))
+        options_layout.addWidget(options_label)
+        
+        self.prewarm_checkbox = QCheckBox("预热下一页")
+        self.prewarm_checkbox.setToolTip("在当前视频生成期间，用第二个标签页提前打开下一个视频的新对话页面")
+        options_layout.addWidget(self.prewarm_checkbox)
+        
+        self.proxy_checkbox = QCheckBox("本地视频转码后上传")
+        self.proxy_checkbox.setToolTip("使用本地ffmpeg把大视频转码为720p低码率代理文件后再上传（按内容缓存）")
+        options_layout.addWidget(self.proxy_checkbox)
+
+        self.segment_checkbox = QCheckBox("长视频分段")
+        self.segment_checkbox.setToolTip("超过10分钟的本地视频按镜头切换切分为约5分钟的片段分别分析，再合并为一份分镜表")
+        options_layout.addWidget(self.segment_checkbox)
+
+        self.watch_checkbox = QCheckBox("持续监视文件夹")
+        self.watch_checkbox.setToolTip("本地视频模式下处理完现有视频后继续监视文件夹，新视频写入完成后自动分析，点击取消停止")
+        options_layout.addWidget(self.watch_checkbox)
+
+        self.dedupe_checkbox = QCheckBox("跳过重复视频")
+        self.dedupe_checkbox.setToolTip("按感知指纹识别与已分析视频近似重复的文件（重新编码、剪掉片头片尾、加水印等）并跳过")
+        options_layout.addWidget(self.dedupe_checkbox)
+
+        self.batch_checkbox = QCheckBox("短视频批量模式")
+        self.batch_checkbox.setToolTip("把多个30秒以内的短视频附加到同一个提示词中一起分析，回复按视频拆分；缺少结果的视频自动改为单独分析")
+        options_layout.addWidget(self.batch_checkbox)
+
+        self.queue_checkbox = QCheckBox("多进程共享队列")
+        self.queue_checkbox.setToolTip("任务登记到输出目录下的工作队列，多个分析进程可以同时处理同一个Excel或视频文件夹而不会重复处理")
+        options_layout.addWidget(self.queue_checkbox)
+        
+        options_layout.addStretch()
+        main_layout.addLayout(options_layout)
+        
+        # 本地视频调度策略
+        schedule_layout = QHBoxLayout()
+        schedule_layout.setContentsMargins(0, 0, 0, 5)
+        schedule_label = QLabel("本地视频处理顺序:")
+        schedule_layout.addWidget(schedule_label)
+        
+        self.schedule_combo = QComboBox()
+        for policy, policy_name in SCHEDULE_POLICY_NAMES:
+            self.schedule_combo.addItem(policy_name, policy)
+        self.schedule_combo.setMinimumHeight(35)
+        schedule_layout.addWidget(self.schedule_combo)
+        
+        budget_label = QLabel("  时间预算(分钟):")
+        schedule_layout.addWidget(budget_label)
+        self.time_budget_input = QLineEdit("0")
+        self.time_budget_input.setFixedWidth(80)
+        self.time_budget_input.setFixedHeight(35)
+        self.time_budget_input.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.time_budget_input.setToolTip("仅在\"限时完成\"策略下生效，0表示不限制")
+        schedule_layout.addWidget(self.time_budget_input)
+        
+        schedule_layout.addStretch()
+        main_layout.addLayout(schedule_layout)
+        
         # 分析提示输入
         prompt_label = QLabel("输入您的分析提示词:")
         prompt_label.setFont(QFont("Arial", 14, QFont.Weight.Bold))
@@ -251,6 +339,8 @@ class VideoAnalysisGUI(QMainWindow):
         self.prompt_text.setMinimumHeight(120)  # 减少高度
         self.prompt_text.setMaximumHeight(120)
         self.prompt_text.setPlainText("## 【视频分析任务重要提示生成 v4.0 - 全面关关系统化版】\n\n### 1. 角色定义与核心目标")
+        self.prompt_text.setToolTip("可用分隔行 ===== 名称 ===== 追加多个提示词：上传一次后在同一对话中依次发送，"
+                                    "结果分别保存；名称后加\"(表格)\"表示按分镜表导出Excel，否则保存为文本")
         main_layout.addWidget(self.prompt_text)
         
         # 添加一些间距
@@ -291,7 +381,7 @@ class VideoAnalysisGUI(QMainWindow):
         
         self.cancel_btn = QPushButton("取消")
         self.cancel_btn.setObjectName("cancelButton")
-        self.cancel_btn.clicked.connect(self.close)
+        self.cancel_btn.clicked.connect(self.cancel_analysis)
         button_layout.addWidget(self.cancel_btn)
         
         main_layout.addLayout(button_layout)
@@ -333,11 +423,24 @@ class VideoAnalysisGUI(QMainWindow):
             bit_window_id = self.settings.value("bit_window_id", "")
             if bit_window_id:
                 self.bit_window_id_input.setText(bit_window_id)
+            self.bit_api_url_input.setText(str(self.settings.value("bit_api_url", DEFAULT_BIT_API_URL)))
             
             # 加载延时配置
             self.min_delay_input.setText(str(self.settings.value("min_delay", "1")))
             self.max_delay_input.setText(str(self.settings.value("max_delay", "3")))
             
+            # 加载高级选项
+            self.prewarm_checkbox.setChecked(self.settings.value("prewarm_next_tab", False, type=bool))
+            self.proxy_checkbox.setChecked(self.settings.value("proxy_transcode", False, type=bool))
+            self.segment_checkbox.setChecked(self.settings.value("segment_long_videos", False, type=bool))
+            self.watch_checkbox.setChecked(self.settings.value("watch_folder", False, type=bool))
+            self.dedupe_checkbox.setChecked(self.settings.value("dedupe_videos", False, type=bool))
+            self.batch_checkbox.setChecked(self.settings.value("batch_short_clips", False, type=bool))
+            self.queue_checkbox.setChecked(self.settings.value("work_queue", False, type=bool))
+            schedule_index = self.schedule_combo.findData(self.settings.value("schedule_policy", POLICY_FIFO))
+            self.schedule_combo.setCurrentIndex(max(schedule_index, 0))
+            self.time_budget_input.setText(str(self.settings.value("time_budget_minutes", "0")))
+            
             from datetime import datetime
             timestamp = datetime.now().strftime("%H:%M:%S")
             self.log_text.append(f"[{timestamp}] 已加载上次的设置")
@@ -366,10 +469,22 @@ class VideoAnalysisGUI(QMainWindow):
             
             # 保存比特浏览器窗口ID
             self.settings.setValue("bit_window_id", self.bit_window_id_input.text())
+            self.settings.setValue("bit_api_url", self.bit_api_url_input.text())
             
             # 保存延时配置
             self.settings.setValue("min_delay", self.min_delay_input.text())
             self.settings.setValue("max_delay", self.max_delay_input.text())
+            
+            # 保存高级选项
+            self.settings.setValue("prewarm_next_tab", self.prewarm_checkbox.isChecked())
+            self.settings.setValue("proxy_transcode", self.proxy_checkbox.isChecked())
+            self.settings.setValue("segment_long_videos", self.segment_checkbox.isChecked())
+            self.settings.setValue("watch_folder", self.watch_checkbox.isChecked())
+            self.settings.setValue("dedupe_videos", self.dedupe_checkbox.isChecked())
+            self.settings.setValue("batch_short_clips", self.batch_checkbox.isChecked())
+            self.settings.setValue("work_queue", self.queue_checkbox.isChecked())
+            self.settings.setValue("schedule_policy", self.schedule_combo.currentData())
+            self.settings.setValue("time_budget_minutes", self.time_budget_input.text())
 
         except Exception as e:
             # 在这种情况下，我们不希望有任何弹窗，只是静默失败
@@ -507,6 +622,12 @@ class VideoAnalysisGUI(QMainWindow):
                 self.analysis_error("延时配置格式错误，请输入有效的数字")
                 return
             
+            try:
+                time_budget_minutes = float(self.time_budget_input.text() or "0")
+            except ValueError:
+                self.analysis_error("时间预算格式错误，请输入有效的数字")
+                return
+            
             # 创建分析配置
             config = {
                 'analysis_type': 'youtube' if self.youtube_radio.isChecked() else 'local',
@@ -514,13 +635,28 @@ class VideoAnalysisGUI(QMainWindow):
                 'output_path': output_path,
                 'prompt': prompt,
                 'bit_window_id': bit_window_id,
+                'bit_api_url': self.bit_api_url_input.text().strip() or DEFAULT_BIT_API_URL,
                 # 延时配置
                 'min_delay': min_delay,
-                'max_delay': max_delay
+                'max_delay': max_delay,
+                # 高级选项
+                'prewarm_next_tab': self.prewarm_checkbox.isChecked(),
+                'proxy_transcode': self.proxy_checkbox.isChecked(),
+                'segment_long_videos': self.segment_checkbox.isChecked(),
+                'watch_folder': self.watch_checkbox.isChecked(),
+                'dedupe_videos': self.dedupe_checkbox.isChecked(),
+                'batch_short_clips': self.batch_checkbox.isChecked(),
+                'work_queue': self.queue_checkbox.isChecked(),
+                'schedule_policy': self.schedule_combo.currentData(),
+                'time_budget_minutes': time_budget_minutes
             }
             
-            # 创建并启动分析引擎
-            self.analysis_engine = VideoAnalysisEngine(config)
+            # 创建并启动分析引擎：常驻服务在运行时提交给服务（复用已连接的浏览器），否则在独立子进程中运行
+            if ServiceJobController.is_service_available():
+                self.update_log("检测到常驻分析服务，任务将提交给服务执行")
+                self.analysis_engine = ServiceJobController(config)
+            else:
+                self.analysis_engine = EngineProcessController(config)
             self.analysis_engine.progress_update.connect(self.update_log)
             self.analysis_engine.analysis_complete.connect(self.analysis_finished)
             self.analysis_engine.error_occurred.connect(self.analysis_error)
@@ -548,7 +684,9 @@ class VideoAnalysisGUI(QMainWindow):
         from datetime import datetime
         timestamp = datetime.now().strftime("%H:%M:%S")
         
-        if result['success']:
+        if result.get('cancelled'):
+            self.log_text.append(f"[{timestamp}] ⏹️ {result.get('message', '分析已取消')}")
+        elif result['success']:
             self.log_text.append(f"[{timestamp}] ✅ 分析完成！{result['message']}")
             QMessageBox.information(
                 self, 
@@ -570,8 +708,22 @@ class VideoAnalysisGUI(QMainWindow):
         
         QMessageBox.critical(self, "分析错误", error_message)
 
+    def is_analysis_running(self):
+        """分析进程是否仍在运行"""
+        return self.analysis_engine is not None and self.analysis_engine.isRunning()
+
+    def cancel_analysis(self):
+        """分析运行中时取消分析，否则关闭窗口"""
+        if self.is_analysis_running():
+            self.analysis_engine.cancel()
+        else:
+            self.close()
+
     def closeEvent(self, event):
         """在窗口关闭时保存设置"""
+        if self.is_analysis_running():
+            self.analysis_engine.cancel()
+            self.analysis_engine.wait(35000)  # 等待子进程退出
         self.save_settings()
         self.settings.sync() # 确保设置被立即写入
         super().closeEvent(event)
@@ -0,0 +1,163 @@
+import os
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:  # 没有NumPy时无法计算感知指纹
+    np = None
+
+# 指纹参数：在视频时长的固定比例处各取一帧，缩小为 9×8 灰度图后计算64位dHash
+FINGERPRINT_FRACTIONS = (0.05, 0.15, 0.3, 0.45, 0.55, 0.7, 0.85, 0.95)
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+# 每帧哈希低于该位数差异的帧视为纯色/无内容，不参与匹配
+MIN_HASH_BITS = 4
+# 比较时每次处理的索引行数，限制内存占用
+SEARCH_BLOCK_ROWS = 4096
+
+
+def read_sample_frame(file_path, ffmpeg_path, seconds):
+    """在指定时间点解码一帧，返回 9×8 灰度像素；解码失败返回None"""
+    command = [
+        ffmpeg_path, '-hide_banner', '-loglevel', 'error',
+        '-ss', f"{seconds:.3f}", '-i', file_path,
+        '-frames:v', '1', '-an',
+        '-vf', f"scale={HASH_WIDTH}:{HASH_HEIGHT}:flags=area,format=gray",
+        '-f', 'rawvideo', 'pipe:1'
+    ]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+    frame_size = HASH_WIDTH * HASH_HEIGHT
+    if completed.returncode != 0 or len(completed.stdout) < frame_size:
+        return None
+    return np.frombuffer(completed.stdout[:frame_size], dtype=np.uint8).reshape(HASH_HEIGHT, HASH_WIDTH)
+
+
+def dhash_frames(frames):
+    """向量化dHash：frames 形状为 (帧数, 8, 9)，比较每行相邻像素，返回每帧一个uint64"""
+    bits = frames[:, :, 1:] > frames[:, :, :-1]  # (帧数, 8, 8)
+    packed = np.packbits(bits.reshape(len(frames), 64), axis=1)  # (帧数, 8) 字节
+    return packed.view('>u8').reshape(len(frames)).astype(np.uint64)
+
+
+def compute_fingerprint(file_path, ffmpeg_path, duration):
+    """计算视频的感知指纹：固定时长比例处各帧的dHash，形状为 (len(FINGERPRINT_FRACTIONS),)"""
+    frames = []
+    for fraction in FINGERPRINT_FRACTIONS:
+        frame = read_sample_frame(file_path, ffmpeg_path, duration * fraction)
+        if frame is None:
+            # 个别时间点解码失败时用全零帧占位，该帧不参与匹配
+            frame = np.zeros((HASH_HEIGHT, HASH_WIDTH), dtype=np.uint8)
+        frames.append(frame)
+    return dhash_frames(np.stack(frames).astype(np.int16))
+
+
+# 0-255每个字节中1的个数，用于向量化计算汉明距离
+POPCOUNT_TABLE = None if np is None else np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def hamming_matrix(query, candidates):
+    """query 形状 (帧数,)，candidates 形状 (N, 帧数)，返回 (N, 帧数, 帧数) 的逐帧汉明距离"""
+    xor = np.bitwise_xor(candidates[:, None, :], query[:, None])  # (N, 查询帧, 候选帧)
+    return POPCOUNT_TABLE[xor.view(np.uint8)].reshape(xor.shape + (8,)).sum(axis=-1)
+
+
+def fingerprint_distance(query, candidates):
+    """指纹距离：查询的每个有效帧取与候选视频各帧的最小汉明距离，再取平均
+
+    取各帧的最小值而不是逐帧对齐比较，片头片尾被剪掉导致采样点偏移时仍能匹配。
+    返回形状 (N,) 的距离，查询没有有效帧时返回None。
+    """
+    valid = np.array([bin(int(h)).count('1') >= MIN_HASH_BITS
+                      and 64 - bin(int(h)).count('1') >= MIN_HASH_BITS for h in query])
+    if not valid.any():
+        return None
+    distances = hamming_matrix(query[valid], candidates)  # (N, 有效查询帧, 候选帧)
+    return distances.min(axis=2).mean(axis=1)
+
+
+class FingerprintIndex:
+    """已分析视频的感知指纹索引
+
+    指纹以定长二进制记录追加写入 fingerprints.bin，对应的视频信息逐行追加到 entries.jsonl，
+    加载时一次读入为NumPy矩阵并分块比较，数万个视频也只占用几MB内存。
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.hash_path = os.path.join(index_dir, "fingerprints.bin")
+        self.entry_path = os.path.join(index_dir, "entries.jsonl")
+        os.makedirs(index_dir, exist_ok=True)
+        self.entries = []
+        if os.path.exists(self.entry_path):
+            with open(self.entry_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        self.entries.append(json.loads(line))
+                    except ValueError:
+                        break
+        frame_count = len(FINGERPRINT_FRACTIONS)
+        hashes = np.fromfile(self.hash_path, dtype=np.uint64) if os.path.exists(self.hash_path) else np.zeros(0, dtype=np.uint64)
+        rows = min(len(hashes) // frame_count, len(self.entries))
+        # 两个文件写入之间中断时以较短的为准
+        self.hashes = hashes[:rows * frame_count].reshape(rows, frame_count)
+        self.entries = self.entries[:rows]
+        self.pending = []  # 本次运行中已排队但尚未分析完成的视频 [(指纹, 信息)]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def find_duplicate(self, fingerprint, threshold, exclude_key=None):
+        """查找距离不超过阈值的最相近视频，返回 (信息, 距离)；没有时返回 (None, None)
+
+        exclude_key 为视频自身的键：已写入索引但没能标记完成（移动文件失败等）的视频重新运行时不能判定为与自己重复。
+        """
+        best_entry, best_distance = None, None
+        blocks = [(self.hashes[start:start + SEARCH_BLOCK_ROWS], self.entries[start:start + SEARCH_BLOCK_ROWS])
+                  for start in range(0, len(self.entries), SEARCH_BLOCK_ROWS)]
+        if self.pending:
+            blocks.append((np.stack([fp for fp, _ in self.pending]), [info for _, info in self.pending]))
+        for hashes, entries in blocks:
+            distances = fingerprint_distance(fingerprint, hashes)
+            if distances is None:
+                return None, None
+            distances = distances.astype(float)
+            position = int(distances.argmin())
+            while exclude_key is not None and entries[position].get('key') == exclude_key and np.isfinite(distances[position]):
+                distances[position] = np.inf
+                position = int(distances.argmin())
+            if distances[position] <= threshold and (best_distance is None or distances[position] < best_distance):
+                best_entry, best_distance = entries[position], float(distances[position])
+        return best_entry, best_distance
+
+    def add_pending(self, fingerprint, info):
+        """登记本次运行中即将分析的视频，同一批中的重复文件也能被发现"""
+        self.pending.append((fingerprint, info))
+
+    def add(self, fingerprint, info):
+        """视频分析完成后写入索引"""
+        self.pending = [(fp, pending_info) for fp, pending_info in self.pending
+                        if pending_info.get('key') != info.get('key')]
+        with open(self.hash_path, 'ab') as f:
+            f.write(np.asarray(fingerprint, dtype=np.uint64).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.entry_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(info, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.hashes = np.vstack([self.hashes, np.asarray(fingerprint, dtype=np.uint64)[None, :]])
+        self.entries.append(info)
+
+
+def compute_fingerprints(items, ffmpeg_path, workers=4):
+    """并行计算多个视频的指纹，返回 {文件路径: 指纹或异常}"""
+    def fingerprint_item(item):
+        try:
+            return compute_fingerprint(item['file_path'], ffmpeg_path, item['duration'])
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip([item['file_path'] for item in items], executor.map(fingerprint_item, items)))
@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+def find_probe_tool(config):
+    """查找探测工具：优先ffprobe，其次用ffmpeg解析文件信息；都没有时返回 (None, None)"""
+    ffprobe_path = config.get('ffprobe_path') or shutil.which('ffprobe')
+    if ffprobe_path:
+        return 'ffprobe', ffprobe_path
+    ffmpeg_path = config.get('ffmpeg_path') or shutil.which('ffmpeg')
+    if ffmpeg_path:
+        return 'ffmpeg', ffmpeg_path
+    return None, None
+
+
+def probe_with_ffprobe(file_path, ffprobe_path, timeout=60):
+    """使用ffprobe读取时长、编码、分辨率"""
+    command = [ffprobe_path, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', file_path]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.decode('utf-8', errors='replace').strip()[-300:] or "ffprobe解析失败")
+
+    data = json.loads(completed.stdout.decode('utf-8', errors='replace') or '{}')
+    info = {'duration': None, 'video_codec': None, 'width': None, 'height': None, 'audio_codec': None}
+    try:
+        info['duration'] = float(data.get('format', {}).get('duration'))
+    except (TypeError, ValueError):
+        pass
+    for stream in data.get('streams', []):
+        codec_type = stream.get('codec_type')
+        # 封面图片（attached_pic）不算视频流
+        if codec_type == 'video' and info['video_codec'] is None and not stream.get('disposition', {}).get('attached_pic'):
+            info['video_codec'] = stream.get('codec_name')
+            info['width'] = stream.get('width')
+            info['height'] = stream.get('height')
+            if info['duration'] is None:
+                try:
+                    info['duration'] = float(stream.get('duration'))
+                except (TypeError, ValueError):
+                    pass
+        elif codec_type == 'audio' and info['audio_codec'] is None:
+            info['audio_codec'] = stream.get('codec_name')
+    return info
+
+
+def probe_with_ffmpeg(file_path, ffmpeg_path, timeout=60):
+    """没有ffprobe时，解析 ffmpeg -i 输出的文件信息"""
+    command = [ffmpeg_path, '-hide_banner', '-i', file_path]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    output = completed.stderr.decode('utf-8', errors='replace')
+    if 'Invalid data found' in output or 'moov atom not found' in output:
+        raise RuntimeError("文件无法解析（可能已损坏）")
+
+    info = {'duration': None, 'video_codec': None, 'width': None, 'height': None, 'audio_codec': None}
+    duration_match = re.search(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)', output)
+    if duration_match:
+        hours, minutes, seconds = duration_match.groups()
+        info['duration'] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    for line in output.splitlines():
+        if 'Stream #' not in line:
+            continue
+        video_match = re.search(r'Video:\s*([\w\-]+).*?(\d{2,5})x(\d{2,5})', line)
+        if video_match and info['video_codec'] is None and 'attached pic' not in line:
+            info['video_codec'] = video_match.group(1)
+            info['width'] = int(video_match.group(2))
+            info['height'] = int(video_match.group(3))
+            continue
+        audio_match = re.search(r'Audio:\s*([\w\-]+)', line)
+        if audio_match and info['audio_codec'] is None:
+            info['audio_codec'] = audio_match.group(1)
+    if info['duration'] is None and info['video_codec'] is None and info['audio_codec'] is None:
+        raise RuntimeError("文件无法解析（可能已损坏）")
+    return info
+
+
+def probe_video(file_path, tool, tool_path):
+    """探测单个视频文件，失败时在结果中记录错误而不是抛出异常"""
+    try:
+        stat = os.stat(file_path)
+    except OSError as e:
+        return {'size': 0, 'mtime': None, 'error': f"无法读取文件: {e}"}
+    info = {'size': stat.st_size, 'mtime': stat.st_mtime, 'error': None}
+    if stat.st_size == 0:
+        info['error'] = "空文件"
+        return info
+    try:
+        if tool == 'ffprobe':
+            info.update(probe_with_ffprobe(file_path, tool_path))
+        else:
+            info.update(probe_with_ffmpeg(file_path, tool_path))
+    except subprocess.TimeoutExpired:
+        info['error'] = "探测超时"
+    except Exception as e:
+        info['error'] = str(e) or "探测失败"
+    return info
+
+
+def check_video(info, max_size_mb=0, max_duration=0, min_duration=1):
+    """检查探测结果，返回拒绝原因；可以分析时返回None"""
+    if info.get('error'):
+        return info['error']
+    if not info.get('video_codec'):
+        return "没有视频流（只有音频或无法识别）"
+    duration = info.get('duration')
+    if duration is not None and duration < min_duration:
+        return f"时长过短 ({duration:.1f}秒)"
+    if max_duration and duration is not None and duration > max_duration:
+        return f"时长 {duration / 60:.1f} 分钟，超过上限 {max_duration / 60:.0f} 分钟"
+    if max_size_mb and info.get('size', 0) > max_size_mb * 1024 * 1024:
+        return f"文件大小 {info['size'] / 1024 / 1024:.0f}MB，超过上传上限 {max_size_mb}MB"
+    return None
+
+
+class VideoProbeIndex:
+    """视频元数据索引：并行探测文件夹中的视频，并按 (大小, 修改时间) 缓存结果"""
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.entries = {}
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError):
+                self.entries = {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(temp_path, self.index_path)
+
+    def cached(self, file_path):
+        """返回仍然有效的缓存结果（文件未被修改）"""
+        entry = self.entries.get(os.path.abspath(file_path))
+        if not entry:
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+            return entry
+        return None
+
+    def probe_all(self, file_paths, tool, tool_path, workers=4):
+        """并行探测所有未缓存的文件，返回 {文件路径: 探测结果}"""
+        results = {}
+        pending = []
+        for file_path in file_paths:
+            entry = self.cached(file_path)
+            if entry is not None:
+                results[file_path] = entry
+            else:
+                pending.append(file_path)
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for file_path, info in zip(pending, executor.map(lambda p: probe_video(p, tool, tool_path), pending)):
+                    results[file_path] = info
+                    # 超时可能是临时问题，不写入缓存
+                    if info.get('error') != "探测超时":
+                        self.entries[os.path.abspath(file_path)] = info
+            self.save()
+        return results
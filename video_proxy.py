@@ -0,0 +1,160 @@
+import os
+import time
+import shutil
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# 内容哈希采样块大小：大文件只读取头、中、尾三段，避免为计算哈希读完整个母带文件
+HASH_SAMPLE_SIZE = 4 * 1024 * 1024
+
+
+def find_ffmpeg(ffmpeg_path=None):
+    """查找ffmpeg可执行文件，找不到时返回None"""
+    if ffmpeg_path and os.path.isfile(ffmpeg_path):
+        return ffmpeg_path
+    return shutil.which('ffmpeg')
+
+
+def quick_content_hash(file_path):
+    """计算文件内容哈希（文件大小 + 头/中/尾采样），用作代理缓存的键"""
+    size = os.path.getsize(file_path)
+    digest = hashlib.sha1(str(size).encode('utf-8'))
+    with open(file_path, 'rb') as f:
+        if size <= HASH_SAMPLE_SIZE * 3:
+            digest.update(f.read())
+        else:
+            for offset in (0, size // 2 - HASH_SAMPLE_SIZE // 2, size - HASH_SAMPLE_SIZE):
+                f.seek(offset)
+                digest.update(f.read(HASH_SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def build_proxy(file_path, cache_dir, ffmpeg_path, max_height=720, video_bitrate='1500k', audio_bitrate='96k'):
+    """在线程池中执行：把视频转码为限定分辨率和码率的代理文件（已缓存则直接返回）"""
+    started = time.time()
+    content_hash = quick_content_hash(file_path)
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    proxy_dir = os.path.join(cache_dir, f"{content_hash}_{max_height}p_{video_bitrate}")
+    # 代理文件保留原文件名，模型看到的文件名与原视频一致
+    proxy_path = os.path.join(proxy_dir, f"{stem}.mp4")
+    result = {
+        'source': file_path,
+        'proxy_path': proxy_path,
+        'content_hash': content_hash,
+        'source_size': os.path.getsize(file_path),
+        'cached': False
+    }
+
+    if os.path.exists(proxy_path):
+        result.update(cached=True, proxy_size=os.path.getsize(proxy_path), seconds=time.time() - started)
+        return result
+
+    os.makedirs(proxy_dir, exist_ok=True)
+    temp_path = os.path.join(proxy_dir, f".{stem}.partial.mp4")
+    bufsize = f"{int(video_bitrate.rstrip('kK')) * 2}k" if video_bitrate.lower().endswith('k') else video_bitrate
+    command = [
+        ffmpeg_path, '-y', '-hide_banner', '-loglevel', 'error',
+        '-i', file_path,
+        # 只缩小不放大，宽度保持偶数
+        '-vf', f"scale=-2:'min({max_height},ih)'",
+        '-c:v', 'libx264', '-preset', 'veryfast',
+        '-b:v', video_bitrate, '-maxrate', video_bitrate, '-bufsize', bufsize,
+        '-c:a', 'aac', '-b:a', audio_bitrate,
+        '-movflags', '+faststart',
+        temp_path
+    ]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if completed.returncode != 0 or not os.path.exists(temp_path):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        error_text = completed.stderr.decode('utf-8', errors='replace').strip()
+        raise RuntimeError(f"ffmpeg转码失败 (返回码 {completed.returncode}): {error_text[-500:]}")
+
+    os.replace(temp_path, proxy_path)
+    result.update(proxy_size=os.path.getsize(proxy_path), seconds=time.time() - started)
+    return result
+
+
+class ProxyTranscoder:
+    """上传前的代理转码阶段：线程池在浏览器之前提前转码若干个视频，按内容哈希缓存"""
+
+    def __init__(self, cache_dir, ffmpeg_path, workers=2, lookahead=3, max_height=720,
+                 video_bitrate='1500k', audio_bitrate='96k', min_size_mb=50, log=None):
+        self.cache_dir = cache_dir
+        self.ffmpeg_path = ffmpeg_path
+        self.lookahead = lookahead
+        self.max_height = max_height
+        self.video_bitrate = video_bitrate
+        self.audio_bitrate = audio_bitrate
+        self.min_size = min_size_mb * 1024 * 1024  # 小于该大小的视频直接上传原文件
+        self.log = log or (lambda message: None)
+        self.futures = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        # 每个转码本身就是独立的ffmpeg子进程，线程池足够；分析引擎运行在守护子进程中，不能再创建进程池
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    @classmethod
+    def from_config(cls, config, log=None):
+        """根据引擎配置创建转码器；没有ffmpeg时返回None"""
+        ffmpeg_path = find_ffmpeg(config.get('ffmpeg_path'))
+        if not ffmpeg_path:
+            return None
+        cache_dir = config.get('proxy_cache_dir') or os.path.join(config['output_path'], ".proxy_cache")
+        return cls(
+            cache_dir, ffmpeg_path,
+            workers=config.get('proxy_workers', 2),
+            lookahead=config.get('proxy_lookahead', 3),
+            max_height=config.get('proxy_max_height', 720),
+            video_bitrate=config.get('proxy_video_bitrate', '1500k'),
+            audio_bitrate=config.get('proxy_audio_bitrate', '96k'),
+            min_size_mb=config.get('proxy_min_size_mb', 50),
+            log=log
+        )
+
+    def needs_proxy(self, file_path):
+        try:
+            return os.path.getsize(file_path) >= self.min_size
+        except OSError:
+            return False
+
+    def prefetch(self, file_paths):
+        """提交后续若干个视频的转码任务（最多 lookahead 个）"""
+        for file_path in file_paths[:self.lookahead]:
+            if file_path in self.futures or not self.needs_proxy(file_path):
+                continue
+            self.futures[file_path] = self.executor.submit(
+                build_proxy, file_path, self.cache_dir, self.ffmpeg_path,
+                self.max_height, self.video_bitrate, self.audio_bitrate
+            )
+
+    def get_upload_path(self, file_path, timeout=None):
+        """返回应上传的文件：转码成功时为代理文件，否则为原文件"""
+        if not self.needs_proxy(file_path):
+            return file_path
+        self.prefetch([file_path])
+        future = self.futures.pop(file_path)
+        try:
+            if not future.done():
+                self.log("⏳ 正在等待代理文件转码完成...")
+            result = future.result(timeout=timeout)
+        except Exception as e:
+            self.log(f"⚠️ 代理转码失败，改为上传原文件: {e}")
+            return file_path
+
+        source_mb = result['source_size'] / 1024 / 1024
+        proxy_mb = result['proxy_size'] / 1024 / 1024
+        if result['cached']:
+            self.log(f"♻️ 使用已缓存的代理文件 ({source_mb:.0f}MB → {proxy_mb:.0f}MB)")
+        else:
+            self.log(f"🎞️ 代理文件转码完成 ({source_mb:.0f}MB → {proxy_mb:.0f}MB, 用时 {result['seconds']:.1f}s)")
+        if result['proxy_size'] >= result['source_size']:
+            # 原文件已经足够小，转码没有收益
+            return file_path
+        return result['proxy_path']
+
+    def shutdown(self):
+        for future in self.futures.values():
+            future.cancel()
+        self.futures.clear()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,102 @@
+import os
+import json
+import statistics
+
+# 调度策略
+POLICY_FIFO = 'fifo'  # 按文件夹列出的顺序
+POLICY_SHORTEST_FIRST = 'shortest_first'  # 短视频优先
+POLICY_LONGEST_FIRST = 'longest_first'  # 长视频优先
+POLICY_DEADLINE = 'deadline'  # 限时完成：短视频优先，预计超出时间预算时不再开始新任务
+
+SCHEDULE_POLICIES = [POLICY_FIFO, POLICY_SHORTEST_FIRST, POLICY_LONGEST_FIRST, POLICY_DEADLINE]
+
+# 没有历史数据时的默认估计：固定开销 + 每分钟视频的生成时间（秒）
+DEFAULT_OVERHEAD_SECONDS = 90
+DEFAULT_SECONDS_PER_MINUTE = 30
+
+
+class TimingHistory:
+    """历史耗时记录：按视频时长拟合 固定开销 + 每分钟生成时间，用于预估任务耗时"""
+
+    def __init__(self, history_path, max_samples=500):
+        self.history_path = history_path
+        self.max_samples = max_samples
+        self.samples = []  # [[视频时长(秒), 处理耗时(秒)], ...]
+        if os.path.exists(history_path):
+            try:
+                with open(history_path, 'r', encoding='utf-8') as f:
+                    self.samples = json.load(f).get('samples', [])
+            except (OSError, ValueError, AttributeError):
+                self.samples = []
+        self.fit()
+
+    def add(self, video_duration, elapsed_seconds):
+        """记录一个完成的任务并保存"""
+        self.samples.append([round(video_duration, 1), round(elapsed_seconds, 1)])
+        self.samples = self.samples[-self.max_samples:]
+        self.fit()
+        temp_path = self.history_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'samples': self.samples}, f)
+        os.replace(temp_path, self.history_path)
+
+    def fit(self):
+        """最小二乘拟合 耗时 = 固定开销 + 每分钟耗时 × 视频分钟数；样本不足时使用默认值"""
+        self.overhead = DEFAULT_OVERHEAD_SECONDS
+        self.seconds_per_minute = DEFAULT_SECONDS_PER_MINUTE
+        if len(self.samples) < 5:
+            return
+        minutes = [duration / 60 for duration, _ in self.samples]
+        seconds = [elapsed for _, elapsed in self.samples]
+        mean_x = statistics.mean(minutes)
+        mean_y = statistics.mean(seconds)
+        variance = sum((x - mean_x) ** 2 for x in minutes)
+        if variance <= 0:
+            # 所有视频时长相同，无法区分开销和时长成本，按比例折算
+            self.seconds_per_minute = mean_y / max(mean_x, 1 / 60)
+            self.overhead = 0
+            return
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(minutes, seconds)) / variance
+        self.seconds_per_minute = max(slope, 0)
+        self.overhead = max(mean_y - self.seconds_per_minute * mean_x, 0)
+
+    def estimate(self, video_duration):
+        """预估处理一个视频需要的秒数"""
+        if video_duration is None:
+            video_duration = self.median_duration()
+        return self.overhead + self.seconds_per_minute * video_duration / 60
+
+    def median_duration(self):
+        if not self.samples:
+            return 300
+        return statistics.median(duration for duration, _ in self.samples)
+
+
+class VideoScheduler:
+    """本地视频队列调度：按策略排序，限时完成策略下在预计超时前停止开始新任务"""
+
+    def __init__(self, policy, history, time_budget_seconds=0):
+        if policy not in SCHEDULE_POLICIES:
+            raise ValueError(f"未知的调度策略: {policy}")
+        self.policy = policy
+        self.history = history
+        self.time_budget = time_budget_seconds
+
+    def order(self, items):
+        """按策略排序任务；没有时长的任务排在最后"""
+        if self.policy == POLICY_FIFO:
+            return list(items)
+        known = [item for item in items if item.get('duration') is not None]
+        unknown = [item for item in items if item.get('duration') is None]
+        known.sort(key=lambda item: item['duration'], reverse=(self.policy == POLICY_LONGEST_FIRST))
+        return known + unknown
+
+    def should_start(self, item, elapsed_seconds):
+        """限时完成策略：开始该任务后预计能否在预算内完成"""
+        if self.policy != POLICY_DEADLINE or not self.time_budget:
+            return True
+        return elapsed_seconds + self.history.estimate(item.get('duration')) <= self.time_budget
+
+    def estimate_total(self, items):
+        """预估整个队列需要的秒数"""
+        return sum(self.history.estimate(item.get('duration')) for item in items)
@@ -0,0 +1,164 @@
+import os
+import json
+import subprocess
+
+try:
+    import numpy as np
+except ImportError:  # 没有NumPy时只能按固定间隔分段
+    np = None
+
+from video_proxy import quick_content_hash
+
+# 场景检测使用的缩略帧参数：每秒采样帧数、缩略图尺寸（灰度）
+SCENE_SAMPLE_FPS = 2
+SCENE_FRAME_WIDTH = 64
+SCENE_FRAME_HEIGHT = 36
+
+
+def read_downsampled_frames(file_path, ffmpeg_path, fps=SCENE_SAMPLE_FPS,
+                            width=SCENE_FRAME_WIDTH, height=SCENE_FRAME_HEIGHT):
+    """用ffmpeg解码为低帧率、小尺寸灰度帧，返回形状为 (帧数, 高, 宽) 的uint8数组"""
+    command = [
+        ffmpeg_path, '-hide_banner', '-loglevel', 'error',
+        '-i', file_path,
+        '-an', '-vf', f"fps={fps},scale={width}:{height},format=gray",
+        '-f', 'rawvideo', 'pipe:1'
+    ]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.decode('utf-8', errors='replace').strip()[-300:] or "ffmpeg解码失败")
+    frame_size = width * height
+    frame_count = len(completed.stdout) // frame_size
+    return np.frombuffer(completed.stdout[:frame_count * frame_size], dtype=np.uint8).reshape(frame_count, height, width)
+
+
+def detect_scene_changes(frames, fps=SCENE_SAMPLE_FPS, sensitivity=3.0, min_gap_seconds=2.0):
+    """根据相邻帧的平均绝对差检测镜头切换，返回切换时间点（秒）"""
+    if frames is None or len(frames) < 3:
+        return []
+    data = frames.astype(np.int16)
+    # 每对相邻帧的平均像素差，形状为 (帧数-1,)
+    diffs = np.abs(data[1:] - data[:-1]).mean(axis=(1, 2))
+    # 自适应阈值：均值 + sensitivity × 标准差，同时不低于一个绝对下限
+    threshold = max(diffs.mean() + sensitivity * diffs.std(), 12.0)
+    candidates = np.flatnonzero(diffs > threshold) + 1
+
+    cut_times = []
+    min_gap_frames = int(min_gap_seconds * fps)
+    last_frame = -min_gap_frames
+    for frame_index in candidates:
+        if frame_index - last_frame >= min_gap_frames:
+            cut_times.append(float(frame_index) / fps)
+            last_frame = frame_index
+    return cut_times
+
+
+def plan_segments(duration, cut_times, target_seconds=300, min_seconds=120, max_seconds=420):
+    """规划分段：每段尽量在目标时长附近的镜头切换处切开，找不到切换点时按最大时长切开"""
+    segments = []
+    start = 0.0
+    cut_times = sorted(cut_times)
+    while duration - start > max_seconds:
+        window = [t for t in cut_times if start + min_seconds <= t <= start + max_seconds]
+        if window:
+            end = min(window, key=lambda t: abs(t - (start + target_seconds)))
+        else:
+            end = start + target_seconds
+        segments.append((start, end))
+        start = end
+    # 最后一段太短时并入上一段
+    if segments and duration - start < min_seconds:
+        segments[-1] = (segments[-1][0], duration)
+    else:
+        segments.append((start, duration))
+    return segments
+
+
+def split_segment(file_path, start, end, output_path, ffmpeg_path):
+    """切出一段视频：优先流复制（不重新编码），失败时改为转码"""
+    temp_path = output_path + ".partial.mp4"
+    base_command = [ffmpeg_path, '-y', '-hide_banner', '-loglevel', 'error',
+                    '-ss', f"{start:.3f}", '-i', file_path, '-t', f"{end - start:.3f}"]
+    for codec_args in (['-c', 'copy', '-avoid_negative_ts', 'make_zero'],
+                       ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-c:a', 'aac']):
+        completed = subprocess.run(base_command + codec_args + ['-movflags', '+faststart', temp_path],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if completed.returncode == 0 and os.path.exists(temp_path) and os.path.getsize(temp_path) > 0:
+            os.replace(temp_path, output_path)
+            return output_path
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    raise RuntimeError(f"切分视频失败: {completed.stderr.decode('utf-8', errors='replace').strip()[-300:]}")
+
+
+class VideoSegmenter:
+    """把长视频切分为多个短片段分别分析，片段按内容哈希缓存"""
+
+    def __init__(self, cache_dir, ffmpeg_path, threshold_seconds=600, target_seconds=300,
+                 min_seconds=120, max_seconds=420, scene_detection=True, log=None):
+        self.cache_dir = cache_dir
+        self.ffmpeg_path = ffmpeg_path
+        self.threshold_seconds = threshold_seconds  # 超过该时长的视频才分段
+        self.target_seconds = target_seconds
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.scene_detection = scene_detection and np is not None
+        self.log = log or (lambda message: None)
+
+    @classmethod
+    def from_config(cls, config, ffmpeg_path, log=None):
+        cache_dir = config.get('segment_cache_dir') or os.path.join(config['output_path'], ".segments")
+        return cls(
+            cache_dir, ffmpeg_path,
+            threshold_seconds=config.get('segment_threshold_seconds', 600),
+            target_seconds=config.get('segment_target_seconds', 300),
+            min_seconds=config.get('segment_min_seconds', 120),
+            max_seconds=config.get('segment_max_seconds', 420),
+            scene_detection=config.get('segment_scene_detection', True),
+            log=log
+        )
+
+    def needs_split(self, duration):
+        return duration is not None and duration > self.threshold_seconds
+
+    def split(self, file_path, duration):
+        """切分视频，返回片段列表 [{'index', 'path', 'start', 'end'}]"""
+        content_hash = quick_content_hash(file_path)
+        segment_dir = os.path.join(self.cache_dir, content_hash)
+        os.makedirs(segment_dir, exist_ok=True)
+
+        # 分段方案与参数一起缓存，重试时无需再次解码检测镜头
+        plan_params = [self.scene_detection, self.target_seconds, self.min_seconds, self.max_seconds]
+        plan_path = os.path.join(segment_dir, "plan.json")
+        segments = None
+        if os.path.exists(plan_path):
+            try:
+                with open(plan_path, 'r', encoding='utf-8') as f:
+                    plan = json.load(f)
+                if plan.get('params') == plan_params:
+                    segments = [tuple(segment) for segment in plan['segments']]
+            except (OSError, ValueError, KeyError):
+                segments = None
+
+        if segments is None:
+            cut_times = []
+            if self.scene_detection:
+                try:
+                    frames = read_downsampled_frames(file_path, self.ffmpeg_path)
+                    cut_times = detect_scene_changes(frames)
+                    self.log(f"🎬 检测到 {len(cut_times)} 个镜头切换点")
+                except Exception as e:
+                    self.log(f"⚠️ 镜头检测失败，按固定间隔分段: {e}")
+            segments = plan_segments(duration, cut_times, self.target_seconds, self.min_seconds, self.max_seconds)
+            with open(plan_path, 'w', encoding='utf-8') as f:
+                json.dump({'params': plan_params, 'segments': segments}, f)
+        stem = os.path.splitext(os.path.basename(file_path))[0]
+        chunks = []
+        for index, (start, end) in enumerate(segments):
+            # 统一输出为mp4：能流复制的直接复制，不兼容的编码由 split_segment 转码
+            chunk_path = os.path.join(segment_dir, f"{stem}_part{index + 1:02d}_{int(start)}-{int(end)}.mp4")
+            if not os.path.exists(chunk_path):
+                split_segment(file_path, start, end, chunk_path, self.ffmpeg_path)
+            chunks.append({'index': index, 'path': chunk_path, 'start': start, 'end': end})
+        self.log(f"✂️ 已将视频切分为 {len(chunks)} 段（每段约 {self.target_seconds // 60} 分钟）")
+        return chunks
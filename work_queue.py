@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化工作队列
+多个分析进程（例如一个走API、一个走浏览器）共同处理同一个Excel或视频文件夹时，任务登记到输出目录下的SQLite队列中。
+进程按批领取任务并获得租约，处理期间定期续租，完成后标记完成；进程崩溃或被杀掉后租约过期，任务自动回到队列由其他进程领取。
+同一个任务同一时间只会被一个进程领取。
+
+查看队列: python work_queue.py status --output-path <输出目录>
+失败任务重新排队: python work_queue.py requeue --output-path <输出目录> [--source <Excel文件或视频文件夹>]
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+
+QUEUE_FILE_NAME = ".work_queue.sqlite"
+
+# 任务状态
+QUEUE_PENDING = 'pending'  # 等待领取
+QUEUE_LEASED = 'leased'  # 已被某个进程领取，租约到期前其他进程不能领取
+QUEUE_DONE = 'done'  # 已完成
+QUEUE_FAILED = 'failed'  # 多次领取后仍未完成，不再自动领取
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    source TEXT NOT NULL,
+    key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    enqueued_at REAL,
+    updated_at REAL,
+    PRIMARY KEY (source, key)
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (source, state, seq);
+"""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def source_id(source):
+    """数据源（Excel文件或视频文件夹）的规范路径，不同进程用不同写法指向同一个源时也能对应上"""
+    return os.path.normcase(os.path.abspath(source))
+
+
+class WorkQueue:
+    """持久化工作队列：登记、领取（租约）、续租、完成、释放"""
+
+    def __init__(self, db_path, lease_seconds=600, max_attempts=3):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts  # 领取该次数后仍未完成的任务标记为失败
+        # 续租在后台线程中进行，连接由锁保护；多个进程同时写入时等待锁
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_config(cls, config):
+        db_path = config.get('work_queue_path') or os.path.join(config['output_path'], QUEUE_FILE_NAME)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        return cls(db_path, lease_seconds=config.get('queue_lease_seconds', 600),
+                   max_attempts=config.get('queue_max_attempts', 3))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """写事务：BEGIN IMMEDIATE 立即取得数据库写锁，多个进程的领取操作依次进行"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    def locked(self):
+        """跨进程互斥：持有队列数据库的写锁，用于回写多个进程共用的Excel等文件"""
+        return self.transaction()
+
+    def enqueue(self, source, items):
+        """登记任务，已登记的任务（包括已完成的）保持原状态，返回新登记的数量"""
+        source = source_id(source)
+        now = time.time()
+        with self.transaction() as conn:
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM jobs WHERE source = ?", (source,)).fetchone()[0]
+            added = 0
+            for item in items:
+                seq += 1
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO jobs (source, key, seq, payload, enqueued_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (source, item['key'], seq, json.dumps(item, ensure_ascii=False), now, now))
+                added += cursor.rowcount
+        return added
+
+    def claim(self, source, worker, limit=1):
+        """领取最多 limit 个任务：等待中的任务，以及租约已过期（领取的进程已退出）的任务
+
+        租约过期且领取次数已达上限的任务（例如每次都导致进程崩溃的视频）标记为失败，不再领取。
+        返回 (任务列表, 其中租约过期后重新领取的任务键)。
+        """
+        source = source_id(source)
+        now = time.time()
+        with self.transaction() as conn:
+            # 进程崩溃时不会调用 release，在这里按领取次数判定失败
+            conn.execute(
+                "UPDATE jobs SET state = ?, worker = NULL, lease_expires = NULL, error = ?, updated_at = ? "
+                "WHERE source = ? AND state = ? AND lease_expires < ? AND attempts >= ?",
+                (QUEUE_FAILED, "租约过期（处理该任务的进程可能已崩溃）", now, source, QUEUE_LEASED, now, self.max_attempts))
+            rows = conn.execute(
+                """SELECT key, payload, state FROM jobs
+                   WHERE source = ? AND (state = ? OR (state = ? AND lease_expires < ?))
+                   ORDER BY seq LIMIT ?""",
+                (source, QUEUE_PENDING, QUEUE_LEASED, now, limit)).fetchall()
+            for key, _, _ in rows:
+                conn.execute(
+                    "UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                    "WHERE source = ? AND key = ?",
+                    (QUEUE_LEASED, worker, now + self.lease_seconds, now, source, key))
+        return [json.loads(payload) for _, payload, _ in rows], [key for key, _, state in rows if state == QUEUE_LEASED]
+
+    def heartbeat(self, source, keys, worker):
+        """为仍由本进程持有的任务续租，返回续租成功的任务键（租约已被其他进程接手的不在其中）"""
+        source = source_id(source)
+        now = time.time()
+        renewed = []
+        with self.transaction() as conn:
+            for key in keys:
+                cursor = conn.execute(
+                    "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE source = ? AND key = ? AND state = ? AND worker = ?",
+                    (now + self.lease_seconds, now, source, key, QUEUE_LEASED, worker))
+                if cursor.rowcount:
+                    renewed.append(key)
+        return renewed
+
+    def complete(self, source, key, worker):
+        """标记任务完成（即使租约已被其他进程接手，结果也已保存）"""
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, worker = ?, lease_expires = NULL, error = NULL, updated_at = ? WHERE source = ? AND key = ?",
+                (QUEUE_DONE, worker, time.time(), source_id(source), key))
+
+    def release(self, source, key, worker, error=None):
+        """交还未完成的任务：领取次数未到上限时回到队列，否则标记为失败，返回新状态"""
+        source = source_id(source)
+        with self.transaction() as conn:
+            row = conn.execute("SELECT attempts FROM jobs WHERE source = ? AND key = ? AND state = ? AND worker = ?",
+                               (source, key, QUEUE_LEASED, worker)).fetchone()
+            if row is None:
+                return None
+            state = QUEUE_FAILED if error and row[0] >= self.max_attempts else QUEUE_PENDING
+            if not error:
+                # 取消或时间预算用完时交还，不计入领取次数
+                conn.execute("UPDATE jobs SET attempts = attempts - 1 WHERE source = ? AND key = ?", (source, key))
+            conn.execute(
+                "UPDATE jobs SET state = ?, worker = NULL, lease_expires = NULL, error = COALESCE(?, error), updated_at = ? "
+                "WHERE source = ? AND key = ?",
+                (state, error, time.time(), source, key))
+        return state
+
+    def requeue_failed(self, source=None):
+        """把失败的任务重新放回队列，返回数量"""
+        with self.transaction() as conn:
+            if source:
+                cursor = conn.execute("UPDATE jobs SET state = ?, attempts = 0 WHERE state = ? AND source = ?",
+                                      (QUEUE_PENDING, QUEUE_FAILED, source_id(source)))
+            else:
+                cursor = conn.execute("UPDATE jobs SET state = ?, attempts = 0 WHERE state = ?", (QUEUE_PENDING, QUEUE_FAILED))
+            return cursor.rowcount
+
+    def counts(self, source=None):
+        """各状态的任务数；租约已过期的任务计入 expired"""
+        with self.lock:
+            where, args = ("WHERE source = ?", (source_id(source),)) if source else ("", ())
+            counts = {QUEUE_PENDING: 0, QUEUE_LEASED: 0, QUEUE_DONE: 0, QUEUE_FAILED: 0, 'expired': 0}
+            for state, expired, count in self.conn.execute(
+                    f"SELECT state, state = '{QUEUE_LEASED}' AND lease_expires < ?, COUNT(*) FROM jobs {where} GROUP BY 1, 2",
+                    (time.time(),) + args):
+                counts['expired' if expired else state] += count
+            return counts
+
+    def sources(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT DISTINCT source FROM jobs ORDER BY source")]
+
+    def workers(self, source=None):
+        """当前持有有效租约的进程及其任务数"""
+        with self.lock:
+            where, args = ("AND source = ?", (source_id(source),)) if source else ("", ())
+            return dict(self.conn.execute(
+                f"SELECT worker, COUNT(*) FROM jobs WHERE state = ? AND lease_expires >= ? {where} GROUP BY worker",
+                (QUEUE_LEASED, time.time()) + args).fetchall())
+
+
+class LeaseKeeper:
+    """后台线程定期为本进程领取的任务续租，续租失败（租约已被其他进程接手）时通过 on_lost 回调通知"""
+
+    def __init__(self, queue, source, worker, interval=60, on_lost=None):
+        self.queue = queue
+        self.source = source
+        self.worker = worker
+        self.interval = interval
+        self.on_lost = on_lost
+        self.keys = set()
+        self.keys_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="queue-lease-keeper", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def hold(self, keys):
+        with self.keys_lock:
+            self.keys.update(keys)
+
+    def drop(self, key):
+        with self.keys_lock:
+            self.keys.discard(key)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            with self.keys_lock:
+                keys = list(self.keys)
+            if not keys:
+                continue
+            try:
+                renewed = set(self.queue.heartbeat(self.source, keys, self.worker))
+            except sqlite3.Error:
+                continue  # 数据库暂时被锁定，下一轮再续
+            lost = [key for key in keys if key not in renewed]
+            if lost:
+                with self.keys_lock:
+                    self.keys.difference_update(lost)
+                if self.on_lost:
+                    self.on_lost(lost)
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="持久化工作队列：查看状态、重新排队失败任务")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('status', help="各数据源的任务状态")
+    requeue_parser = subparsers.add_parser('requeue', help="把失败的任务重新放回队列")
+    requeue_parser.add_argument('--source', help="只处理该数据源（Excel文件或视频文件夹）")
+    for sub in subparsers.choices.values():
+        sub.add_argument('--output-path', required=True, help="输出目录")
+    args = parser.parse_args()
+
+    db_path = os.path.join(args.output_path, QUEUE_FILE_NAME)
+    if not os.path.exists(db_path):
+        print(f"没有找到工作队列: {db_path}")
+        return
+    queue = WorkQueue(db_path)
+    if args.command == 'status':
+        for source in queue.sources():
+            counts = queue.counts(source)
+            print(f"{source}")
+            print(f"    等待 {counts[QUEUE_PENDING]}，处理中 {counts[QUEUE_LEASED]}，租约过期 {counts['expired']}，"
+                  f"完成 {counts[QUEUE_DONE]}，失败 {counts[QUEUE_FAILED]}")
+            for worker, count in queue.workers(source).items():
+                print(f"    进程 {worker}: {count} 个任务")
+    else:
+        print(f"已重新排队 {queue.requeue_failed(args.source)} 个失败任务")
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()